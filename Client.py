@@ -2,19 +2,20 @@ import typing
 import threading
 import logging
 
+from EventBus import EventBus
+
 CALLBACKS: set = {
     "error",
     "watchdog_starting",
+    "watchdog_started",
     "connected",
-    "disconnected"
+    "disconnected",
+    "state_changed"
 }
 
 
 def log_stuff(*kwargs, **args):
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-
-    logger.log(logging.INFO, f"{str(kwargs)} ; {str(args)}")
+    logging.log(logging.INFO, f"{str(kwargs)} ; {str(args)}")
 
 
 class Client:
@@ -32,11 +33,24 @@ class Client:
 
         self.wait_for_gui = wait_for_gui
 
-        self.callbacks: dict = dict()
-        if callbacks and set(callbacks).issubset(CALLBACKS):
-            self.callbacks = callbacks
-            for callback in set(callbacks).difference(CALLBACKS):
-                self.callbacks[callback] = log_stuff
-        else:
-            for callback in CALLBACKS:
-                self.callbacks[callback] = log_stuff
+        self.callbacks: dict = dict(callbacks or {})
+        for callback in set(self.callbacks).difference(CALLBACKS):
+            logging.log(logging.WARNING, f"Unknown callback '{callback}', it will never be called")
+        for callback in CALLBACKS.difference(self.callbacks):
+            self.callbacks[callback] = log_stuff
+
+        # Callbacks run on the bus' executor, so a slow handler never stalls the watchdog
+        self.events: EventBus = EventBus()
+        self.events.subscribe_many(self.callbacks)
+
+    def emit(self, event: str, **kwargs) -> None:
+        """
+        Publish an event to its callbacks without waiting for them
+        :param event: Event name, one of CALLBACKS
+        :param kwargs: Callback kwargs, action defaults to the event name
+        """
+        kwargs.setdefault('action', event)
+        self.events.publish(event, **kwargs)
+
+    def get_event_stats(self) -> dict:
+        return self.events.stats()
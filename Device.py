@@ -1,11 +1,9 @@
 import os
 import logging
 import xml.etree.cElementTree as ET
-import pathlib
 
 
-DEVICES_SETTINGS_DIR = 'devices'
-pathlib.Path(DEVICES_SETTINGS_DIR).mkdir(parents=True, exist_ok=True)
+DEVICES_SETTINGS_DIR = 'devices'  # Created when the first settings file is saved
 
 
 class Device:
@@ -0,0 +1,234 @@
+import typing
+import logging
+import threading
+from time import sleep, monotonic
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from stats import RunningStats
+
+ALL_EVENTS = '*'
+
+# A pending event followed by its opposite for the same device cancel out (the device flapped)
+FLAP_PAIRS = {
+    ('connected', 'disconnected'),
+    ('disconnected', 'connected'),
+}
+
+
+class Event(typing.NamedTuple):
+    name: str
+    payload: dict
+    published: float  # monotonic()
+
+
+class Subscription:
+    """
+    One subscriber (one or more event handlers sharing a queue): its own bounded queue, drained by at most
+    one executor worker at a time, so events reach it in order and a slow subscriber only ever holds one worker
+    """
+
+    def __init__(self, handlers: dict[str, typing.Callable], queue_size: int, coalesce: bool):
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.coalesce = coalesce
+
+        self.queue: deque[Event] = deque()
+        self.lock = threading.Lock()
+        self.scheduled: bool = False
+        self.active: bool = True
+
+        self.delivered: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+        self.errors: int = 0
+        self.latency = RunningStats()  # Seconds from publish to the callback starting
+        self.handler_time = RunningStats()  # Seconds spent in the callback
+
+    def matches(self, event: str) -> bool:
+        return self.active and (event in self.handlers or ALL_EVENTS in self.handlers)
+
+    def _coalesce(self, event: Event) -> bool:
+        """
+        Drop a pending event the new one reverses (must hold self.lock)
+        :return: True if the pair cancelled out
+        """
+        serial = event.payload.get('serial')
+        if serial is None:
+            return False
+
+        for pending in reversed(self.queue):
+            if pending.payload.get('serial') != serial or pending.payload.get('type') != event.payload.get('type'):
+                continue
+
+            if (pending.name, event.name) in FLAP_PAIRS:
+                self.queue.remove(pending)
+                self.coalesced += 2
+                return True
+            return False  # Latest pending event of this device is not the opposite one
+
+        return False
+
+    def offer(self, event: Event) -> bool:
+        """
+        Queue the event without blocking
+        :return: True if the subscriber needs a drain task scheduled
+        """
+        with self.lock:
+            if self.coalesce and self._coalesce(event):
+                return False
+
+            if len(self.queue) >= self.queue_size:
+                self.dropped += 1
+                return False
+
+            self.queue.append(event)
+            if self.scheduled:
+                return False
+
+            self.scheduled = True
+            return True
+
+    def drain(self) -> None:
+        while True:
+            with self.lock:
+                if not self.queue or not self.active:
+                    self.scheduled = False
+                    return
+                event = self.queue.popleft()
+
+            started = monotonic()
+            self.latency.update(started - event.published)
+            try:
+                self.handlers.get(event.name, self.handlers.get(ALL_EVENTS))(**event.payload)
+            except Exception as e:
+                self.errors += 1
+                logging.log(logging.ERROR, f"Callback for '{event.name}' failed: {e}")
+                logging.exception(e)
+            else:
+                self.delivered += 1
+            self.handler_time.update(monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            'handlers': {
+                event: getattr(handler, '__qualname__', repr(handler)) for event, handler in self.handlers.items()
+            },
+            'queued': len(self.queue),
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'latency_avg': self.latency.mean,
+            'latency_max': self.latency.max if self.latency.count else 0.0,
+            'handler_avg': self.handler_time.mean,
+            'handler_max': self.handler_time.max if self.handler_time.count else 0.0,
+        }
+
+
+class EventBus:
+    """
+    Delivers events to subscribers on a dedicated executor.
+    publish() never blocks: it only appends to the subscribers' bounded queues (dropping and counting
+    events of subscribers that fell behind), so the watchdogs keep running no matter how slow a consumer is.
+    """
+
+    def __init__(self, max_workers: int = 4, queue_size: int = 1000):
+        self.queue_size = queue_size
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='EventBus')
+        self._lock = threading.Lock()
+        self._subscriptions: list[Subscription] = list()
+        self._closed: bool = False
+
+        self.published: int = 0
+
+    # ----- Subscriptions -----
+    def subscribe(self, event: str, callback: typing.Callable, queue_size: int = None,
+                  coalesce: bool = True) -> Subscription:
+        """
+        Call callback(**payload) for every `event` (ALL_EVENTS for everything)
+        :param event: Event name, e.g. 'connected'
+        :param callback: Called from an executor thread, never from the publisher's
+        :param queue_size: Max events waiting for this subscriber, the newest are dropped over it
+        :param coalesce: Cancel out connect/disconnect flaps still waiting in the queue
+        :return: Subscription, pass it to unsubscribe
+        """
+        return self.subscribe_many({event: callback}, queue_size, coalesce)
+
+    def subscribe_many(self, handlers: dict[str, typing.Callable], queue_size: int = None,
+                       coalesce: bool = True) -> Subscription:
+        """
+        Like subscribe, but the handlers share one queue, so e.g. 'connected' and 'disconnected'
+        keep their order and flaps between them can be coalesced
+        :param handlers: Dict event -> callback
+        """
+        subscription = Subscription(dict(handlers), queue_size or self.queue_size, coalesce)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.active = False
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    # ----- Publishing -----
+    def publish(self, event: str, **payload) -> None:
+        if self._closed:
+            return
+
+        item = Event(event, payload, monotonic())
+
+        with self._lock:
+            self.published += 1
+            subscriptions = [s for s in self._subscriptions if s.matches(event)]
+
+        for subscription in subscriptions:
+            if subscription.offer(item):
+                try:
+                    self._executor.submit(subscription.drain)
+                except RuntimeError:
+                    # Executor shut down meanwhile, nothing will drain the queue: don't leave it looking busy
+                    with subscription.lock:
+                        subscription.dropped += len(subscription.queue)
+                        subscription.queue.clear()
+                        subscription.scheduled = False
+                    break
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every queued event was delivered
+        :return: False on timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            with self._lock:
+                subscriptions = list(self._subscriptions)
+            if all(not s.queue and not s.scheduled for s in subscriptions):
+                return True
+            if deadline is not None and monotonic() > deadline:
+                return False
+            sleep(0.01)
+
+    def close(self, timeout: float = None) -> None:
+        self.flush(timeout)
+        self._closed = True
+        self._executor.shutdown(wait=False)
+
+    # ----- Stats -----
+    def stats(self) -> dict:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        per_subscriber = [s.stats() for s in subscriptions]
+        return {
+            'published': self.published,
+            'delivered': sum(s['delivered'] for s in per_subscriber),
+            'dropped': sum(s['dropped'] for s in per_subscriber),
+            'coalesced': sum(s['coalesced'] for s in per_subscriber),
+            'errors': sum(s['errors'] for s in per_subscriber),
+            'queued': sum(s['queued'] for s in per_subscriber),
+            'subscribers': per_subscriber,
+        }
@@ -8,12 +8,24 @@ from pathlib import Path
 from re import compile, match
 import logging
 import typing
+import threading
 
+from ppadb import InstallError
+
+import metrics
+import tracing
 from Device import Device
 from utils import get_file_paths
-
-XML_DIR = 'XML'
-Path(XML_DIR).mkdir(parents=True, exist_ok=True)
+from android.ApkInstaller import install_on_device
+from android.LogcatStreamer import LogcatStreamer
+from android import Screencap
+from android.ScrcpyRecorder import Recording
+from android.DeviceSnapshot import DeviceSnapshot, read_snapshot
+from android.DumpsysCache import DumpsysCache
+
+XML_DIR = 'XML'  # Created on the first UI dump
+LOGS_DIR = 'logs'
+SNAPSHOT_TTL = 2.0  # Seconds the state getters reuse a device snapshot
 # Action types
 ACT_SEQUENCES = {
     'goto_photo': 'Change Mode to Photo',
@@ -25,7 +37,7 @@ ACT_SEQUENCES = {
 
 
 def push_file_send_progress(src, total_size, sent_size):
-    logging.log(logging.DEBUG, f"{src} > {sent_size}/{total_size}")
+    logging.log(logging.DEBUG, "%s > %s/%s", src, sent_size, total_size)
 
 
 def generate_sequence(subelem):
@@ -133,28 +145,44 @@ class ADBDevice(Device):
         # Persistence
         self.adb = client
         self.scrcpy: list[Popen] = list()
+        self.logcat: typing.Optional[LogcatStreamer] = None
+        self._sdk: typing.Optional[int] = None
+        self._snapshot: typing.Optional[DeviceSnapshot] = None
+        self._snapshot_lock = threading.Lock()
+        self.snapshot_ttl: float = SNAPSHOT_TTL
+        self.dumpsys: DumpsysCache = DumpsysCache(self.exec_shell)  # Full dumps shared by the getters
 
         self.is_rooted: bool = False
-        self.root()  # Make sure we are using root for device
+        with tracing.span('attach', device_serial):
+            with tracing.span('root', device_serial):
+                self.root()  # Make sure we are using root for device
 
-        self.d = self.adb.client.device(device_serial)  # Create device client object
+            self.d = self.adb.client.device(device_serial)  # Create device client object
 
-        try:
-            self.friendly_name = self.get_device_model()
-            android_ver_response = self.get_android_version()
-            self.android_ver = int(android_ver_response.split('.')[0]) if android_ver_response else None
-        except RuntimeError:
-            logging.log(logging.ERROR, "Device went offline!")
-        except ValueError as e:
-            logging.log(logging.ERROR, e)
+            with tracing.span('getprop', device_serial):
+                try:
+                    self.friendly_name = self.get_device_model()
+                    android_ver_response = self.get_android_version()
+                    self.android_ver = int(android_ver_response.split('.')[0]) if android_ver_response else None
+                except RuntimeError:
+                    logging.log(logging.ERROR, "Device went offline!")
+                except ValueError as e:
+                    logging.log(logging.ERROR, e)
 
-        # TODO: Move to parent class
-        self.load_settings_file()
+            # TODO: Move to parent class
+            with tracing.span('load_settings_file', device_serial):
+                self.load_settings_file()
 
-        self.print_attributes()
+            self.print_attributes()
 
-        self.setup_device_settings()
-        self.turn_on_and_unlock()
+            with tracing.span('setup_device_settings', device_serial):
+                self.setup_device_settings()
+            with tracing.span('turn_on_and_unlock', device_serial):
+                self.turn_on_and_unlock()
+
+            if self.logs_enabled:
+                with tracing.span('start_logs', device_serial):
+                    self.start_logs()
 
     # ----- Base methods -----
     def root(self):
@@ -164,10 +192,10 @@ class ADBDevice(Device):
         """
         logging.log(logging.INFO, f"Rooting device {self.device_serial}")
 
-        try:
-            self.is_rooted = self.adb.root(self.device_serial)
-        except ValueError as e:
-            logging.log(logging.ERROR, e)
+        result = self.adb.root(self.device_serial)
+        self.is_rooted = result.success
+
+        return result
 
     def remount(self):
         """
@@ -176,7 +204,7 @@ class ADBDevice(Device):
         """
         logging.log(logging.INFO, f"Remount device serial: {self.device_serial}")
 
-        self.adb.remount(self.device_serial)
+        return self.adb.remount(self.device_serial)
 
     def disable_verity(self):
         """
@@ -185,7 +213,7 @@ class ADBDevice(Device):
         """
         logging.log(logging.INFO, "Disabling verity device serial: " + self.device_serial)
 
-        self.adb.disable_verity(self.device_serial)
+        return self.adb.disable_verity(self.device_serial)
 
     def open_shell(self, cmd_str: str = None):
         """
@@ -204,20 +232,61 @@ class ADBDevice(Device):
         Open device screen view and control using scrcpy
         :return:None
         """
-        self.adb.open_device_ctrl(self)
+        self.adb.open_device_ctrl(self, extra_args)
 
     def kill_scrcpy(self):
+        self.adb.recorder.stop_device(self.device_serial)
         self.adb.kill_scrcpy(self)
 
-    def record_device_ctrl(self, save_dest):
-        self.kill_scrcpy()
-
+    def record_device_ctrl(self, save_dest, extra_args=None, queue: bool = False) -> Recording:
+        """
+        Start a headless screen recording (no scrcpy window)
+        :param save_dest: Directory for the recording
+        :param extra_args: More scrcpy args
+        :param queue: Queue it until a recording slot is free instead of failing
+        :return: Recording, stop it with stop_recording
+        """
         filename = f"{self.friendly_name}_screenrec_{datetime.now().strftime('%Y%m%d-%H%M%S')}.mp4"
         save_dest = path.join(save_dest, filename)
 
         logging.log(logging.INFO, f"Starting device screen recording to: {save_dest}")
 
-        self.open_device_ctrl(f"-r {save_dest}")
+        return self.adb.recorder.start(self.device_serial, save_dest, extra_args, queue=queue)
+
+    def stop_recording(self, timeout: float = None) -> list[Recording]:
+        return self.adb.recorder.stop_device(self.device_serial, timeout)
+
+    def set_logs(self, logs_bool, fltr=None):
+        """
+        Enable/disable logcat capture, restarting it if the filter changed
+        :param logs_bool: Enable logs
+        :param fltr: logcat filter spec, e.g. "ActivityManager:I *:S"
+        :return:None
+        """
+        filter_changed = fltr is not None and fltr != self.logs_filter
+        super().set_logs(logs_bool, fltr)
+
+        if not self.logs_enabled or filter_changed:
+            self.stop_logs()
+        if self.logs_enabled:
+            self.start_logs()
+
+    def start_logs(self, save_dir: str = LOGS_DIR) -> LogcatStreamer:
+        """
+        Start streaming logcat (filtered on the device by logs_filter) into rotating gzip files and a ring buffer
+        :param save_dir: Where to save the log files, None to only keep the ring buffer
+        :return: The LogcatStreamer
+        """
+        if self.logcat is None or not self.logcat.is_running:
+            self.logcat = LogcatStreamer(self.adb.pool, self.device_serial, self.logs_filter, save_dir)
+            self.logcat.start()
+
+        return self.logcat
+
+    def stop_logs(self):
+        if self.logcat is not None:
+            self.logcat.stop()
+            self.logcat = None
 
     def exec_shell(self, cmd):
         """
@@ -226,8 +295,13 @@ class ADBDevice(Device):
         :return:None
         """
         try:
-            logging.debug(f'executing {cmd}')
-            return self.d.shell(cmd)
+            logging.debug('executing %s', cmd)
+            with metrics.timed('exec_shell', self.device_serial), \
+                    tracing.span('exec_shell', self.device_serial, cmd=cmd):
+                output = self.adb.pool.shell(self.device_serial, cmd)
+            if metrics.is_enabled():
+                metrics.add_bytes('exec_shell', self.device_serial, len(output.encode('utf-8')))
+            return output
         except AttributeError as e:
             logging.exception('You tried to reach a device that is already disconnected!')
             self.detach_device(spurious_bool=True)
@@ -245,9 +319,12 @@ class ADBDevice(Device):
         src = path.realpath(src)  # .replace(" ", "^ ")
         # dst = dst.replace(" ", "^ ")
 
-        logging.debug(f'Pushing {src} to {dst}')
+        logging.debug('Pushing %s to %s', src, dst)
         try:
-            self.d.push(src, dst, progress=push_file_send_progress)
+            with metrics.timed('push', self.device_serial), tracing.span('push', self.device_serial, src=src):
+                self.adb.pool.push(self.device_serial, src, dst, progress=push_file_send_progress)
+            if metrics.is_enabled():
+                metrics.add_bytes('push', self.device_serial, path.getsize(src))
         except RuntimeError as e:
             logging.log(logging.ERROR, e)
 
@@ -259,22 +336,35 @@ class ADBDevice(Device):
         :return:None
         """
         dst = path.realpath(dst)
-        logging.debug(f'Pulling {src} into {dst}')  # Debugging
-        self.d.pull(src, dst)
+        logging.debug('Pulling %s into %s', src, dst)  # Debugging
+        try:
+            with metrics.timed('pull', self.device_serial), tracing.span('pull', self.device_serial, src=src):
+                self.adb.pool.pull(self.device_serial, src, dst)
+            if metrics.is_enabled():
+                metrics.add_bytes('pull', self.device_serial, path.getsize(dst))
+        except RuntimeError as e:
+            logging.log(logging.ERROR, e)
 
     def detach_device(self, spurious_bool=False):
         self.adb.detach_device(self.device_serial, spurious_bool)
 
     def is_installed(self, apk):
-        return self.d.is_installed(apk)
+        return "package:" in (self.exec_shell(f'pm path {apk}') or '')
 
-    def install_apk(self, apk):
-        if self.is_installed(apk):
-            logging.log(logging.INFO, f"Updating {apk}")
-        else:
-            logging.log(logging.INFO, f"Installing {apk}")
+    def install_apk(self, apk, force: bool = False):
+        """
+        Install or update an APK, skipped if the device already has its versionCode
+        :param apk: Path to the APK
+        :param force: Install even if the same or a newer version is installed
+        :return: InstallResult
+        """
+        logging.log(logging.INFO, f"Installing {apk}")
 
-        self.d.install(apk)
+        result = install_on_device(self.adb.pool, self.device_serial, apk, self.adb.apk_cache, force)
+        if result.status == 'failed':
+            raise InstallError(apk, result.error)
+
+        return result
 
     def uninstall_apk(self, apk):
         if self.is_installed(apk):
@@ -334,6 +424,19 @@ class ADBDevice(Device):
         response = self.exec_shell("getprop ro.build.version.sdk")
         return response.strip() if response else None
 
+    def get_sdk_level(self) -> int:
+        """
+        SDK level as int, cached as it can't change while attached
+        :return: SDK level, 0 if unknown
+        """
+        if self._sdk is None:
+            response = self.get_sdk_version()
+            if not response or not response.isdigit():
+                return 0
+            self._sdk = int(response)
+
+        return self._sdk
+
     def get_cpu(self):
         response = self.exec_shell("getprop ro.product.cpu.abi")
         return response.strip() if response else None
@@ -347,10 +450,10 @@ class ADBDevice(Device):
         # Alternative -> dumpsys activity | grep top-activity
         # First try
         try:  # This works on older Android versions
-            current = self.exec_shell("dumpsys activity | grep -E 'mFocusedActivity'").strip().split(' ')[3].split('/')
+            current = self.dumpsys.grep('activity', 'mFocusedActivity').strip().split(' ')[3].split('/')
             if current is None:
                 logging.debug('(Get Current App) Focused Activity is empty, trying top-activity...')
-                current = self.exec_shell("dumpsys activity | grep top-activity").strip().split(' ')[9].split(':')
+                current = self.dumpsys.grep('activity', 'top-activity').strip().split(' ')[9].split(':')
                 temp = current[1].split('/')
                 temp.append(current[0])  # -> [pkg, activity_id, pid]
                 return temp
@@ -361,7 +464,7 @@ class ADBDevice(Device):
 
         # Second try
         try:
-            current = self.exec_shell("dumpsys window windows | grep -E 'mFocusedApp'").split(' ')[6].split('/')
+            current = self.dumpsys.grep('window windows', 'mFocusedApp').split(' ')[6].split('/')
         except IndexError:
             pass
         else:
@@ -369,7 +472,7 @@ class ADBDevice(Device):
 
         # Third try
         try:
-            current = self.exec_shell("dumpsys window windows | grep -E 'ActivityRecord'").split(' ')[13].split('/')
+            current = self.dumpsys.grep('window windows', 'ActivityRecord').split(' ')[13].split('/')
         except IndexError:
             pass
         else:
@@ -378,7 +481,7 @@ class ADBDevice(Device):
         # else
         logging.log(logging.ERROR, "Can't fetch currently opened app! \nOutput of dumpsys: ")
 
-        logging.log(logging.ERROR, self.exec_shell("dumpsys window windows"))
+        logging.log(logging.ERROR, self.dumpsys.get('window windows').text)
         return None
 
     def get_installed_packages(self):
@@ -594,24 +697,44 @@ class ADBDevice(Device):
 
         return file_info['file_type'] if file_info else None
 
+    def get_snapshot(self, max_age: float = None) -> DeviceSnapshot:
+        """
+        Power, lock, display, battery and thermal state, read in one round-trip
+        :param max_age: Seconds an existing snapshot may be reused, defaults to snapshot_ttl, 0 forces a new one
+        :return:DeviceSnapshot
+        """
+        max_age = self.snapshot_ttl if max_age is None else max_age
+        with self._snapshot_lock:  # Concurrent callers share one read
+            if self._snapshot is None or self._snapshot.age() > max_age:
+                self._snapshot = read_snapshot(self.exec_shell)
+            return self._snapshot
+
+    def invalidate_snapshot(self) -> None:
+        """
+        Forget the cached snapshot, for actions that change the device state (key events, reboots...)
+        """
+        self._snapshot = None
+
+    def invalidate_state(self) -> None:
+        """
+        Forget the cached snapshot and dumpsys outputs, after taps, key events, opening apps...
+        """
+        self.invalidate_snapshot()
+        self.dumpsys.invalidate()
+
     def get_screen_resolution(self):
         """
         Get screen resolution of device
-        :return:List height and width
+        :return:List width and height (strings), empty if unknown
         """
-        try:
-            res = self.exec_shell('dumpsys window | grep "mUnrestricted"').strip().split(' ')[1].split('x')
-        except IndexError:
-            res = self.exec_shell('dumpsys window | grep "mUnrestricted"').rstrip().split('][')[1].strip(']').split(',')
-
-        return res
+        resolution = self.get_snapshot().resolution
+        return [str(value) for value in resolution] if resolution else []
 
     def get_wakefulness(self):
-        try:
-            return self.exec_shell("dumpsys activity | grep -E 'mWakefulness'").split('=')[1]
-        except IndexError:
+        wakefulness = self.get_snapshot().wakefulness
+        if wakefulness is None:
             logging.warning('There was an issue with getting device wakefullness - probably a shell error!')
-            return None
+        return wakefulness
 
     def get_device_leds(self):
         """
@@ -620,60 +743,79 @@ class ADBDevice(Device):
         """
         return self.exec_shell("ls /sys/class/leds/").strip().replace('\n', '').replace('  ', ' ').split(' ')
 
+    def screenshot(self, out=None):
+        """
+        Grab the screen as raw pixels streamed over exec-out (no PNG encode/decode)
+        :param out: numpy array to reuse if it has the right shape
+        :return: numpy array (h, w, 4) RGBA for most devices, None on error
+        """
+        try:
+            return Screencap.capture(self.adb.pool, self.device_serial, self.get_sdk_level(), out)
+        except (RuntimeError, OSError, ValueError) as e:
+            logging.log(logging.ERROR, f"Screenshot failed: {e}")
+            return None
+
+    def screenshots(self, interval: float = 0.0, count: int = None):
+        """
+        Continuous screen capture reusing one buffer, the yielded array is overwritten by the next capture
+        :param interval: Min seconds between captures
+        :param count: Number of captures, None for endless
+        :return: Generator of numpy arrays
+        """
+        return Screencap.capture_stream(self.adb.pool, self.device_serial, self.get_sdk_level(), interval, count)
+
     # ----- Binary getters -----
 
-    def has_screen(self):  # TODO Make this return a valid boolean (now it sometimes works, sometimes doesn't)
+    def has_screen(self) -> typing.Optional[bool]:
         """
-        Check if the device has an integrated screen (not working all the time)
-        :return:Bool Should return a Bool
+        Check if the device has an integrated screen, by pressing power and watching mScreenOn change
+        :return:Bool, None if the device doesn't report mScreenOn
         """
-        before = self.exec_shell("dumpsys deviceidle | grep mScreenOn").split('=')[1].strip()
+        before = self.get_snapshot(max_age=0).screen_on
         self.exec_shell('input keyevent 26')
         sleep(0.5)
-        after = self.exec_shell("dumpsys deviceidle | grep mScreenOn").split('=')[1].strip()
+        after = self.get_snapshot(max_age=0).screen_on
+
+        self.exec_shell('input keyevent 26')
+        self.invalidate_state()
+
+        if before is None or after is None:
+            return None
 
         if before == after:
             logging.log(logging.INFO, "Device has no integrated screen!")
-
-        self.exec_shell('input keyevent 26')
+        return before != after
 
     def is_sleeping(self):
-        response = self.exec_shell("dumpsys activity | grep -E 'mSleeping'")
-        state = response.strip() if response else None
-
-        if response is None:
+        """
+        :return:Tuple of mSleeping and mLockScreenShown ('true'/'false', None if not reported), None if neither is
+        """
+        snapshot = self.get_snapshot()
+        if snapshot.sleeping is None and snapshot.lock_screen_shown is None:
             return
 
-        if "No such file" in state:
-            logging.log(logging.ERROR, f"Found no such file in state: {state}")
-            return None, None
+        def as_str(value):
+            return None if value is None else str(value).lower()
 
-        try:
-            state = state.split(' ')
-            is_sleeping = state[0].split('=')[1]
-        except IndexError as e:
-            is_sleeping = None
-            logging.log(logging.ERROR, f"State: {state}\n{e}")
-
-        try:
-            lock_screen = state[1].split('=')[1]
-        except IndexError as e:
-            lock_screen = None
-            logging.log(logging.ERROR, f"State: {state}\n{e}")
-        return is_sleeping, lock_screen
+        return as_str(snapshot.sleeping), as_str(snapshot.lock_screen_shown)
 
     def is_adb_enabled(self):
         # Kind of useless as if this is actually false, we will not be able to connect
-        return True if self.exec_shell('settings get global adb_enabled').strip() == '1' else False
+        return bool(self.get_snapshot().adb_enabled)
 
     # ----- Device Actions -----
-    def reboot(self):
+    def reboot(self, wait: bool = True, timeout: float = 180.0):
         """
         Reboots the device.
-        :return:None
+        :param wait: Wait for it to boot (the client attaches a new object for it), else only request the reboot
+        :param timeout: Seconds
+        :return:RebootResult if waiting, else None
         """
-        self.exec_shell("reboot")  # TODO Remove device from connected_devices list after reboot
-        # self.adb.detach_device(self.device_serial, self)
+        if wait:
+            return self.adb.reboot_device(self.device_serial, boot_timeout=timeout)
+
+        self.exec_shell("reboot")
+        self.invalidate_state()
 
     def input_tap(self, *coords):  # Send tap events
         """
@@ -684,9 +826,12 @@ class ADBDevice(Device):
         logging.debug(f"X: {coords[0][0]}, Y: {coords[0][1]}")
 
         if self.android_ver <= 5:
-            return self.exec_shell("input touchscreen tap {} {}".format(coords[0][0], coords[0][1]))
+            output = self.exec_shell("input touchscreen tap {} {}".format(coords[0][0], coords[0][1]))
         else:
-            return self.exec_shell("input tap {} {}".format(coords[0][0], coords[0][1]))
+            output = self.exec_shell("input tap {} {}".format(coords[0][0], coords[0][1]))
+
+        self.invalidate_state()  # Whatever the tap did, cached dumps no longer describe the screen
+        return output
 
     def open_app(self, package):
         """
@@ -699,6 +844,7 @@ class ADBDevice(Device):
             logging.debug("Opening {}...".format(package))
             self.exec_shell("monkey -p '{}' -v 1".format(package))
             sleep(1)  # Give a bit of time to the device to load the app
+            self.invalidate_state()
         else:
             logging.debug("{} was already opened! Continuing...".format(package))
 
@@ -740,31 +886,32 @@ class ADBDevice(Device):
             logging.log(logging.INFO, "No files to pull.")
             return
 
-        for file in files_list:
-            if isinstance(file, str) and file != '':
-                # logging.debug("file is: ", file)
-                filename = file.replace("\\", "/").rstrip("/").split('/')[-1]
-                filetype = self.get_file_type(file)
-                if filetype:
-                    if filetype == 'dir':
-                        subdir_files = self.get_files_list(file, get_full_path=True)
-                        subdir_save_dest = path.join(save_dest, filename)
-
-                        # Create new folder for the new subdir
-                        logging.debug(f"Creating dir: {filename} in {save_dest}")
-                        Path(subdir_save_dest).mkdir(parents=True, exist_ok=True)
-
-                        if subdir_files:
-                            # Pull into new dir
-                            self.pull_files_recurse(subdir_files, subdir_save_dest)
-                    elif filetype == 'file':
-                        self.pull_file(file, path.join(save_dest, filename))
+        with tracing.span('pull_files_recurse', self.device_serial, dest=save_dest, files=len(files_list)):
+            for file in files_list:
+                if isinstance(file, str) and file != '':
+                    # logging.debug("file is: ", file)
+                    filename = file.replace("\\", "/").rstrip("/").split('/')[-1]
+                    filetype = self.get_file_type(file)
+                    if filetype:
+                        if filetype == 'dir':
+                            subdir_files = self.get_files_list(file, get_full_path=True)
+                            subdir_save_dest = path.join(save_dest, filename)
+
+                            # Create new folder for the new subdir
+                            logging.debug(f"Creating dir: {filename} in {save_dest}")
+                            Path(subdir_save_dest).mkdir(parents=True, exist_ok=True)
+
+                            if subdir_files:
+                                # Pull into new dir
+                                self.pull_files_recurse(subdir_files, subdir_save_dest)
+                        elif filetype == 'file':
+                            self.pull_file(file, path.join(save_dest, filename))
+                        else:
+                            logging.warning(f"File {file} is {filetype}. Idk what to do with it...")
                     else:
-                        logging.warning(f"File {file} is {filetype}. Idk what to do with it...")
+                        logging.log(logging.ERROR, f"Couldn't get filetype for '{file}' :(")
                 else:
-                    logging.log(logging.ERROR, f"Couldn't get filetype for '{file}' :(")
-            else:
-                logging.log(logging.ERROR, f"Unexpected type {type(file)} of: {str(file)}")
+                    logging.log(logging.ERROR, f"Unexpected type {type(file)} of: {str(file)}")
 
     def pull_and_rename(self, dest, file_loc, filename, suffix=None):
         pulled_files = []
@@ -824,6 +971,7 @@ class ADBDevice(Device):
         if skip_state_check or state[0] == 'true':
             self.exec_shell('input keyevent 26')  # Event Power Button
             self.exec_shell('input keyevent 82')  # Unlock
+            self.invalidate_state()
 
     def set_led_color(self, value, led, target):
         """
@@ -987,6 +1135,7 @@ class ADBDevice(Device):
 
         tree = ET.ElementTree(root)
         logging.log(logging.INFO, f'Writing settings to file {self.device_xml}')
+        Path(self.device_xml).parent.mkdir(parents=True, exist_ok=True)
         tree.write(self.device_xml, encoding='UTF8', xml_declaration=True)
 
     # ----- Device UI Parsing -----
@@ -997,20 +1146,22 @@ class ADBDevice(Device):
         :return:
         None
         """
-        source = self.exec_shell('uiautomator dump').split(': ')[1].rstrip()
-        current_app = self.get_current_app()
-        if source == "null root node returned by UiTestAutomationBridge.":
-            logging.log(logging.ERROR, "UIAutomator error! :( Try dumping UI elements again. (It looks like a known error)")
-            return
+        with tracing.span('dump_window_elements', self.device_serial):
+            source = self.exec_shell('uiautomator dump').split(': ')[1].rstrip()
+            current_app = self.get_current_app()
+            if source == "null root node returned by UiTestAutomationBridge.":
+                logging.log(logging.ERROR, "UIAutomator error! :( Try dumping UI elements again. (It looks like a known error)")
+                return
 
-        logging.debug(f'Source returned: {source}')
+            logging.debug(f'Source returned: {source}')
 
-        self.pull_file(
-            source,
-            path.join(XML_DIR,
-                      '{}_{}_{}.xml'.format(self.device_serial, current_app[0], current_app[1]))
-        )
-        logging.log(logging.INFO, 'Dumped window elements for current app.')
+            Path(XML_DIR).mkdir(parents=True, exist_ok=True)
+            self.pull_file(
+                source,
+                path.join(XML_DIR,
+                          '{}_{}_{}.xml'.format(self.device_serial, current_app[0], current_app[1]))
+            )
+            logging.log(logging.INFO, 'Dumped window elements for current app.')
 
     def get_clickable_window_elements(self, force_dump=False) -> dict:
         """
@@ -1087,22 +1238,25 @@ class ADBDevice(Device):
         :param sequence: List of actions
         :return:
         """
-        self.open_app(self.camera_app)
-
-        logging.debug(f'Doing sequence using device {self.device_serial}')
-
-        for action in sequence:
-            act_id = action[0]
-            act_data = action[1]
-            act_type = act_data[2]
-            act_value = act_data[1]
-            logging.debug(f"Performing {act_id}")
-            if act_type == 'tap':
-                self.input_tap(act_value)
-            if act_type == 'delay':
-                logging.debug(f"Sleeping {act_value}")
-                sleep(int(act_value))
-            sleep(self.actions_time_gap)
+        with tracing.span('do', self.device_serial, actions=len(sequence)):
+            with tracing.span('open_app', self.device_serial, package=self.camera_app):
+                self.open_app(self.camera_app)
+
+            logging.debug(f'Doing sequence using device {self.device_serial}')
+
+            for action in sequence:
+                act_id = action[0]
+                act_data = action[1]
+                act_type = act_data[2]
+                act_value = act_data[1]
+                logging.debug(f"Performing {act_id}")
+                with tracing.span(act_type, self.device_serial, action=act_id, value=act_value):
+                    if act_type == 'tap':
+                        self.input_tap(act_value)
+                    if act_type == 'delay':
+                        logging.debug(f"Sleeping {act_value}")
+                        sleep(int(act_value))
+                sleep(self.actions_time_gap)
 
     def take_photo(self):
         logging.debug(f"Current mode: {self.current_camera_app_mode}")
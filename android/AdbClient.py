@@ -1,17 +1,24 @@
 # Uses https://github.com/Swind/pure-python-adb
 import typing
 from subprocess import PIPE, Popen
-from time import sleep
+from time import sleep, monotonic, perf_counter
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 from signal import SIGINT
 from os import kill
-from contextlib import contextmanager
 
 from ppadb.client import Client as AdbPy
 
-from utils import compare_sets
+import metrics
 from android.ADBDevice import ADBDevice
+from android.AdbConnectionPool import AdbConnectionPool
+from android.AdbDeviceTracker import AdbDeviceTracker
+from android.DeviceStateMachine import DeviceStateMachine, StateChange
+from android.ApkInstaller import ApkCache, InstallResult, install_on_fleet
+from android.ScrcpyRecorder import ScrcpyRecorder, Recording, stop_process
+from android.HealthPoller import HealthPoller, HealthSample, HealthSeries
+from android.ShellFanout import ShellFanout, FanoutSummary
 import Client
 
 try:
@@ -25,125 +32,163 @@ ADB = "adb"
 SCRCPY = "scrcpy"
 
 
+class AdbServiceResult(typing.NamedTuple):
+    """
+    Outcome of an adb daemon service like root: or remount:
+    """
+    serial: str
+    service: str
+    success: bool
+    output: str
+    restarted: bool = False  # adbd restarted and the device reconnected
+    error: typing.Optional[str] = None
+
+
+class RebootResult(typing.NamedTuple):
+    """
+    Outcome of a reboot, phase is the last one reached: reboot, disconnected, reconnected, booted, attached
+    """
+    serial: str
+    success: bool
+    phase: str
+    elapsed: float  # Seconds from the reboot request to the end
+    down_after: typing.Optional[float] = None  # Seconds until the device went away
+    up_after: typing.Optional[float] = None  # Seconds until it was listed as 'device' again
+    booted_after: typing.Optional[float] = None  # Seconds until sys.boot_completed=1
+    error: typing.Optional[str] = None
+
+
 class AdbClient(Client.Client):
     """
     AdbClient class takes care of starting ADB, keeping connected devices list and etc.
     """
 
-    def __init__(self, callbacks: dict[str, typing.Callable] = None, wait_for_gui: bool = False, adb_binary: str = ADB):
+    def __init__(self, callbacks: dict[str, typing.Callable] = None, wait_for_gui: bool = False, adb_binary: str = ADB,
+                 scrcpy_binary: str = SCRCPY, max_recordings: int = 8,
+                 debounce: dict[str, float] = None, watchdog_interval: float = 1.0,
+                 adb_host: str = '127.0.0.1', adb_port: int = 5037, start_server: bool = True):
         super().__init__(
             callbacks=callbacks, wait_for_gui=wait_for_gui
         )
         self._adb_binary = adb_binary
 
-        logging.log(logging.INFO, "Starting the ADB Server...")
-        try:
-            self.adb = Popen(
-                [adb_binary, 'start-server'],
-                stdin=PIPE,
-                stdout=PIPE,
-                stderr=PIPE)
-            # self.adb.stdin.close()
-            stdout, stderr = self.adb.communicate()
-            if stdout:
-                logging.log(logging.DEBUG, f"ADB Start Output: {stdout.decode()}")
-            if stderr:
-                logging.log(logging.DEBUG, f"ADB Start Error: {stderr.decode()}")
-            self.adb.wait()
-        except FileNotFoundError:
-            logging.critical("Fatal error: adb not found!")
-            logging.log(logging.INFO, f"Adb is set to: {adb_binary}")
-            exit(1)
+        self.adb: typing.Optional[Popen] = None
+        if start_server:
+            self.start_server(adb_binary)
 
-        self.client: AdbPy = AdbPy()
+        self.client: AdbPy = AdbPy(adb_host, adb_port)
+        self.pool: AdbConnectionPool = AdbConnectionPool(self.client)
+        self.apk_cache: ApkCache = ApkCache()
+        self.recorder: ScrcpyRecorder = ScrcpyRecorder(scrcpy_binary, max_recordings)
 
-        self._run_watchdog: bool = True
-        self._anticipate_root: set = set()
+        self.tracker: AdbDeviceTracker = AdbDeviceTracker(self.client)
+        self.tracker.start()
 
-    @contextmanager
-    def anticipate_root(self, serial: str) -> None:
-        """
-        A context manager for code that
-        """
-        self._anticipate_root.add(serial)
-        yield
-        self._anticipate_root.remove(serial)
+        # Seconds a state must hold before it's reported, per state (see DEBOUNCE_WINDOWS)
+        self.device_states: DeviceStateMachine = DeviceStateMachine(debounce)
+        self.watchdog_interval = watchdog_interval
+
+        self.health: typing.Optional[HealthPoller] = None
+
+        self._run_watchdog: bool = True
 
     # ----- Main Stuff -----
     def _watchdog(self) -> None:
         """
-        The watchdog itself
+        The watchdog itself, driven by the device tracker and debounced per serial by the state machine
         """
-        devices_set: set = set()
         started: bool = False
+        server_lost: bool = False
+        version: int = 0
+
+        while self.wait_for_gui:  # Give time for the GUI to load
+            sleep(1)
+        self.emit(
+            'watchdog_starting',
+            type='android',
+            error=False
+        )
+
         while True:
             if not self._run_watchdog:
                 break
 
-            while self.wait_for_gui:  # Give time for the GUI to load
-                sleep(1)
-            self.callbacks['watchdog_starting'](
-                action='watchdog_starting',
-                type='android',
-                error=False
-            )
+            # Wake up on tracker updates, or when a pending state's debounce window ends
+            deadline = self.device_states.next_deadline()
+            timeout = self.watchdog_interval if deadline is None else \
+                min(self.watchdog_interval, max(0.0, deadline - monotonic()))
+            version = self.tracker.wait_for_update(version, timeout)
 
-            try:
-                devices_set: set = self.get_devices()
-            except ConnectionResetError:
-                logging.critical('ADB Server connection lost.')
-                self.callbacks['error'](
-                    action='get_devices',
-                    type='android',
-                    error=True
-                )
+            if not self.tracker.is_running:
+                # wait_for_update returns at once from now on, there is nothing left to watch
+                logging.log(logging.DEBUG, "Device tracker stopped, watchdog exiting...")
+                break
 
-            # logging.log(logging.DEBUG, f"Not minding the device updates as we are anticipating root!")
-            try:
-                if len(devices_set) > len(self.connected_devices):  # If New devices found
-                    for count, diff_device in enumerate(compare_sets(self.connected_devices, devices_set)):
-                        if diff_device in self._anticipate_root:
-                            continue
-
-                        if "connected" in self.callbacks:
-                            self.callbacks['connected'](
-                                action='connected',
-                                serial=diff_device,
-                                type='android',
-                                error=False
-                            )
-                elif len(devices_set) < len(self.connected_devices):  # If a device has disconnected
-                    for count, diff_device in enumerate(compare_sets(self.connected_devices, devices_set)):
-                        if diff_device in self._anticipate_root:
-                            continue
-
-                        if "connected" in self.callbacks:
-                            self.callbacks['disconnected'](
-                                action='disconnected',
-                                serial=diff_device,
-                                type='android',
-                                error=False
-                            )
-                self.connected_devices = devices_set
-            except (TimeoutError, RuntimeError) as e:
-                self.callbacks['error'](
-                    action='get_devices',
-                    type='android',
-                    error=True,
-                    details=e
-                )
-            else:
-                if not started:
-                    self.callbacks['watchdog_started'](
-                        action='watchdog_started',
+            if not self.tracker.is_connected:
+                if not server_lost and version:
+                    logging.critical('ADB Server connection lost.')
+                    self.emit(
+                        'error',
+                        action='get_devices',
                         type='android',
-                        error=False
+                        error=True
                     )
+                server_lost = True
+            else:
+                server_lost = False
+
+            if not version:
+                continue  # No list from the adb server yet
+
+            with metrics.timed('watchdog_poll'):
+                observed = self.tracker.get_states()
+                frozen = {
+                    serial for serial in set(observed) | self.connected_devices
+                    if self.tracker.is_expecting_reconnect(serial)
+                }
+
+                for change in self.device_states.update(observed, frozen=frozen):
+                    self._emit_state_change(change)
+
+                self.connected_devices = self.device_states.get_online()
+
+            if not started:
+                self.emit(
+                    'watchdog_started',
+                    type='android',
+                    error=False
+                )
 
-                started = True
+            started = True
 
         logging.log(logging.DEBUG, "ADB Watchdog exiting...")
 
+    def _emit_state_change(self, change: StateChange) -> None:
+        logging.log(logging.INFO, f"{change.serial}: {change.old_state} -> {change.new_state}")
+
+        self.emit(
+            'state_changed',
+            serial=change.serial,
+            old_state=change.old_state,
+            new_state=change.new_state,
+            type='android',
+            error=False
+        )
+        if change.connected:
+            self.emit(
+                'connected',
+                serial=change.serial,
+                type='android',
+                error=False
+            )
+        elif change.disconnected:
+            self.emit(
+                'disconnected',
+                serial=change.serial,
+                type='android',
+                error=False
+            )
+
     def watchdog(self) -> None:
         """
         Starts the adb watchdog thread.
@@ -158,6 +203,29 @@ class AdbClient(Client.Client):
         """
         self._run_watchdog = False
 
+    def start_server(self, adb_binary: str = ADB) -> None:
+        """
+        Start the adb server, skip it when connecting to an already running one (or an emulated one)
+        """
+        logging.log(logging.INFO, "Starting the ADB Server...")
+        try:
+            self.adb = Popen(
+                [adb_binary, 'start-server'],
+                stdin=PIPE,
+                stdout=PIPE,
+                stderr=PIPE)
+            # self.adb.stdin.close()
+            stdout, stderr = self.adb.communicate()
+            if stdout:
+                logging.log(logging.DEBUG, f"ADB Start Output: {stdout.decode()}")
+            if stderr:
+                logging.log(logging.DEBUG, f"ADB Start Error: {stderr.decode()}")
+            self.adb.wait()
+        except FileNotFoundError:
+            logging.critical("Fatal error: adb not found!")
+            logging.log(logging.INFO, f"Adb is set to: {adb_binary}")
+            exit(1)
+
     # ----- Getters -----
     def get_devices(self) -> set:
         """
@@ -176,13 +244,36 @@ class AdbClient(Client.Client):
         """
         return self.attached_devices
 
+    def get_pool_stats(self, device_serial: str = None) -> dict:
+        """
+        Get connection pool statistics (hits, misses, waits...)
+        :param device_serial: Only for this device, else totals with a per device breakdown
+        :return:Dict
+        """
+        return self.pool.stats(device_serial)
+
+    @staticmethod
+    def get_metrics() -> dict:
+        """
+        Get latency/bytes/errors per operation and device, empty unless metrics.enable() was called
+        :return:Dict operation -> device -> summary
+        """
+        return metrics.snapshot()
+
     # ----- Methods -----
     def kill_adb(self) -> None:
         """
         Kill opened adb process
         :return:None
         """
-        self.adb.terminate()
+        self.kill_watchdog()
+        self.recorder.stop_all()
+        self.stop_health_polling()
+        self.tracker.stop()
+        self.events.close(timeout=1)
+        self.pool.close()
+        if self.adb is not None:
+            self.adb.terminate()
 
     def attach_device(self, device_serial) -> None:
         """
@@ -190,6 +281,7 @@ class AdbClient(Client.Client):
         :param device_serial: Device serial
         :return: None
         """
+        self.pool.register(device_serial)
         self.devices_obj[device_serial] = ADBDevice(self, device_serial)  # Assign device to object
         self.attached_devices.add(device_serial)
 
@@ -208,6 +300,7 @@ class AdbClient(Client.Client):
                 logging.log(logging.INFO, f'Detaching device {device_serial}')
                 try:
                     self.devices_obj[device_serial].kill_scrcpy()
+                    self.devices_obj[device_serial].stop_logs()
                 except KeyError:
                     return
 
@@ -217,6 +310,7 @@ class AdbClient(Client.Client):
                     pass
 
                 del self.devices_obj[device_serial]
+                self.pool.unregister(device_serial)
             except ValueError as e:
                 logging.warning(f"Not found in attached devices list")
                 logging.exception(e)
@@ -226,7 +320,84 @@ class AdbClient(Client.Client):
                 logging.exception(e)
                 logging.log(logging.DEBUG, self.attached_devices)
 
-    def reboot_and_wait_for_device(self, device_serial: str) -> typing.Optional[ADBDevice]:
+    def reboot_device(self, device_serial: str, disconnect_timeout: float = 30.0, boot_timeout: float = 180.0,
+                      reattach: bool = True) -> RebootResult:
+        """
+        Reboot a device and wait, on device tracker events, for it to go away, come back and finish booting
+        :param device_serial: Device serial
+        :param disconnect_timeout: Max seconds for the device to go away after the reboot request
+        :param boot_timeout: Max seconds from going away to sys.boot_completed=1
+        :param reattach: Attach the device again (root, settings...) if it was attached
+        :return:RebootResult
+        """
+        start = monotonic()
+        was_attached = device_serial in self.attached_devices
+        down_after = up_after = booted_after = None
+
+        def result(success: bool, phase: str, error: str = None) -> RebootResult:
+            reboot = RebootResult(device_serial, success, phase, monotonic() - start, down_after, up_after,
+                                  booted_after, error)
+            logging.log(logging.INFO if success else logging.ERROR, reboot)
+            return reboot
+
+        logging.log(logging.INFO, f"Rebooting {device_serial}")
+        with metrics.timed('reboot', device_serial), self.tracker.expect_reconnect(device_serial) as waiter:
+            try:
+                self.run_service(device_serial, 'reboot:')
+            except (RuntimeError, OSError) as e:
+                if not waiter.went_away.is_set():
+                    return result(False, 'reboot', str(e))
+
+            if not waiter.went_away.wait(disconnect_timeout):
+                return result(False, 'reboot', f"{device_serial} did not go away in {disconnect_timeout}s")
+            down_after = monotonic() - start
+
+            if not waiter.came_back.wait(max(0.0, boot_timeout - (monotonic() - start - down_after))):
+                return result(False, 'disconnected', f"{device_serial} did not come back in {boot_timeout}s")
+            up_after = monotonic() - start
+
+        if was_attached:
+            self.detach_device(device_serial)  # Its streams and cached state died with the reboot
+
+        if not self.wait_for_boot_completed(device_serial, max(0.0, boot_timeout - (monotonic() - start - down_after))):
+            return result(False, 'reconnected', f"{device_serial} did not finish booting in {boot_timeout}s")
+        booted_after = monotonic() - start
+
+        if was_attached and reattach:
+            self.attach_device(device_serial)
+            return result(True, 'attached')
+        return result(True, 'booted')
+
+    def wait_for_boot_completed(self, device_serial: str, timeout: float = 180.0, interval: float = 0.25,
+                                max_interval: float = 2.0) -> bool:
+        """
+        Wait for the device to be online, then for sys.boot_completed=1.
+        The property has no change notification, so it's polled with backoff once the tracker reports the device.
+        :param timeout: Seconds, for both
+        :param interval: First poll interval, doubled up to max_interval
+        :return: True if booted, False on timeout
+        """
+        deadline = monotonic() + timeout
+        while True:
+            if not self.tracker.wait_for_state(device_serial, 'device', max(0.0, deadline - monotonic())):
+                return False
+
+            try:
+                if self.pool.shell(device_serial, 'getprop sys.boot_completed').strip() == '1':
+                    return True
+            except (RuntimeError, OSError) as e:
+                logging.log(logging.DEBUG, f"{device_serial} not ready yet: {e}")
+
+            if monotonic() + interval > deadline:
+                return False
+            sleep(interval)
+            interval = min(interval * 2, max_interval)
+
+    def reboot_and_wait_for_device(self, device_serial: str, timeout: float = 180.0) -> typing.Optional[ADBDevice]:
+        """
+        Reboot a device and attach it again once booted
+        :return:The new ADBDevice, None on failure or timeout
+        """
         if device_serial not in self.connected_devices:
             logging.log(logging.ERROR, f"{device_serial} does not seem to be connected to the computer...")
             return
@@ -236,100 +407,235 @@ class AdbClient(Client.Client):
 
             self.attach_device(device_serial)
 
-        self.devices_obj[device_serial].reboot()
+        if self.reboot_device(device_serial, boot_timeout=timeout).success:
+            return self.devices_obj.get(device_serial)
 
-        while device_serial not in self.connected_devices:
-            sleep(1)
+    def reboot_fleet(self, serials: typing.Iterable[str] = None, max_parallel: int = 16,
+                     disconnect_timeout: float = 30.0, boot_timeout: float = 180.0,
+                     reattach: bool = True) -> typing.Iterator[RebootResult]:
+        """
+        Reboot many devices concurrently
+        :param serials: Devices to reboot, defaults to all attached devices
+        :param max_parallel: Max devices rebooting at once
+        :return: Iterator of RebootResult in completion order, as each device finishes booting
+        """
+        if serials is None:
+            serials = list(self.attached_devices)
+
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='Reboot') as executor:
+            futures = [
+                executor.submit(self.reboot_device, serial, disconnect_timeout, boot_timeout, reattach)
+                for serial in serials
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run_service(self, device_serial: str, service: str, timeout: float = None) -> str:
+        """
+        Run an adb daemon service (root:, remount:, reboot:...) over a pooled connection
+        :return: Output of the service
+        """
+        with self.pool.transport(device_serial, timeout) as conn:
+            conn.send(service)
+            return conn.read_all().decode('utf-8', errors='replace')
+
+    def _restarting_service(self, device_serial: str, service: str, success_markers: tuple,
+                            restart_marker: str = None, reconnect_timeout: float = 15.0) -> AdbServiceResult:
+        output = ''
+        restarted = False
+        success = False
+        error = None
+        start = perf_counter()
+
+        with self.tracker.expect_reconnect(device_serial) as waiter:
+            try:
+                output = self.run_service(device_serial, service).strip()
+            except (RuntimeError, OSError) as e:
+                error = str(e)
+            else:
+                success = any(marker in output for marker in success_markers)
 
-        return self.attach_device(device_serial)
+                if restart_marker and restart_marker in output:
+                    # adbd restarts, wait for the device tracker to see it come back
+                    restarted = True
+                    if not waiter.wait(reconnect_timeout):
+                        success = False
+                        error = f"{device_serial} did not reconnect in {reconnect_timeout}s"
 
-    def root(self, device_serial: str) -> bool:
+        metrics.record(service.rstrip(':'), device_serial, perf_counter() - start, error=not success)
+
+        result = AdbServiceResult(device_serial, service, success, output, restarted, error)
+        logging.log(logging.DEBUG if success else logging.ERROR, result)
+        return result
+
+    def root(self, device_serial: str) -> AdbServiceResult:
         """
-        Root the device
-        :return:None
+        Restart adbd on the device as root
+        :return:AdbServiceResult
         """
         logging.log(logging.INFO, f"Rooting device {device_serial}")
 
-        logging.log(logging.DEBUG, "set ant root on")
-        with self.anticipate_root(device_serial):
-            # CREATE_NO_WINDOW = 0x08000000
-            try:
-                root = Popen([self._adb_binary, '-s', device_serial, 'root'],
-                             stdin=PIPE,
-                             stdout=PIPE,
-                             stderr=PIPE,
-                             creationflags=CREATE_NO_WINDOW)
-
-                root.stdin.close()
-                stdout, stderr = root.communicate()
-                if stderr:
-                    try:
-                        if b"unauthorized" in stderr:
-                            raise ValueError(
-                                f"Device not rooted (probably) or you didn't allow usb debugging.\n"
-                                f"Rooting Errors: {stderr.decode()}"
-                            )
-                        else:
-                            raise ValueError(f'Rooting Errors: {stderr.decode()}')
-                    except ValueError as e:
-                        logging.critical(e)
-                if stdout:
-                    logging.log(logging.INFO, "Rooting Output: {}".format(stdout.decode()))
-
-                root.terminate()
-
-                return True
-            except FileNotFoundError:
-                logging.log(logging.CRITICAL, f"Could not find ADB")
+        result = self._restarting_service(
+            device_serial, 'root:',
+            success_markers=('restarting adbd as root', 'already running as root'),
+            restart_marker='restarting adbd as root'
+        )
 
-    @staticmethod
-    def remount(self, device_serial) -> None:
+        if "unauthorized" in (result.error or ''):
+            logging.critical(
+                f"Device not rooted (probably) or you didn't allow usb debugging.\n"
+                f"Rooting Errors: {result.error}"
+            )
+
+        return result
+
+    def remount(self, device_serial: str) -> AdbServiceResult:
         """
         Remount the device
-        :return:None
+        :return:AdbServiceResult
         """
         logging.log(logging.INFO, f"Remount device serial: {device_serial}")
-        # CREATE_NO_WINDOW = 0x08000000
-        try:
-            with self.anticipate_root(device_serial):
-                remount = Popen([self._adb_binary, '-s', device_serial, 'remount'],
-                                stdin=PIPE,
-                                stdout=PIPE,
-                                stderr=PIPE,
-                                creationflags=CREATE_NO_WINDOW)
-                remount.stdin.close()
-                stdout, stderr = remount.communicate()
-                if stderr:
-                    logging.log(logging.ERROR, "Remount Errors: ".format(stderr.decode()))
-                if stdout:
-                    logging.warning("Remount Output: ".format(stdout.decode()))
-                remount.terminate()
-        except FileNotFoundError:
-            logging.log(logging.CRITICAL, f"Could not find ADB")
 
-    def disable_verity(self, device_serial: str) -> None:
+        return self._restarting_service(
+            device_serial, 'remount:',
+            success_markers=('remount succeeded',),
+        )
+
+    def disable_verity(self, device_serial: str) -> AdbServiceResult:
         """
         Disabled verity of device
-        :return:None
+        :return:AdbServiceResult
         """
         logging.log(logging.INFO, f"Disabling verity device serial: {device_serial}")
-        # CREATE_NO_WINDOW = 0x08000000
-        with self.anticipate_root(device_serial):
-            disver = Popen([self._adb_binary, '-s', device_serial, 'disable-verity'],
-                           stdin=PIPE,
-                           stdout=PIPE,
-                           stderr=PIPE,
-                           creationflags=CREATE_NO_WINDOW)
-            disver.stdin.close()
-            stdout, stderr = disver.communicate()
-            if stderr:
-                logging.log(logging.ERROR, f"Dis verity Errors: {stderr.decode()}")
-            if stdout:
-                logging.warning(f"Dis verity Output: {stdout.decode()}")
-            disver.terminate()
 
-            logging.log(logging.INFO, 'Rebooting device after disabling verity!')
-            # self.reboot()
+        result = self._restarting_service(
+            device_serial, 'disable-verity:',
+            success_markers=('Verity disabled', 'verity is already disabled', 'Successfully disabled verity'),
+        )
+
+        if result.success:
+            logging.log(logging.INFO, 'Reboot the device for disabling verity to take effect!')
+
+        return result
+
+    def install_apk_fleet(self, apk: str, serials: typing.Iterable[str] = None, max_parallel: int = 8,
+                          force: bool = False) -> list[InstallResult]:
+        """
+        Install an APK on many devices concurrently, skipping devices already at its versionCode
+        :param apk: Path to the APK
+        :param serials: Devices to install on, defaults to all attached devices
+        :param max_parallel: Max concurrent installs
+        :param force: Install even if the device has the same or a newer version
+        :return: List of InstallResult (per device status, method and timing) in completion order
+        """
+        if serials is None:
+            serials = list(self.attached_devices)
+
+        return list(install_on_fleet(self.pool, serials, apk, self.apk_cache, max_parallel, force))
+
+    def shell_fanout(self, cmd: str, serials: typing.Iterable[str] = None, max_parallel: int = 128,
+                     timeout: float = 10.0) -> ShellFanout:
+        """
+        Run a shell command on many devices concurrently.
+        Iterate the result (for / async for) to stream ShellResults in completion order, or call run() for
+        just the FanoutSummary; summary() aggregates whatever finished so far.
+        :param cmd: Shell command
+        :param serials: Devices to run on, defaults to all attached devices
+        :param max_parallel: Max devices running the command at once
+        :param timeout: Seconds a device may stay silent before it counts as timed out
+        :return:ShellFanout
+        """
+        if serials is None:
+            serials = list(self.attached_devices)
+
+        return ShellFanout(self.pool, serials, cmd, max_parallel, timeout)
+
+    def screenshot_devices(self, serials: typing.Iterable[str] = None, max_parallel: int = 16) -> dict:
+        """
+        Grab the screens of many attached devices in parallel
+        :param serials: Devices to capture, defaults to all attached devices
+        :param max_parallel: Max concurrent captures
+        :return: Dict serial -> numpy array (None for devices that failed)
+        """
+        if serials is None:
+            serials = list(self.attached_devices)
+
+        devices = {serial: self.devices_obj[serial] for serial in serials if serial in self.devices_obj}
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='Screencap') as executor:
+            results = executor.map(lambda device: device.screenshot(), devices.values())
+            return dict(zip(devices, results))
+
+    def record_devices(self, save_dest: str, serials: typing.Iterable[str] = None,
+                       extra_args: typing.Iterable[str] = None) -> dict[str, Recording]:
+        """
+        Start headless screen recordings of many devices,
+        the ones beyond the recorder's max_concurrent are queued and start as others end
+        :param save_dest: Directory for the recordings
+        :param serials: Devices to record, defaults to all attached devices
+        :param extra_args: More scrcpy args
+        :return: Dict serial -> Recording
+        """
+        if serials is None:
+            serials = list(self.attached_devices)
+
+        return {
+            serial: self.devices_obj[serial].record_device_ctrl(save_dest, extra_args, queue=True)
+            for serial in serials if serial in self.devices_obj
+        }
+
+    def stop_recordings(self, serials: typing.Iterable[str] = None, timeout: float = None) -> list[Recording]:
+        """
+        Gracefully stop recordings (all of them by default), in parallel
+        """
+        if serials is None:
+            return self.recorder.stop_all(timeout)
+
+        stopped = list()
+        for serial in serials:
+            stopped.extend(self.recorder.stop_device(serial, timeout))
+        return stopped
+
+    def get_recording_stats(self) -> dict:
+        return self.recorder.stats()
+
+    # ----- Health -----
+    @staticmethod
+    def _poll_health(device: ADBDevice) -> HealthSample:
+        # A fresh snapshot also refreshes the one the device's state getters read
+        snapshot = device.get_snapshot(max_age=0)
+        if snapshot.is_empty:
+            # Raising makes the poller back off to max_interval instead of recording a sample of Nones
+            raise RuntimeError(f"No snapshot from {device.device_serial}")
+        return HealthSample.from_snapshot(snapshot)
+
+    def start_health_polling(self, workers: int = 4, min_interval: float = 5.0, max_interval: float = 60.0,
+                             capacity: int = 1024) -> HealthPoller:
+        """
+        Poll battery temperature, wakefulness, storage free, foreground app... of all attached devices
+        from a small worker pool, faster while values change and slower while they're stable
+        :param workers: Max devices polled at once
+        :param min_interval: Seconds between polls while values change
+        :param max_interval: Seconds between polls of stable devices
+        :param capacity: Samples kept per device
+        :return:HealthPoller
+        """
+        if self.health is None:
+            self.health = HealthPoller(
+                lambda: dict(self.devices_obj), self._poll_health, workers, min_interval, max_interval,
+                capacity=capacity
+            )
+        self.health.start()
+        return self.health
+
+    def stop_health_polling(self) -> None:
+        if self.health is not None:
+            self.health.stop(timeout=1)
+
+    def get_health(self, device_serial: str) -> typing.Optional[HealthSeries]:
+        """
+        Time series of a device's health samples, None if it wasn't polled yet
+        """
+        return self.health.get_series(device_serial) if self.health is not None else None
 
     def open_shell(self, device_serial: str, cmd_str: str = None) -> Popen:
         """
@@ -367,8 +673,7 @@ class AdbClient(Client.Client):
 
         logging.log(logging.DEBUG, f"Scrcpy extra_args: {extra_args}")
         if extra_args:
-            extra_args = extra_args.split(" ")
-            exec_data.append(extra_args)
+            exec_data.extend(extra_args.split())
 
         try:
             new_scrcpy = Popen(
@@ -390,15 +695,7 @@ class AdbClient(Client.Client):
         scrcpy_list = device_obj.scrcpy.copy()
 
         for process in scrcpy_list:
-            try:
-                stdout_data = process.communicate(input=b'\x03')[0]  # Send Ctrl+C
-                logging.log(logging.DEBUG, stdout_data)
-            except ValueError:
-                logging.log(logging.WARNING, "Window was already closed!")
-
-            logging.log(logging.DEBUG, f"killing {process.pid}")
-            process.terminate()
-
+            logging.log(logging.DEBUG, f"Stopping {process.pid}: {stop_process(process)}")
             device_obj.scrcpy.remove(process)
 
         logging.log(logging.DEBUG, "Killed scrcpy windows for device")
@@ -0,0 +1,297 @@
+import os
+import typing
+import logging
+import threading
+from time import monotonic
+from select import select
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+from ppadb.client import Client as AdbPy
+from ppadb.connection import Connection
+from ppadb.sync import Sync
+
+
+class PoolStats:
+    """
+    Counters of an AdbConnectionPool, per serial and in total
+    """
+    FIELDS = ('hits', 'misses', 'waits', 'created', 'evicted', 'unhealthy', 'sync_reused')
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class AdbConnectionPool:
+    """
+    Bounded per-serial pool of connections to the adb server that already went through host:transport.
+
+    Shell/exec connections are one-shot (adb closes them after the service), so the pool keeps a few
+    pre-transported spares per attached serial, topped up in the background. Sync connections can be
+    reused for many pushes/pulls, so they are returned to the pool after use.
+    """
+
+    def __init__(self, client: AdbPy, max_per_serial: int = 8, spares_per_serial: int = 2,
+                 idle_timeout: float = 60.0, maintenance_interval: float = 1.0):
+        self.client = client
+        self.max_per_serial = max_per_serial
+        self.spares_per_serial = spares_per_serial
+        self.idle_timeout = idle_timeout
+        self.maintenance_interval = maintenance_interval
+
+        self._lock = threading.Lock()
+        self._serials: set = set()  # Serials we keep spares for
+        self._spares: dict[str, deque] = defaultdict(deque)  # serial -> deque of (Connection, idle since)
+        self._idle_sync: dict[str, deque] = defaultdict(deque)  # serial -> deque of (Connection, idle since)
+        self._limits: dict[str, threading.BoundedSemaphore] = dict()
+        self._stats: dict[str, PoolStats] = defaultdict(PoolStats)
+
+        self._run_maintenance: bool = True
+        self._wake = threading.Event()
+        self.maintenance_thread = threading.Thread(target=self._maintenance, args=(), daemon=True)
+        self.maintenance_thread.name = 'ADBConnections-Pool'
+        self.maintenance_thread.start()
+
+    # ----- Registration -----
+    def register(self, serial: str) -> None:
+        """
+        Keep pre-transported spares ready for this serial
+        """
+        with self._lock:
+            self._serials.add(serial)
+        self._wake.set()
+
+    def unregister(self, serial: str) -> None:
+        """
+        Stop keeping spares for this serial and close its idle connections
+        """
+        with self._lock:
+            self._serials.discard(serial)
+            idle = list(self._spares.pop(serial, ())) + list(self._idle_sync.pop(serial, ()))
+
+        for conn, _ in idle:
+            conn.close()
+
+    # ----- Connections -----
+    def _count(self, serial: str, field: str) -> None:
+        with self._lock:
+            stats = self._stats[serial]
+            setattr(stats, field, getattr(stats, field) + 1)
+
+    def _limit(self, serial: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if serial not in self._limits:
+                self._limits[serial] = threading.BoundedSemaphore(self.max_per_serial)
+            return self._limits[serial]
+
+    def _create(self, serial: str, timeout: float = None) -> Connection:
+        conn = self.client.create_connection(timeout=timeout)
+        try:
+            conn.send(f"host:transport:{serial}")
+        except Exception:
+            conn.close()
+            raise
+
+        self._count(serial, 'created')
+        return conn
+
+    @staticmethod
+    def is_healthy(conn: Connection) -> bool:
+        """
+        An idle connection is healthy as long as the server didn't close it (it would turn readable)
+        """
+        if conn.socket is None or conn.socket.fileno() < 0:
+            return False
+
+        try:
+            readable, _, _ = select([conn.socket], [], [], 0)
+        except (OSError, ValueError):
+            return False
+
+        return not readable
+
+    def _take_idle(self, serial: str, idle: dict[str, deque]) -> typing.Optional[Connection]:
+        while True:
+            with self._lock:
+                if not idle.get(serial):
+                    return None
+                conn, _ = idle[serial].pop()
+
+            if self.is_healthy(conn):
+                return conn
+
+            self._count(serial, 'unhealthy')
+            conn.close()
+
+    @contextmanager
+    def _borrow(self, serial: str):
+        limit = self._limit(serial)
+        if not limit.acquire(blocking=False):
+            self._count(serial, 'waits')
+            limit.acquire()
+
+        try:
+            yield
+        finally:
+            limit.release()
+
+    @contextmanager
+    def transport(self, serial: str, timeout: float = None) -> typing.Iterator[Connection]:
+        """
+        Borrow a connection already transported to the device, ready for a one-shot service (shell:, exec:...)
+        The connection is closed afterwards, as adb closes it anyway once the service finishes.
+        """
+        with self._borrow(serial):
+            conn = self._take_idle(serial, self._spares)
+            if conn is not None:
+                self._count(serial, 'hits')
+            else:
+                self._count(serial, 'misses')
+                conn = self._create(serial, timeout)
+
+            if timeout is not None:
+                conn.socket.settimeout(timeout)
+
+            self._wake.set()  # Top up spares in the background
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    @contextmanager
+    def sync(self, serial: str) -> typing.Iterator[Connection]:
+        """
+        Borrow a connection in sync mode, it goes back to the pool if the transfer did not fail
+        """
+        with self._borrow(serial):
+            conn = self._take_idle(serial, self._idle_sync)
+            if conn is not None:
+                self._count(serial, 'hits')
+                self._count(serial, 'sync_reused')
+            else:
+                conn = self._take_idle(serial, self._spares)
+                if conn is not None:
+                    self._count(serial, 'hits')
+                else:
+                    self._count(serial, 'misses')
+                    conn = self._create(serial)
+                conn.send("sync:")
+
+            try:
+                yield conn
+            except BaseException:
+                conn.close()  # Protocol state unknown, never reuse
+                raise
+            else:
+                with self._lock:
+                    self._idle_sync[serial].append((conn, monotonic()))
+
+    # ----- Services -----
+    def shell(self, serial: str, cmd: str, timeout: float = None) -> str:
+        with self.transport(serial, timeout) as conn:
+            conn.send(f"shell:{cmd}")
+            return conn.read_all().decode('utf-8')
+
+    def push(self, serial: str, src: str, dest: str, mode: int = 0o644, progress: typing.Callable = None) -> None:
+        if not os.path.isfile(src):
+            raise FileNotFoundError(f"Cannot find {src}")
+
+        with self.sync(serial) as conn:
+            Sync(conn).push(src, dest, mode, progress)
+
+    def pull(self, serial: str, src: str, dest: str) -> None:
+        with self.sync(serial) as conn:
+            error = Sync(conn).pull(src, dest)
+            if error:
+                # adbd ends the sync session after a FAIL, raising makes sure it's not reused
+                raise RuntimeError(f"Pulling {src} failed: {error}")
+
+    # ----- Maintenance -----
+    def _maintenance(self) -> None:
+        while self._run_maintenance:
+            self._wake.wait(self.maintenance_interval)
+            self._wake.clear()
+            if not self._run_maintenance:
+                break
+
+            self._evict_idle()
+            self._top_up()
+
+        logging.log(logging.DEBUG, "ADB connection pool maintenance exiting...")
+
+    def _evict_idle(self) -> None:
+        now = monotonic()
+        to_close = list()
+
+        with self._lock:
+            for idle in (self._spares, self._idle_sync):
+                for serial, conns in idle.items():
+                    keep = deque()
+                    for conn, since in conns:
+                        if now - since > self.idle_timeout or not self.is_healthy(conn):
+                            to_close.append(conn)
+                            self._stats[serial].evicted += 1
+                        else:
+                            keep.append((conn, since))
+                    idle[serial] = keep
+
+        for conn in to_close:
+            conn.close()
+
+    def _top_up(self) -> None:
+        with self._lock:
+            missing = {
+                serial: self.spares_per_serial - len(self._spares[serial])
+                for serial in self._serials
+                if len(self._spares[serial]) < self.spares_per_serial
+            }
+
+        for serial, count in missing.items():
+            for _ in range(count):
+                try:
+                    conn = self._create(serial)
+                except (RuntimeError, OSError) as e:
+                    # Device probably went away, the watchdog takes care of detaching it
+                    logging.log(logging.DEBUG, f"Could not create spare connection for {serial}: {e}")
+                    break
+
+                with self._lock:
+                    if serial not in self._serials:
+                        conn.close()
+                        break
+                    self._spares[serial].append((conn, monotonic()))
+
+    # ----- Stats -----
+    def stats(self, serial: str = None) -> dict:
+        """
+        Pool statistics of one serial, or totals with a per serial breakdown
+        """
+        with self._lock:
+            if serial is not None:
+                return self._stats[serial].as_dict()
+
+            per_serial = {s: st.as_dict() for s, st in self._stats.items()}
+            idle = sum(len(conns) for conns in self._spares.values()) + \
+                sum(len(conns) for conns in self._idle_sync.values())
+
+        total = {field: sum(st[field] for st in per_serial.values()) for field in PoolStats.FIELDS}
+        return {
+            **total,
+            'idle': idle,
+            'serials': per_serial
+        }
+
+    def close(self) -> None:
+        self._run_maintenance = False
+        self._wake.set()
+
+        with self._lock:
+            serials = set(self._spares) | set(self._idle_sync)
+            self._serials.clear()
+
+        for serial in serials:
+            self.unregister(serial)
@@ -0,0 +1,233 @@
+import socket
+import typing
+import logging
+import threading
+from time import sleep, monotonic
+from contextlib import contextmanager
+
+from ppadb.client import Client as AdbPy
+
+ABSENT = 'absent'  # State of serials the adb server doesn't list
+
+
+def parse_devices_list(data: str) -> dict[str, str]:
+    """
+    Parse a host:devices / host:track-devices payload ("serial\\tstate\\n" lines)
+    :return: Dict serial -> state
+    """
+    states = dict()
+    for line in data.splitlines():
+        tokens = line.split()
+        if len(tokens) >= 2:
+            states[tokens[0]] = tokens[1]
+    return states
+
+
+class ReconnectWaiter:
+    """
+    Watches one serial go away and come back in the 'device' state, e.g. while adbd restarts as root
+    """
+
+    def __init__(self, serial: str):
+        self.serial = serial
+        self.went_away = threading.Event()
+        self.came_back = threading.Event()
+
+    def on_state(self, state: str) -> None:
+        if state != 'device':
+            self.went_away.set()
+        elif self.went_away.is_set():
+            self.came_back.set()
+
+    def wait(self, timeout: float = None, disconnect_timeout: float = 2.0) -> bool:
+        """
+        Wait for the device to disconnect and reconnect
+        :param timeout: Max time for the whole reconnect
+        :param disconnect_timeout: If the device wasn't seen going away in this time, assume it didn't restart
+        :return: True if the device is back (or never left), False on timeout
+        """
+        start = monotonic()
+        if not self.went_away.wait(disconnect_timeout):
+            logging.log(logging.DEBUG, f"{self.serial} did not disconnect, assuming it didn't restart")
+            return True
+
+        remaining = None if timeout is None else max(0.0, timeout - (monotonic() - start))
+        return self.came_back.wait(remaining)
+
+
+class AdbDeviceTracker:
+    """
+    Follows host:track-devices on the adb server and keeps the state of every serial up to date,
+    so code can wait for state changes instead of polling.
+    """
+
+    def __init__(self, client: AdbPy, reconnect_interval: float = 1.0):
+        self.client = client
+        self.reconnect_interval = reconnect_interval
+
+        self._states: dict[str, str] = dict()
+        self._version: int = 0  # Bumped on every update from the adb server
+        self._cond = threading.Condition()
+        self._listeners: list[typing.Callable] = list()
+        self._reconnects: dict[str, ReconnectWaiter] = dict()
+
+        self._run_tracker: bool = False
+        self.is_connected: bool = False
+        self._conn = None
+        self.tracker_thread: typing.Optional[threading.Thread] = None
+
+    # ----- Main Stuff -----
+    def start(self) -> None:
+        if self._run_tracker:
+            return
+
+        self._run_tracker = True
+        self.tracker_thread = threading.Thread(target=self._track, args=(), daemon=True)
+        self.tracker_thread.name = 'ADBDevices-Tracker'
+        self.tracker_thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._run_tracker = False
+        with self._cond:
+            self._cond.notify_all()
+
+        conn = self._conn
+        if conn is not None:
+            # close() alone doesn't wake the tracker thread blocked in recv
+            try:
+                conn.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+        thread = self.tracker_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _track(self) -> None:
+        while self._run_tracker:
+            try:
+                self._conn = self.client.create_connection()
+                self._conn.send("host:track-devices")
+                self.is_connected = True
+
+                while self._run_tracker:
+                    size = int(self._read_exact(4).decode('utf-8'), 16)
+                    self._update(parse_devices_list(self._read_exact(size).decode('utf-8')))
+            except (RuntimeError, OSError, ValueError) as e:
+                self.is_connected = False
+                if self._run_tracker:
+                    logging.log(logging.WARNING, f"ADB device tracker lost connection: {e}")
+                    self._update(dict())
+                    sleep(self.reconnect_interval)
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+
+        logging.log(logging.DEBUG, "ADB device tracker exiting...")
+
+    def _read_exact(self, size: int) -> bytearray:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._conn.read(size - len(data))
+            if not chunk:
+                raise ConnectionResetError('Tracker connection closed by the adb server')
+            data += chunk
+        return data
+
+    def _update(self, states: dict[str, str]) -> None:
+        with self._cond:
+            changes = [
+                (serial, self._states.get(serial, ABSENT), states.get(serial, ABSENT))
+                for serial in set(self._states) | set(states)
+                if self._states.get(serial, ABSENT) != states.get(serial, ABSENT)
+            ]
+            self._states = states
+            self._version += 1
+            self._cond.notify_all()
+
+            listeners = list(self._listeners)
+            reconnects = dict(self._reconnects)
+
+        for serial, old_state, new_state in changes:
+            logging.log(logging.DEBUG, f"Tracker: {serial} {old_state} -> {new_state}")
+
+            if serial in reconnects:
+                reconnects[serial].on_state(new_state)
+
+            for listener in listeners:
+                try:
+                    listener(serial, old_state, new_state)
+                except Exception as e:
+                    logging.exception(e)
+
+    # ----- Getters -----
+    @property
+    def is_running(self) -> bool:
+        return self._run_tracker
+
+    def get_states(self) -> dict[str, str]:
+        with self._cond:
+            return dict(self._states)
+
+    def get_state(self, serial: str) -> str:
+        with self._cond:
+            return self._states.get(serial, ABSENT)
+
+    # ----- Listeners -----
+    def add_listener(self, callback: typing.Callable[[str, str, str], None]) -> None:
+        """
+        Call callback(serial, old_state, new_state) on every change (from the tracker thread)
+        """
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: typing.Callable) -> None:
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    # ----- Waiting -----
+    def wait_for_state(self, serial: str, states: typing.Union[str, typing.Iterable[str]],
+                       timeout: float = None) -> bool:
+        """
+        Block until serial is in one of the states
+        :param serial: Device serial
+        :param states: State or states, ABSENT for not listed by the adb server
+        :param timeout: Seconds, None to wait forever
+        :return: True if reached, False on timeout
+        """
+        states = {states} if isinstance(states, str) else set(states)
+        with self._cond:
+            return self._cond.wait_for(lambda: self._states.get(serial, ABSENT) in states, timeout)
+
+    def wait_for_update(self, version: int, timeout: float = None) -> int:
+        """
+        Block until the adb server sent an update newer than version
+        :param version: Last version seen, 0 at first
+        :param timeout: Seconds, None to wait forever
+        :return: Current version (unchanged on timeout)
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version or not self._run_tracker, timeout)
+            return self._version
+
+    @contextmanager
+    def expect_reconnect(self, serial: str) -> typing.Iterator[ReconnectWaiter]:
+        """
+        Mark serial as restarting for the duration of the block (the watchdog ignores it meanwhile)
+        and yield a waiter for its reconnect
+        """
+        waiter = ReconnectWaiter(serial)
+        with self._cond:
+            self._reconnects[serial] = waiter
+        try:
+            yield waiter
+        finally:
+            with self._cond:
+                if self._reconnects.get(serial) is waiter:
+                    del self._reconnects[serial]
+
+    def is_expecting_reconnect(self, serial: str) -> bool:
+        with self._cond:
+            return serial in self._reconnects
@@ -0,0 +1,610 @@
+"""
+In-process adb server emulator: speaks the host, transport, shell/exec and sync protocols on localhost
+for any number of virtual devices, so AdbClient/ADBDevice can be exercised and benchmarked without phones.
+
+    with AdbServerEmulator() as emulator:
+        emulator.add_devices(16, latency=0.002)
+        client = AdbClient(adb_port=emulator.port, start_server=False)
+"""
+import re
+import shlex
+import socket
+import struct
+import typing
+import random
+import logging
+import threading
+import socketserver
+import posixpath
+from time import sleep, time
+from collections import Counter
+
+SYNC_DATA_MAX = 64 * 1024
+S_IFREG = 0o100000
+S_IFDIR = 0o040000
+
+DEFAULT_PROPS = {
+    'ro.product.model': 'Emulated Phone',
+    'ro.product.name': 'emulated_phone',
+    'ro.product.manufacturer': 'Emulated',
+    'ro.product.board': 'emu',
+    'ro.product.cpu.abi': 'arm64-v8a',
+    'ro.build.version.release': '11',
+    'ro.build.version.sdk': '30',
+    'sys.boot_completed': '1',
+}
+
+DEFAULT_DUMPSYS = {
+    'activity': (
+        "  mWakefulness=Awake\n"
+        "  mSleeping=false mLockScreenShown=false\n"
+        "  mFocusedActivity: ActivityRecord{5d1c4e u0 com.android.launcher3/.Launcher t1}\n"
+    ),
+    'window': (
+        "  mUnrestricted=[0,0][1080,2340]\n"
+        "  mFocusedApp=AppWindowToken{a1b2c3 token=Token{d4e5f6 ActivityRecord{5d1c4e u0 "
+        "com.android.launcher3/.Launcher t1}}}\n"
+    ),
+    'deviceidle': "  mScreenOn=true\n",
+    'battery': (
+        "Current Battery Service state:\n  AC powered: false\n  USB powered: true\n  Wireless powered: false\n"
+        "  status: 2\n  health: 2\n  present: true\n  level: 85\n  scale: 100\n  temperature: 281\n"
+    ),
+    'thermalservice': "IsStatusOverride: false\nThermal Status: 0\n",
+}
+
+DEFAULT_UI_XML = (
+    "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">"
+    "<node index=\"0\" text=\"\" resource-id=\"\" class=\"android.widget.FrameLayout\" "
+    "package=\"com.android.launcher3\" content-desc=\"\" clickable=\"false\" bounds=\"[0,0][1080,2340]\" />"
+    "</hierarchy>"
+)
+
+
+def encode_message(data: typing.Union[str, bytes]) -> bytes:
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return f"{len(data):04X}".encode('utf-8') + data
+
+
+def fail_message(message: str) -> bytes:
+    return b'FAIL' + encode_message(message)
+
+
+class VirtualDevice:
+    """
+    A device behind the emulator: properties, a flat in-memory filesystem, canned dumpsys/uiautomator output,
+    link characteristics and failure injection
+    """
+
+    def __init__(self, serial: str, state: str = 'device', props: dict = None, files: dict[str, bytes] = None,
+                 dumpsys: dict[str, str] = None, ui_xml: str = DEFAULT_UI_XML, packages: typing.Iterable[str] = (),
+                 latency: float = 0.0, bandwidth: float = None, failure_rate: float = 0.0,
+                 fail_commands: dict[str, str] = None, rooted: bool = False, restart_time: float = 0.2,
+                 boot_time: float = 1.0, boot_completed_delay: float = 0.0, screen_size: tuple = (108, 234)):
+        """
+        :param latency: Seconds added before answering every service request
+        :param bandwidth: Bytes/s for data sent to the host (shell output, pulls, screencaps), None for unlimited
+        :param failure_rate: Probability (0-1) that a service connection is dropped without an answer
+        :param fail_commands: Dict shell command substring -> error message answered with FAIL
+        :param restart_time: Seconds adbd is gone when restarting as root
+        :param boot_time: Seconds the device is gone on reboot
+        :param boot_completed_delay: Seconds between the device coming back and sys.boot_completed=1
+        """
+        self.serial = serial
+        self.state = state
+        self.props = {**DEFAULT_PROPS, **(props or {})}
+        self.files: dict[str, bytes] = dict(files or {})
+        self.dumpsys = {**DEFAULT_DUMPSYS, **(dumpsys or {})}
+        self.ui_xml = ui_xml
+        self.packages = set(packages)
+        self.settings: dict[str, str] = {'global/adb_enabled': '1'}
+
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.fail_commands = dict(fail_commands or {})
+        self.rooted = rooted
+        self.restart_time = restart_time
+        self.boot_time = boot_time
+        self.boot_completed_delay = boot_completed_delay
+        self.screen_size = screen_size
+
+        self.shell_handlers: list[tuple[typing.Pattern, typing.Callable]] = list()
+        self.commands: Counter = Counter()  # Shell command name -> count
+
+    def add_shell_handler(self, pattern: str, handler: typing.Callable[['VirtualDevice', re.Match], str]) -> None:
+        """
+        Answer shell commands matching pattern with handler(device, match), checked before the built-ins
+        """
+        self.shell_handlers.append((re.compile(pattern), handler))
+
+    # ----- Filesystem -----
+    def is_dir(self, file_path: str) -> bool:
+        prefix = file_path.rstrip('/') + '/'
+        return file_path == '/' or any(f.startswith(prefix) for f in self.files)
+
+    def list_dir(self, dir_path: str) -> list[tuple[str, int, int]]:
+        """
+        :return: List of (name, mode, size) of the direct children
+        """
+        prefix = dir_path.rstrip('/') + '/'
+        entries = dict()
+        for file_path, data in self.files.items():
+            if not file_path.startswith(prefix):
+                continue
+            name, _, rest = file_path[len(prefix):].partition('/')
+            entries[name] = (S_IFDIR | 0o755, 0) if rest else (S_IFREG | 0o644, len(data))
+        return [(name, mode, size) for name, (mode, size) in sorted(entries.items())]
+
+    # ----- Shell -----
+    def run_shell(self, cmd: str) -> str:
+        if ';' in cmd:
+            return ''.join(self.run_shell(part) for part in cmd.split(';') if part.strip())
+
+        stages = [stage.strip() for stage in cmd.split('|')]
+        output = self._run_command(stages[0])
+        for stage in stages[1:]:
+            output = self._filter(stage, output)
+        return output
+
+    @staticmethod
+    def _filter(stage: str, output: str) -> str:
+        try:
+            args = shlex.split(stage)
+        except ValueError:
+            return output
+        if not args or args[0] != 'grep':
+            return output
+
+        pattern = [a for a in args[1:] if not a.startswith('-')]
+        if not pattern:
+            return output
+        regex = re.compile(pattern[0])
+        return ''.join(line for line in output.splitlines(keepends=True) if regex.search(line))
+
+    def _run_command(self, cmd: str) -> str:
+        for pattern, handler in self.shell_handlers:
+            m = pattern.search(cmd)
+            if m:
+                return handler(self, m)
+
+        redirect = None
+        if '>' in cmd:
+            cmd, _, redirect = cmd.partition('>')
+            redirect = redirect.strip()
+
+        try:
+            args = shlex.split(cmd)
+        except ValueError:
+            args = cmd.split()
+        if not args:
+            return ''
+
+        name = args[0]
+        self.commands[name] += 1
+
+        if name == 'echo':
+            output = ' '.join(args[1:]) + '\n'
+            if redirect:
+                self.files[redirect] = output.encode('utf-8')
+                return ''
+            return output
+        if name == 'df':
+            return ("Filesystem     1K-blocks    Used Available Use% Mounted on\n"
+                    "/dev/block/dm-5 115805708 9318924 106355712   9% /data\n")
+        if name == 'getprop':
+            if len(args) > 1:
+                return self.props.get(args[1], '') + '\n'
+            return ''.join(f"[{k}]: [{v}]\n" for k, v in sorted(self.props.items()))
+        if name == 'setprop' and len(args) > 2:
+            self.props[args[1]] = args[2]
+            return ''
+        if name == 'dumpsys':
+            if len(args) > 1:
+                return self.dumpsys.get(args[1], '')
+            return ''.join(f"DUMP OF SERVICE {k}:\n{v}" for k, v in self.dumpsys.items())
+        if name == 'uiautomator' and len(args) > 1 and args[1] == 'dump':
+            dest = args[2] if len(args) > 2 else '/sdcard/window_dump.xml'
+            self.files[dest] = self.ui_xml.encode('utf-8')
+            return f"UI hierchary dumped to: {dest}\n"
+        if name == 'cat' and len(args) > 1:
+            data = self.files.get(args[1])
+            return data.decode('utf-8', errors='replace') if data is not None else \
+                f"cat: {args[1]}: No such file or directory\n"
+        if name == 'ls':
+            return self._ls(args[1:])
+        if name == 'rm':
+            targets = [a for a in args[1:] if not a.startswith('-')]
+            for target in targets:
+                prefix = target.rstrip('/') + '/'
+                for file_path in [f for f in self.files if f == target or f.startswith(prefix)]:
+                    del self.files[file_path]
+            return ''
+        if name == 'pm':
+            if args[1:3] == ['list', 'packages']:
+                return ''.join(f"package:{p}\n" for p in sorted(self.packages))
+            if len(args) > 2 and args[1] == 'path':
+                return f"package:/data/app/{args[2]}/base.apk\n" if args[2] in self.packages else ''
+            if len(args) > 1 and args[1] == 'install':
+                return 'Success\n'
+            return ''
+        if name == 'settings' and len(args) > 3:
+            key = f"{args[2]}/{args[3]}"
+            if args[1] == 'put' and len(args) > 4:
+                self.settings[key] = args[4]
+                return ''
+            return self.settings.get(key, 'null') + '\n'
+
+        return ''  # input, am, monkey, logcat... succeed silently
+
+    def _ls(self, args: list[str]) -> str:
+        recursive = '-R' in args
+        targets = [a for a in args if not a.startswith('-')] or ['/']
+        output = list()
+
+        for target in targets:
+            if target in self.files:
+                output.append(target)
+                continue
+            if not self.is_dir(target):
+                output.append(f"ls: {target}: No such file or directory")
+                continue
+
+            dirs = [target.rstrip('/') or '/']
+            while dirs:
+                current = dirs.pop(0)
+                entries = self.list_dir(current)
+                if recursive:
+                    output.append(f"{current}:")
+                output.extend(name for name, _, _ in entries)
+                if recursive:
+                    output.append('')
+                    dirs.extend(posixpath.join(current, n) for n, mode, _ in entries if mode & S_IFDIR)
+
+        return '\n'.join(output) + '\n'
+
+    def screencap(self) -> bytes:
+        w, h = self.screen_size
+        header = struct.pack('<IIII', w, h, 1, 0) if int(self.props.get('ro.build.version.sdk', 0)) >= 28 else \
+            struct.pack('<III', w, h, 1)
+        return header + bytes(w * h * 4)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: '_Server'
+
+    def handle(self) -> None:
+        emulator = self.server.emulator
+        emulator.connections += 1
+        try:
+            emulator.handle_client(self.request)
+        except (OSError, ValueError, struct.error):
+            pass  # Client went away
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address, emulator: 'AdbServerEmulator'):
+        self.emulator = emulator
+        super().__init__(address, _Handler)
+
+
+class AdbServerEmulator:
+    """
+    Emulated adb server for VirtualDevices, one thread per client connection like the real one
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self._requested_port = port
+
+        self.devices: dict[str, VirtualDevice] = dict()
+        self._cond = threading.Condition()
+        self._version: int = 0  # Bumped on every device list change, wakes track-devices clients
+
+        self.connections: int = 0
+        self.services: Counter = Counter()
+        self.bytes_sent: int = 0
+
+        self._server: typing.Optional[_Server] = None
+        self.server_thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1] if self._server else self._requested_port
+
+    # ----- Main Stuff -----
+    def start(self) -> 'AdbServerEmulator':
+        self._server = _Server((self.host, self._requested_port), self)
+        self.server_thread = threading.Thread(target=self._server.serve_forever, args=(), daemon=True)
+        self.server_thread.name = 'AdbServer-Emulator'
+        self.server_thread.start()
+
+        logging.log(logging.DEBUG, f"adb server emulator listening on {self.host}:{self.port}")
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+
+    def __enter__(self) -> 'AdbServerEmulator':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    # ----- Devices -----
+    def add_device(self, serial: str, **kwargs) -> VirtualDevice:
+        """
+        Plug in a virtual device, kwargs are passed to VirtualDevice
+        """
+        device = VirtualDevice(serial, **kwargs)
+        with self._cond:
+            self.devices[serial] = device
+            self._changed()
+        return device
+
+    def add_devices(self, count: int, prefix: str = 'emulated', **kwargs) -> list[VirtualDevice]:
+        return [self.add_device(f"{prefix}{i:04d}", **kwargs) for i in range(count)]
+
+    def remove_device(self, serial: str) -> None:
+        with self._cond:
+            self.devices.pop(serial, None)
+            self._changed()
+
+    def set_state(self, serial: str, state: str) -> None:
+        """
+        Change the adb state of a device (device, offline, unauthorized, recovery...)
+        """
+        with self._cond:
+            self.devices[serial].state = state
+            self._changed()
+
+    def _changed(self) -> None:
+        # Must hold self._cond
+        self._version += 1
+        self._cond.notify_all()
+
+    def _disappear(self, device: VirtualDevice, duration: float, then: typing.Callable = None) -> None:
+        """
+        Take the device off the list for a while, like adbd restarting or a reboot
+        """
+        def back():
+            sleep(duration)
+            with self._cond:
+                if then is not None:
+                    then()
+                if self.devices.get(device.serial) is device:
+                    device.state = 'device'
+                    self._changed()
+
+        with self._cond:
+            device.state = 'absent'
+            self._changed()
+
+        thread = threading.Thread(target=back, args=(), daemon=True)
+        thread.name = f'AdbServer-Emulator-{device.serial}'
+        thread.start()
+
+    def get_devices_list(self) -> str:
+        with self._cond:
+            return ''.join(f"{s}\t{d.state}\n" for s, d in self.devices.items() if d.state != 'absent')
+
+    # ----- Protocol -----
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionResetError('Client closed the connection')
+            data += chunk
+        return bytes(data)
+
+    def _read_request(self, sock: socket.socket) -> str:
+        size = int(self._recv_exact(sock, 4).decode('utf-8'), 16)
+        return self._recv_exact(sock, size).decode('utf-8')
+
+    def _send(self, sock: socket.socket, data: bytes, device: VirtualDevice = None) -> None:
+        if device is None or not device.bandwidth:
+            sock.sendall(data)
+        else:
+            view = memoryview(data)
+            for offset in range(0, len(data), SYNC_DATA_MAX):
+                chunk = view[offset:offset + SYNC_DATA_MAX]
+                sock.sendall(chunk)
+                sleep(len(chunk) / device.bandwidth)
+        self.bytes_sent += len(data)
+
+    def handle_client(self, sock: socket.socket) -> None:
+        device: typing.Optional[VirtualDevice] = None
+
+        while True:
+            request = self._read_request(sock)
+            if device is None:
+                self.services[':'.join(request.split(':')[:2])] += 1
+
+                if request == 'host:version':
+                    sock.sendall(b'OKAY' + encode_message('0029'))
+                elif request in ('host:devices', 'host:devices-l'):
+                    sock.sendall(b'OKAY' + encode_message(self.get_devices_list()))
+                elif request == 'host:track-devices':
+                    sock.sendall(b'OKAY')
+                    self._track_devices(sock)
+                    return
+                elif request.startswith('host:transport:') or request == 'host:transport-any':
+                    device, error = self._find_device(request)
+                    if device is None:
+                        sock.sendall(fail_message(error))
+                        return
+                    sock.sendall(b'OKAY')
+                elif request.startswith('host-serial:') and request.endswith(':get-state'):
+                    found, error = self._find_device('host:transport:' + request.split(':')[1])
+                    sock.sendall(b'OKAY' + encode_message(found.state) if found else fail_message(error))
+                elif request == 'host:kill':
+                    sock.sendall(b'OKAY')
+                    return
+                else:
+                    sock.sendall(fail_message(f"unknown host service '{request}'"))
+                    return
+                continue
+
+            self._handle_device_service(sock, device, request)
+            return
+
+    def _find_device(self, request: str) -> tuple[typing.Optional[VirtualDevice], str]:
+        with self._cond:
+            if request == 'host:transport-any':
+                online = [d for d in self.devices.values() if d.state == 'device']
+                if len(online) != 1:
+                    return None, 'more than one device' if online else 'no devices/emulators found'
+                return online[0], ''
+
+            serial = request[len('host:transport:'):]
+            device = self.devices.get(serial)
+            if device is None or device.state == 'absent':
+                return None, f"device '{serial}' not found"
+            if device.state != 'device':
+                return None, f"device {device.state}"
+            return device, ''
+
+    def _track_devices(self, sock: socket.socket) -> None:
+        last_sent = None
+        version = -1
+        while self._server is not None:
+            with self._cond:
+                self._cond.wait_for(lambda: self._version != version, timeout=0.5)
+                version = self._version
+
+            devices_list = self.get_devices_list()
+            if devices_list != last_sent:
+                sock.sendall(encode_message(devices_list))
+                last_sent = devices_list
+            else:
+                # Notice clients that went away while nothing changed
+                sock.setblocking(False)
+                try:
+                    if sock.recv(1) == b'':
+                        return
+                except BlockingIOError:
+                    pass
+                finally:
+                    sock.setblocking(True)
+
+    def _handle_device_service(self, sock: socket.socket, device: VirtualDevice, service: str) -> None:
+        if device.latency:
+            sleep(device.latency)
+        if device.failure_rate and random.random() < device.failure_rate:
+            return  # Connection dropped, like a flaky USB link
+
+        kind, _, arg = service.partition(':')
+        self.services[kind] += 1
+        if kind in ('shell', 'exec'):
+            for marker, message in device.fail_commands.items():
+                if marker in arg:
+                    sock.sendall(fail_message(message))
+                    return
+
+            sock.sendall(b'OKAY')
+            if arg.strip() == 'screencap':
+                self._send(sock, device.screencap(), device)
+            elif arg.startswith('cmd package install') and ' -S ' in arg:
+                size = int(arg.split(' -S ')[1].split()[0])
+                self._recv_exact(sock, size)
+                self._send(sock, b'Success\n', device)
+            else:
+                self._send(sock, device.run_shell(arg).encode('utf-8'), device)
+        elif kind == 'root':
+            sock.sendall(b'OKAY')
+            if device.rooted:
+                sock.sendall(b'adbd is already running as root\n')
+            else:
+                sock.sendall(b'restarting adbd as root\n')
+                sock.close()
+                self._disappear(device, device.restart_time, then=lambda: setattr(device, 'rooted', True))
+        elif kind == 'remount':
+            sock.sendall(b'OKAY' + b'remount succeeded\n')
+        elif kind == 'disable-verity':
+            sock.sendall(b'OKAY' + b'Verity disabled on /system\nNow reboot your device for settings to take effect\n')
+        elif kind == 'reboot':
+            sock.sendall(b'OKAY')
+            sock.close()
+            device.props['sys.boot_completed'] = ''
+            device.rooted = False  # adbd comes back as shell
+
+            def boot_completed():
+                timer = threading.Timer(device.boot_completed_delay, device.props.update, ({'sys.boot_completed': '1'},))
+                timer.daemon = True
+                timer.start()
+
+            self._disappear(device, device.boot_time, then=boot_completed)
+        elif kind == 'sync':
+            sock.sendall(b'OKAY')
+            self._sync(sock, device)
+        else:
+            sock.sendall(fail_message(f"unknown service '{service}'"))
+
+    def _sync(self, sock: socket.socket, device: VirtualDevice) -> None:
+        while True:
+            cmd, length = struct.unpack('<4sI', self._recv_exact(sock, 8))
+            if cmd == b'QUIT':
+                return
+            arg = self._recv_exact(sock, length).decode('utf-8')
+
+            if cmd == b'STAT':
+                if arg in device.files:
+                    sock.sendall(b'STAT' + struct.pack('<III', S_IFREG | 0o644, len(device.files[arg]), int(time())))
+                elif device.is_dir(arg):
+                    sock.sendall(b'STAT' + struct.pack('<III', S_IFDIR | 0o755, 0, int(time())))
+                else:
+                    sock.sendall(b'STAT' + struct.pack('<III', 0, 0, 0))
+            elif cmd == b'LIST':
+                entries = b''.join(
+                    b'DENT' + struct.pack('<IIII', mode, size, int(time()), len(name)) + name.encode('utf-8')
+                    for name, mode, size in device.list_dir(arg)
+                )
+                sock.sendall(entries + b'DONE' + bytes(16))
+            elif cmd == b'RECV':
+                data = device.files.get(arg)
+                if data is None:
+                    message = b'No such file or directory'
+                    sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+                    continue
+                view = memoryview(data)
+                for offset in range(0, len(data), SYNC_DATA_MAX):
+                    chunk = view[offset:offset + SYNC_DATA_MAX]
+                    self._send(sock, b'DATA' + struct.pack('<I', len(chunk)) + chunk, device)
+                sock.sendall(b'DONE' + struct.pack('<I', 0))
+            elif cmd == b'SEND':
+                dest = arg.rsplit(',', 1)[0]
+                data = bytearray()
+                while True:
+                    chunk_id, chunk_len = struct.unpack('<4sI', self._recv_exact(sock, 8))
+                    if chunk_id == b'DONE':
+                        break
+                    data += self._recv_exact(sock, chunk_len)
+                device.files[dest] = bytes(data)
+                sock.sendall(b'OKAY' + struct.pack('<I', 0))
+            else:
+                message = b'unknown command'
+                sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+                return
+
+    # ----- Stats -----
+    def stats(self) -> dict:
+        return {
+            'devices': len(self.devices),
+            'connections': self.connections,
+            'bytes_sent': self.bytes_sent,
+            'services': dict(self.services),
+        }
@@ -0,0 +1,274 @@
+import re
+import typing
+import struct
+import logging
+import zipfile
+import threading
+from os import path, stat
+from time import perf_counter
+from shlex import quote as cmd_quote
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ppadb.sync import Sync
+
+from android.AdbConnectionPool import AdbConnectionPool
+
+# Binary XML (AndroidManifest.xml inside APKs) chunk types
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_XML_START_ELEMENT_TYPE = 0x0102
+UTF8_FLAG = 0x100
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+VERSION_CODE_RES_ID = 0x0101021b
+
+INSTALL_RESULT_PATTERN = r"(Success|Failure|Error)\s?(.*)"
+STREAMED_INSTALL_MIN_SDK = 24  # cmd package install -S
+
+
+class ApkInfo(typing.NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    package: str
+    version_code: int
+
+
+class InstallResult(typing.NamedTuple):
+    serial: str
+    status: str  # installed, skipped or failed
+    method: typing.Optional[str]  # streamed or push
+    device_version: typing.Optional[int]
+    elapsed: float
+    error: typing.Optional[str] = None
+
+
+def _read_pool_string(data: bytes, pool_offset: int, index: int) -> str:
+    _, header_size, _, count, _, flags, strings_start, _ = struct.unpack_from('<HHIIIIII', data, pool_offset)
+    if index < 0 or index >= count:
+        return ''
+
+    offset = struct.unpack_from('<I', data, pool_offset + header_size + index * 4)[0]
+    pos = pool_offset + strings_start + offset
+
+    if flags & UTF8_FLAG:
+        # Char count then byte count, both 1 or 2 bytes long
+        pos += 2 if data[pos] & 0x80 else 1
+        length = data[pos]
+        if length & 0x80:
+            length = ((length & 0x7F) << 8) | data[pos + 1]
+            pos += 1
+        pos += 1
+        return data[pos:pos + length].decode('utf-8', errors='replace')
+
+    length = struct.unpack_from('<H', data, pos)[0]
+    if length & 0x8000:
+        length = ((length & 0x7FFF) << 16) | struct.unpack_from('<H', data, pos + 2)[0]
+        pos += 2
+    pos += 2
+    return data[pos:pos + length * 2].decode('utf-16-le', errors='replace')
+
+
+def parse_manifest(data: bytes) -> tuple[str, int]:
+    """
+    Read package name and versionCode from a binary AndroidManifest.xml
+    :return: Tuple (package, version_code)
+    """
+    pool_offset = None
+    resource_ids: list = []
+    pos = struct.unpack_from('<H', data, 2)[0]  # Skip the file header
+
+    while pos + 8 <= len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from('<HHI', data, pos)
+        if chunk_size == 0:
+            break
+
+        if chunk_type == RES_STRING_POOL_TYPE and pool_offset is None:
+            pool_offset = pos
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = list(struct.unpack_from(f'<{(chunk_size - header_size) // 4}I', data, pos + header_size))
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE and pool_offset is not None:
+            ext = pos + header_size
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from('<IIHHH', data, ext)
+
+            if _read_pool_string(data, pool_offset, name) == 'manifest':
+                package = ''
+                version_code = 0
+                for i in range(attr_count):
+                    attr = ext + attr_start + i * attr_size
+                    _, attr_name, raw_value, _, _, data_type, value = struct.unpack_from('<IIIHBBI', data, attr)
+
+                    name_str = _read_pool_string(data, pool_offset, attr_name)
+                    res_id = resource_ids[attr_name] if attr_name < len(resource_ids) else None
+
+                    if name_str == 'package':
+                        package = _read_pool_string(data, pool_offset, raw_value)
+                    elif name_str == 'versionCode' or res_id == VERSION_CODE_RES_ID:
+                        if data_type in (TYPE_INT_DEC, TYPE_INT_HEX):
+                            version_code = value
+                        elif data_type == TYPE_STRING:
+                            version_code = int(_read_pool_string(data, pool_offset, raw_value) or 0)
+
+                return package, version_code
+
+        pos += chunk_size
+
+    raise ValueError('No manifest element found in AndroidManifest.xml')
+
+
+def read_apk_info(apk: str) -> ApkInfo:
+    st = stat(apk)
+    with zipfile.ZipFile(apk) as zf:
+        package, version_code = parse_manifest(zf.read('AndroidManifest.xml'))
+
+    return ApkInfo(path.realpath(apk), st.st_size, st.st_mtime_ns, package, version_code)
+
+
+class ApkCache:
+    """
+    Host-side cache of parsed APK info and contents, keyed by path + size + mtime,
+    so installing one APK on a whole fleet reads and parses it only once
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[str, tuple[ApkInfo, typing.Optional[bytes]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, apk: str) -> typing.Optional[tuple[ApkInfo, typing.Optional[bytes]]]:
+        st = stat(apk)
+        real_path = path.realpath(apk)
+
+        with self._lock:
+            entry = self._entries.get(real_path)
+            if entry is None or entry[0].size != st.st_size or entry[0].mtime_ns != st.st_mtime_ns:
+                return None
+
+            self._entries.move_to_end(real_path)
+            return entry
+
+    def _store(self, info: ApkInfo, data: typing.Optional[bytes]) -> None:
+        with self._lock:
+            self._entries[info.path] = (info, data)
+            self._entries.move_to_end(info.path)
+
+            # Drop contents (not the parsed info) of the least recently used APKs over the budget
+            total = sum(len(d) for _, d in self._entries.values() if d is not None)
+            for key, (entry_info, entry_data) in self._entries.items():
+                if total <= self.max_bytes:
+                    break
+                if entry_data is not None and key != info.path:
+                    self._entries[key] = (entry_info, None)
+                    total -= len(entry_data)
+
+    def get_info(self, apk: str) -> ApkInfo:
+        entry = self._lookup(apk)
+        if entry is not None:
+            return entry[0]
+
+        info = read_apk_info(apk)
+        self._store(info, None)
+        return info
+
+    def get_data(self, apk: str) -> bytes:
+        entry = self._lookup(apk)
+        if entry is not None and entry[1] is not None:
+            return entry[1]
+
+        info = entry[0] if entry is not None else read_apk_info(apk)
+        with open(apk, 'rb') as f:
+            data = f.read()
+
+        if len(data) <= self.max_bytes:
+            self._store(info, data)
+        return data
+
+
+def get_installed_version(pool: AdbConnectionPool, serial: str, package: str) -> typing.Optional[int]:
+    """
+    versionCode of the package on the device, None if it's not installed
+    """
+    output = pool.shell(serial, f"dumpsys package {cmd_quote(package)} | grep versionCode=")
+    versions = [int(v) for v in re.findall(r"versionCode=(\d+)", output)]
+    return max(versions) if versions else None
+
+
+def install_streamed(pool: AdbConnectionPool, serial: str, data: bytes, extra_args: str = '-r') -> str:
+    """
+    Stream the APK straight into the package manager, without a temporary file on the device
+    """
+    with pool.transport(serial) as conn:
+        conn.send(f"exec:cmd package install {extra_args} -S {len(data)}")
+        conn.socket.sendall(data)
+        return conn.read_all().decode('utf-8', errors='replace')
+
+
+def install_pushed(pool: AdbConnectionPool, serial: str, apk: str, extra_args: str = '-r') -> str:
+    """
+    Classic install: push to /data/local/tmp, pm install, remove
+    """
+    dest = Sync.temp(apk)
+    pool.push(serial, apk, dest)
+    try:
+        return pool.shell(serial, f"pm install {extra_args} {cmd_quote(dest)}")
+    finally:
+        pool.shell(serial, f"rm -f {cmd_quote(dest)}")
+
+
+def install_on_device(pool: AdbConnectionPool, serial: str, apk: str, cache: ApkCache,
+                      force: bool = False, extra_args: str = '-r') -> InstallResult:
+    start = perf_counter()
+    method = None
+    device_version = None
+
+    try:
+        info = cache.get_info(apk)
+        device_version = get_installed_version(pool, serial, info.package)
+
+        if not force and device_version is not None and device_version >= info.version_code:
+            return InstallResult(serial, 'skipped', None, device_version, perf_counter() - start)
+
+        sdk = pool.shell(serial, "getprop ro.build.version.sdk").strip()
+        if sdk.isdigit() and int(sdk) >= STREAMED_INSTALL_MIN_SDK:
+            method = 'streamed'
+            output = install_streamed(pool, serial, cache.get_data(apk), extra_args)
+        else:
+            method = 'push'
+            output = install_pushed(pool, serial, apk, extra_args)
+
+        match_result = re.search(INSTALL_RESULT_PATTERN, output)
+        if match_result and match_result.group(1) == "Success":
+            return InstallResult(serial, 'installed', method, device_version, perf_counter() - start)
+
+        error = match_result.group(2) if match_result else output.strip()
+    except (RuntimeError, OSError, ValueError, zipfile.BadZipFile) as e:
+        error = str(e)
+
+    return InstallResult(serial, 'failed', method, device_version, perf_counter() - start, error)
+
+
+def install_on_fleet(pool: AdbConnectionPool, serials: typing.Iterable[str], apk: str, cache: ApkCache,
+                     max_parallel: int = 8, force: bool = False,
+                     extra_args: str = '-r') -> typing.Iterator[InstallResult]:
+    """
+    Install an APK on many devices concurrently
+    :return: Iterator of InstallResult in completion order
+    """
+    # Parse and load once up front, instead of in every worker
+    info = cache.get_info(apk)
+    cache.get_data(apk)
+    logging.log(logging.INFO, f"Installing {info.package} (versionCode {info.version_code}) on the fleet")
+
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='ApkInstaller') as executor:
+        futures = [
+            executor.submit(install_on_device, pool, serial, apk, cache, force, extra_args)
+            for serial in serials
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            logging.log(logging.INFO if result.status != 'failed' else logging.ERROR,
+                        f"{result.serial}: {result.status} ({result.elapsed:.2f} s) {result.error or ''}")
+            yield result
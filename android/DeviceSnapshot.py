@@ -0,0 +1,169 @@
+"""
+Power, lock, display, battery and thermal state of a device gathered by one shell command
+and parsed into a typed snapshot, instead of a dumpsys | grep round-trip per getter.
+"""
+import re
+import typing
+import logging
+from time import monotonic
+
+SECTION_MARKER = '=='
+
+# Section name -> device side command, all run by a single shell: call
+SNAPSHOT_SECTIONS = {
+    'activity': "dumpsys activity | grep -E 'mWakefulness|mSleeping|mLockScreenShown|mFocusedActivity|ResumedActivity'",
+    'window': "dumpsys window | grep -E 'mUnrestricted|mFocusedApp'",
+    'deviceidle': "dumpsys deviceidle | grep -E 'mScreenOn'",
+    'battery': "dumpsys battery | grep -E 'powered|status|level|temperature'",
+    'thermal': "dumpsys thermalservice 2>/dev/null | grep -E 'Thermal Status'",
+    'adb': "settings get global adb_enabled",
+    'storage': "df /data",
+}
+
+BATTERY_STATUSES = {1: 'unknown', 2: 'charging', 3: 'discharging', 4: 'not_charging', 5: 'full'}
+
+
+class DeviceSnapshot(typing.NamedTuple):
+    """
+    Device state at one point in time, None for anything the device didn't report
+    """
+    taken: float  # monotonic() when the snapshot was read
+    wakefulness: typing.Optional[str] = None  # Awake, Asleep, Dreaming, Dozing
+    sleeping: typing.Optional[bool] = None
+    lock_screen_shown: typing.Optional[bool] = None
+    screen_on: typing.Optional[bool] = None
+    resolution: typing.Optional[tuple[int, int]] = None  # Width, height
+    battery_level: typing.Optional[int] = None  # Percent
+    battery_status: typing.Optional[str] = None  # See BATTERY_STATUSES
+    battery_temperature: typing.Optional[float] = None  # Celsius
+    powered: typing.Optional[bool] = None  # AC, USB or wireless
+    thermal_status: typing.Optional[int] = None  # 0 (none) to 6 (shutdown), PowerManager.THERMAL_STATUS_*
+    adb_enabled: typing.Optional[bool] = None
+    foreground_app: typing.Optional[str] = None  # Package of the focused activity
+    storage_free: typing.Optional[int] = None  # Bytes available on /data
+
+    def age(self) -> float:
+        return monotonic() - self.taken
+
+    @property
+    def is_empty(self) -> bool:
+        """
+        True when the device reported nothing, e.g. the shell command failed
+        """
+        return all(value is None for value in self[1:])
+
+
+def build_snapshot_command(sections: typing.Iterable[str] = None) -> str:
+    """
+    :param sections: Names from SNAPSHOT_SECTIONS, all of them by default
+    :return: One shell command printing every section after a ==name== marker line
+    """
+    sections = SNAPSHOT_SECTIONS if sections is None else sections
+    return '; '.join(f"echo {SECTION_MARKER}{name}{SECTION_MARKER}; {SNAPSHOT_SECTIONS[name]}" for name in sections)
+
+
+def split_sections(output: str) -> dict[str, str]:
+    sections = dict()
+    current = None
+    for line in output.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(SECTION_MARKER) and stripped.endswith(SECTION_MARKER) and len(stripped) > 4:
+            current = stripped[len(SECTION_MARKER):-len(SECTION_MARKER)]
+            sections[current] = ''
+        elif current is not None:
+            sections[current] += line + '\n'
+    return sections
+
+
+def _bool(value: typing.Optional[str]) -> typing.Optional[bool]:
+    if value is None:
+        return None
+    return value.strip().lower() in ('true', '1')
+
+
+def _int(value: typing.Optional[str]) -> typing.Optional[int]:
+    try:
+        return int(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _find(pattern: str, text: str) -> typing.Optional[str]:
+    m = re.search(pattern, text)
+    return m.group(1) if m else None
+
+
+def _parse_resolution(text: str) -> typing.Optional[tuple[int, int]]:
+    # mUnrestricted=[0,0][1080,2340] on most versions, mUnrestricted=(0,0) 1080x2340 on some older ones
+    m = re.search(r'mUnrestricted=\[(-?\d+),(-?\d+)]\[(\d+),(\d+)]', text)
+    if m:
+        return int(m.group(3)) - int(m.group(1)), int(m.group(4)) - int(m.group(2))
+
+    m = re.search(r'mUnrestricted=\S*\s+(\d+)x(\d+)', text)
+    if m:
+        return int(m.group(1)), int(m.group(2))
+    return None
+
+
+def _parse_foreground_app(*texts: str) -> typing.Optional[str]:
+    # e.g. mFocusedActivity: ActivityRecord{5d1c4e u0 com.android.launcher3/.Launcher t1}
+    for text in texts:
+        m = re.search(r'(?:mFocusedActivity|ResumedActivity|mFocusedApp)\S*.*?\su\d+\s+([\w.]+)/', text)
+        if m:
+            return m.group(1)
+    return None
+
+
+def _parse_storage_free(text: str) -> typing.Optional[int]:
+    # Filesystem 1K-blocks Used Available Use% Mounted on (toybox df, sizes in KB)
+    lines = [line.split() for line in text.splitlines() if line.strip()]
+    if len(lines) < 2 or len(lines[-1]) < 4:
+        return None
+
+    available = lines[-1][3]
+    return int(available) * 1024 if available.isdigit() else None
+
+
+def parse_snapshot(output: str, taken: float = None) -> DeviceSnapshot:
+    sections = split_sections(output)
+    activity = sections.get('activity', '')
+    battery = sections.get('battery', '')
+
+    powered = None
+    sources = re.findall(r'(?:AC|USB|Wireless|Dock) powered:\s*(\w+)', battery)
+    if sources:
+        powered = any(_bool(source) for source in sources)
+
+    temperature = _int(_find(r'temperature:\s*(-?\d+)', battery))
+    status = _int(_find(r'\bstatus:\s*(\d+)', battery))
+
+    adb = sections.get('adb', '').strip()
+
+    return DeviceSnapshot(
+        taken=monotonic() if taken is None else taken,
+        wakefulness=_find(r'mWakefulness=(\w+)', activity),
+        sleeping=_bool(_find(r'mSleeping=(\w+)', activity)),
+        lock_screen_shown=_bool(_find(r'mLockScreenShown=(\w+)', activity)),
+        screen_on=_bool(_find(r'mScreenOn=(\w+)', sections.get('deviceidle', ''))),
+        resolution=_parse_resolution(sections.get('window', '')),
+        battery_level=_int(_find(r'\blevel:\s*(\d+)', battery)),
+        battery_status=BATTERY_STATUSES.get(status) if status is not None else None,
+        battery_temperature=temperature / 10 if temperature is not None else None,  # Tenths of a degree
+        powered=powered,
+        thermal_status=_int(_find(r'Thermal Status:\s*(\d+)', sections.get('thermal', ''))),
+        adb_enabled=_bool(adb) if adb in ('0', '1') else None,
+        foreground_app=_parse_foreground_app(activity, sections.get('window', '')),
+        storage_free=_parse_storage_free(sections.get('storage', '')),
+    )
+
+
+def read_snapshot(shell: typing.Callable[[str], str], sections: typing.Iterable[str] = None) -> DeviceSnapshot:
+    """
+    :param shell: Runs a shell command on the device and returns its output (e.g. ADBDevice.exec_shell)
+    """
+    taken = monotonic()  # Before the round-trip, so the TTL never overstates freshness
+    output = shell(build_snapshot_command(sections))
+    if output is None:
+        logging.log(logging.WARNING, "Device snapshot got no output")
+        return DeviceSnapshot(taken=taken)
+    return parse_snapshot(output, taken)
@@ -0,0 +1,122 @@
+import typing
+import logging
+from time import monotonic
+
+from android.AdbDeviceTracker import ABSENT
+
+ONLINE = 'device'
+
+# Seconds a serial must stay in a new state before it counts, per new state.
+# Going offline is usually a short USB hiccup, so it gets the longest window.
+DEBOUNCE_WINDOWS = {
+    ONLINE: 0.5,
+    'offline': 2.0,
+    'unauthorized': 0.5,
+    'recovery': 0.5,
+    ABSENT: 1.0,
+}
+DEFAULT_DEBOUNCE = 0.5
+
+
+class StateChange(typing.NamedTuple):
+    serial: str
+    old_state: str
+    new_state: str
+
+    @property
+    def connected(self) -> bool:
+        return self.new_state == ONLINE and self.old_state != ONLINE
+
+    @property
+    def disconnected(self) -> bool:
+        return self.old_state == ONLINE and self.new_state != ONLINE
+
+
+class _SerialState:
+    __slots__ = ('stable', 'pending', 'pending_since')
+
+    def __init__(self):
+        self.stable: str = ABSENT  # Last state that was reported
+        self.pending: typing.Optional[str] = None  # Observed, waiting for its debounce window
+        self.pending_since: float = 0.0
+
+
+class DeviceStateMachine:
+    """
+    Debounces the adb states of every serial (device, offline, unauthorized, recovery, absent).
+
+    A new state is only reported once it was observed for its debounce window, so a device
+    bouncing between offline and device, or re-enumerating on the USB bus, produces no events at all.
+    Every reported change is a diff of one serial, whatever happened to the other serials meanwhile.
+    """
+
+    def __init__(self, windows: dict[str, float] = None, default_window: float = DEFAULT_DEBOUNCE):
+        self.windows = {**DEBOUNCE_WINDOWS, **(windows or {})}
+        self.default_window = default_window
+
+        self._serials: dict[str, _SerialState] = dict()
+        self.suppressed: int = 0  # Pending states that reverted before their window passed
+
+    def get_window(self, state: str) -> float:
+        return self.windows.get(state, self.default_window)
+
+    # ----- Main Stuff -----
+    def update(self, observed: dict[str, str], now: float = None,
+               frozen: typing.Container[str] = ()) -> list[StateChange]:
+        """
+        Feed the latest states from the adb server
+        :param observed: Dict serial -> state, serials not in it are absent
+        :param now: monotonic() time of the observation
+        :param frozen: Serials to leave as they are (e.g. restarting adbd on purpose)
+        :return: Changes whose debounce window passed, in serial order
+        """
+        now = monotonic() if now is None else now
+        changes = list()
+
+        for serial in sorted(set(self._serials) | set(observed)):
+            entry = self._serials.setdefault(serial, _SerialState())
+            state = observed.get(serial, ABSENT)
+
+            if serial in frozen or state == entry.stable:
+                if entry.pending is not None:
+                    self.suppressed += 1
+                    logging.log(logging.DEBUG, f"{serial}: {entry.stable} -> {entry.pending} -> {state} ignored")
+                entry.pending = None
+                continue
+
+            if state != entry.pending:
+                if entry.pending is not None:
+                    self.suppressed += 1
+                entry.pending = state
+                entry.pending_since = now
+
+            if now - entry.pending_since >= self.get_window(state):
+                changes.append(StateChange(serial, entry.stable, state))
+                entry.stable = state
+                entry.pending = None
+
+        # Forget serials that are gone for good
+        for serial in [s for s, e in self._serials.items() if e.stable == ABSENT and e.pending is None]:
+            del self._serials[serial]
+
+        return changes
+
+    def next_deadline(self) -> typing.Optional[float]:
+        """
+        monotonic() time at which the earliest pending state is due, None if nothing is pending
+        """
+        deadlines = [
+            e.pending_since + self.get_window(e.pending)
+            for e in self._serials.values() if e.pending is not None
+        ]
+        return min(deadlines) if deadlines else None
+
+    # ----- Getters -----
+    def get_states(self) -> dict[str, str]:
+        """
+        Debounced state of every known serial
+        """
+        return {serial: e.stable for serial, e in self._serials.items() if e.stable != ABSENT}
+
+    def get_online(self) -> set:
+        return {serial for serial, e in self._serials.items() if e.stable == ONLINE}
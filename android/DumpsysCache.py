@@ -0,0 +1,108 @@
+"""
+Per device cache of dumpsys service dumps: every dump is fetched once per TTL and shared by all getters,
+which grep it host-side instead of re-running dumpsys | grep on the device.
+"""
+import re
+import typing
+import threading
+from time import monotonic
+
+DEFAULT_TTL = 2.0
+
+
+class DumpsysDump:
+    """
+    Output of one dumpsys call, split into lines only when first needed
+    """
+
+    def __init__(self, service: str, text: str, taken: float = None):
+        self.service = service
+        self.text = text
+        self.taken = monotonic() if taken is None else taken
+
+        self._lines: typing.Optional[list[str]] = None
+        self._greps: dict[str, str] = dict()
+
+    def age(self) -> float:
+        return monotonic() - self.taken
+
+    @property
+    def lines(self) -> list[str]:
+        if self._lines is None:
+            self._lines = self.text.splitlines()
+        return self._lines
+
+    def grep(self, pattern: str) -> str:
+        """
+        Lines matching the regex, joined like the output of dumpsys | grep -E pattern
+        """
+        if pattern not in self._greps:
+            regex = re.compile(pattern)
+            matches = [line for line in self.lines if regex.search(line)]
+            self._greps[pattern] = ''.join(line + '\n' for line in matches)
+        return self._greps[pattern]
+
+
+class DumpsysCache:
+    """
+    dumpsys <service> outputs of one device, reused for ttl seconds
+    """
+
+    def __init__(self, shell: typing.Callable[[str], str], ttl: float = DEFAULT_TTL):
+        """
+        :param shell: Runs a shell command on the device and returns its output (e.g. ADBDevice.exec_shell)
+        :param ttl: Seconds a dump is reused
+        """
+        self.shell = shell
+        self.ttl = ttl
+
+        self._dumps: dict[str, DumpsysDump] = dict()
+        self._locks: dict[str, threading.Lock] = dict()
+        self._lock = threading.Lock()
+        self._generation: int = 0  # Bumped by invalidate()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, service: str, max_age: float = None) -> DumpsysDump:
+        """
+        :param service: dumpsys arguments, e.g. 'activity' or 'window windows'
+        :param max_age: Seconds a cached dump may be reused, defaults to ttl, 0 forces a new one
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            lock = self._locks.setdefault(service, threading.Lock())
+
+        with lock:  # Concurrent getters of the same service share one dump
+            dump = self._dumps.get(service)
+            if dump is not None and dump.age() <= max_age:
+                self.hits += 1
+                return dump
+
+            self.misses += 1
+            with self._lock:
+                generation = self._generation
+            taken = monotonic()
+            dump = DumpsysDump(service, self.shell(f'dumpsys {service}') or '', taken)
+
+            with self._lock:
+                # Invalidated while fetching: the dump may predate the change, hand it out but don't cache it
+                if self._generation == generation:
+                    self._dumps[service] = dump
+            return dump
+
+    def grep(self, service: str, pattern: str, max_age: float = None) -> str:
+        return self.get(service, max_age).grep(pattern)
+
+    def invalidate(self, service: str = None) -> None:
+        """
+        Drop one service's dump, or all of them (after actions that change the device state)
+        """
+        with self._lock:
+            self._generation += 1
+            if service is None:
+                self._dumps.clear()
+            else:
+                self._dumps.pop(service, None)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'cached': sorted(self._dumps)}
@@ -0,0 +1,304 @@
+"""
+Fleet health polling: one scheduler thread and a small worker pool poll every attached device
+at a jittered, adaptive interval (faster while values change, slower while they're stable)
+into a compact time series per device.
+"""
+import math
+import heapq
+import random
+import typing
+import logging
+import threading
+from array import array
+from time import time, monotonic
+from concurrent.futures import ThreadPoolExecutor
+
+from stats import RunningStats
+from android.DeviceSnapshot import DeviceSnapshot
+
+NUMERIC_FIELDS = ('battery_temperature', 'battery_level', 'thermal_status', 'storage_free')
+INT_FIELDS = ('battery_level', 'thermal_status', 'storage_free')  # Stored as floats, handed back as ints
+STATE_FIELDS = ('wakefulness', 'foreground_app')
+
+# Numeric changes smaller than these count as stable
+CHANGE_THRESHOLDS = {
+    'battery_temperature': 0.5,  # Celsius
+    'battery_level': 1,
+    'thermal_status': 1,
+    'storage_free': 64 * 1024 * 1024,
+}
+
+
+class HealthSample(typing.NamedTuple):
+    time: float  # Epoch seconds
+    battery_temperature: typing.Optional[float] = None
+    battery_level: typing.Optional[int] = None
+    thermal_status: typing.Optional[int] = None
+    storage_free: typing.Optional[int] = None
+    wakefulness: typing.Optional[str] = None
+    foreground_app: typing.Optional[str] = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot: DeviceSnapshot, now: float = None) -> 'HealthSample':
+        return cls(time() if now is None else now, *(getattr(snapshot, field) for field in cls._fields[1:]))
+
+
+def has_changed(old: typing.Optional[HealthSample], new: HealthSample) -> bool:
+    if old is None:
+        return True
+
+    for field in STATE_FIELDS:
+        if getattr(old, field) != getattr(new, field):
+            return True
+
+    for field in NUMERIC_FIELDS:
+        before, after = getattr(old, field), getattr(new, field)
+        if (before is None) != (after is None):
+            return True
+        if before is not None and abs(after - before) >= CHANGE_THRESHOLDS[field]:
+            return True
+    return False
+
+
+def _unpack(field: str, value: float) -> typing.Optional[typing.Union[int, float]]:
+    if math.isnan(value):
+        return None
+    return int(value) if field in INT_FIELDS else value
+
+
+class HealthSeries:
+    """
+    Ring buffer of health samples: numeric fields in float arrays (NaN for missing),
+    state fields stored only when they change
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self._times = array('d')
+        self._values: dict[str, array] = {field: array('d') for field in NUMERIC_FIELDS}
+        self._states: dict[str, list[tuple[float, typing.Optional[str]]]] = {field: list() for field in STATE_FIELDS}
+        self._start: int = 0  # Index of the oldest sample once the ring is full
+        self._lock = threading.Lock()
+
+    def append(self, sample: HealthSample) -> None:
+        with self._lock:
+            if len(self._times) < self.capacity:
+                self._times.append(sample.time)
+                for field, values in self._values.items():
+                    value = getattr(sample, field)
+                    values.append(math.nan if value is None else value)
+            else:
+                self._times[self._start] = sample.time
+                for field, values in self._values.items():
+                    value = getattr(sample, field)
+                    values[self._start] = math.nan if value is None else value
+                self._start = (self._start + 1) % self.capacity
+
+            oldest = self._times[self._start]
+            for field, changes in self._states.items():
+                value = getattr(sample, field)
+                if not changes or changes[-1][1] != value:
+                    changes.append((sample.time, value))
+                # Keep the last change before the oldest sample, it's the state the ring starts in
+                while len(changes) > 1 and changes[1][0] <= oldest:
+                    changes.pop(0)
+
+    def _ordered(self, values: array) -> list:
+        return list(values[self._start:]) + list(values[:self._start])
+
+    def get(self, field: str, since: float = None) -> list[tuple[float, typing.Optional[typing.Union[float, str]]]]:
+        """
+        :param field: A HealthSample field
+        :param since: Only samples from this epoch time on
+        :return: List of (time, value), for state fields only the changes
+        """
+        with self._lock:
+            if field in self._states:
+                points = list(self._states[field])
+            else:
+                points = [
+                    (t, _unpack(field, v))
+                    for t, v in zip(self._ordered(self._times), self._ordered(self._values[field]))
+                ]
+
+        if since is not None:
+            points = [point for point in points if point[0] >= since]
+        return points
+
+    def latest(self) -> typing.Optional[HealthSample]:
+        with self._lock:
+            if not self._times:
+                return None
+
+            index = (self._start - 1) % len(self._times)
+            numeric = {field: _unpack(field, values[index]) for field, values in self._values.items()}
+            states = {field: changes[-1][1] for field, changes in self._states.items()}
+            return HealthSample(self._times[index], **numeric, **states)
+
+    def __len__(self):
+        return len(self._times)
+
+
+class _Schedule:
+    __slots__ = ('serial', 'interval', 'due', 'polls', 'errors', 'last')
+
+    def __init__(self, serial: str, interval: float, due: float):
+        self.serial = serial
+        self.interval = interval
+        self.due = due
+        self.polls: int = 0
+        self.errors: int = 0
+        self.last: typing.Optional[HealthSample] = None
+
+
+class HealthPoller:
+    """
+    Polls every device returned by get_devices on its own adaptive schedule
+    """
+
+    def __init__(self, get_devices: typing.Callable[[], dict], poll: typing.Callable[[object], HealthSample],
+                 workers: int = 4, min_interval: float = 5.0, max_interval: float = 60.0, backoff: float = 1.5,
+                 jitter: float = 0.1, capacity: int = 1024):
+        """
+        :param get_devices: Returns the current dict serial -> device, checked on every scheduling pass
+        :param poll: Reads one HealthSample from a device
+        :param workers: Max devices polled at once
+        :param min_interval: Seconds between polls while values change
+        :param max_interval: Seconds between polls once they're stable (and after errors)
+        :param backoff: Interval multiplier after a poll without changes
+        :param jitter: +- fraction applied to every interval, so devices don't poll in lockstep
+        :param capacity: Samples kept per device
+        """
+        self.get_devices = get_devices
+        self.poll = poll
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.capacity = capacity
+
+        self.series: dict[str, HealthSeries] = dict()
+        self.poll_time: RunningStats = RunningStats()
+
+        self._schedules: dict[str, _Schedule] = dict()
+        self._heap: list[tuple[float, str]] = list()
+        self._cond = threading.Condition()
+        self._run: bool = False
+        self._executor: typing.Optional[ThreadPoolExecutor] = None
+        self._thread: typing.Optional[threading.Thread] = None
+
+    # ----- Main Stuff -----
+    def start(self) -> None:
+        if self._run:
+            return
+
+        self._run = True
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='HealthPoll')
+        self._thread = threading.Thread(target=self._scheduler, args=(), daemon=True)
+        self._thread.name = 'HealthPoller'
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        with self._cond:
+            self._run = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _sync_devices(self, devices: dict, now: float) -> None:
+        # Must hold self._cond
+        for serial in devices.keys() - self._schedules.keys():
+            # Spread the first polls of a new fleet over min_interval instead of a burst
+            schedule = _Schedule(serial, self.min_interval, now + random.uniform(0, self.min_interval))
+            self._schedules[serial] = schedule
+            self.series.setdefault(serial, HealthSeries(self.capacity))
+            heapq.heappush(self._heap, (schedule.due, serial))
+
+        for serial in self._schedules.keys() - devices.keys():
+            del self._schedules[serial]  # Its heap entry is skipped when it comes up
+
+    def _scheduler(self) -> None:
+        while True:
+            devices = self.get_devices()
+            with self._cond:
+                if not self._run:
+                    break
+
+                now = monotonic()
+                self._sync_devices(devices, now)
+
+                due = list()
+                while self._heap and self._heap[0][0] <= now:
+                    when, serial = heapq.heappop(self._heap)
+                    schedule = self._schedules.get(serial)
+                    # Entries of detached (or detached and re-attached) devices are stale
+                    if schedule is not None and schedule.due == when and serial in devices:
+                        due.append(serial)
+
+                # Wake for the next poll, or to notice attached/detached devices
+                timeout = min(self._heap[0][0] - now if self._heap else self.min_interval, self.min_interval)
+
+            for serial in due:
+                self._executor.submit(self._poll_device, serial, devices[serial])
+
+            with self._cond:
+                if self._run:
+                    self._cond.wait(max(0.0, timeout))
+
+        logging.log(logging.DEBUG, "Health poller exiting...")
+
+    def _poll_device(self, serial: str, device) -> None:
+        start = monotonic()
+        sample = None
+        try:
+            sample = self.poll(device)
+        except Exception as e:
+            logging.log(logging.WARNING, f"Health poll of {serial} failed: {e}")
+
+        with self._cond:
+            self.poll_time.update(monotonic() - start)
+            schedule = self._schedules.get(serial)
+            if schedule is None:
+                return  # Detached meanwhile
+
+            schedule.polls += 1
+            if sample is None:
+                schedule.errors += 1
+                schedule.interval = self.max_interval
+            elif has_changed(schedule.last, sample):
+                schedule.interval = self.min_interval
+            else:
+                schedule.interval = min(schedule.interval * self.backoff, self.max_interval)
+
+            if sample is not None:
+                schedule.last = sample
+                self.series[serial].append(sample)
+
+            schedule.due = monotonic() + self._jittered(schedule.interval)
+            heapq.heappush(self._heap, (schedule.due, serial))
+            self._cond.notify_all()
+
+    # ----- Getters -----
+    def get_series(self, serial: str) -> typing.Optional[HealthSeries]:
+        return self.series.get(serial)
+
+    def get_latest(self) -> dict[str, HealthSample]:
+        return {serial: series.latest() for serial, series in list(self.series.items()) if len(series)}
+
+    def stats(self) -> dict:
+        with self._cond:
+            schedules = list(self._schedules.values())
+        return {
+            'devices': len(schedules),
+            'polls': sum(s.polls for s in schedules),
+            'errors': sum(s.errors for s in schedules),
+            'poll_time_avg': self.poll_time.mean,
+            'poll_time_max': self.poll_time.max if self.poll_time.count else 0.0,
+            'intervals': {s.serial: s.interval for s in schedules},
+        }
@@ -0,0 +1,266 @@
+import os
+import re
+import gzip
+import queue
+import socket
+import typing
+import logging
+import threading
+from shlex import quote as cmd_quote
+from collections import deque
+
+from android.AdbConnectionPool import AdbConnectionPool
+
+# logcat -v threadtime: "10-19 12:34:56.789  1234  5678 I Tag     : message"
+THREADTIME_PATTERN = re.compile(
+    r"^(\d\d-\d\d \d\d:\d\d:\d\d\.\d+)\s+(\d+)\s+(\d+)\s+([VDIWEFS])\s+(.*?)\s*: (.*)$"
+)
+
+
+class LogRecord(typing.NamedTuple):
+    time: str
+    pid: int
+    tid: int
+    level: str
+    tag: str
+    message: str
+
+
+def parse_logcat_line(line: str) -> typing.Optional[LogRecord]:
+    m = THREADTIME_PATTERN.match(line)
+    if m is None:
+        return None
+
+    return LogRecord(m.group(1), int(m.group(2)), int(m.group(3)), m.group(4), m.group(5), m.group(6))
+
+
+class RotatingGzipWriter:
+    """
+    Writes lines into gzip files, starting a new one when max_bytes (uncompressed) is reached
+    and keeping at most `backups` old files: name.log.gz, name.1.log.gz, ...
+    """
+
+    def __init__(self, base_path: str, max_bytes: int = 32 * 1024 * 1024, backups: int = 5):
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self._file = None
+        self._written = 0
+
+    def _file_name(self, num: int) -> str:
+        return f"{self.base_path}.log.gz" if num == 0 else f"{self.base_path}.{num}.log.gz"
+
+    def _rotate(self) -> None:
+        self.close()
+
+        for num in range(self.backups, 0, -1):
+            src = self._file_name(num - 1)
+            if os.path.isfile(src):
+                os.replace(src, self._file_name(num))
+
+    def write(self, data: bytes) -> None:
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.base_path) or '.', exist_ok=True)
+            self._rotate()
+            self._file = gzip.open(self._file_name(0), 'wb', compresslevel=6)
+        elif self._written + len(data) > self.max_bytes:
+            self._rotate()
+            self._file = gzip.open(self._file_name(0), 'wb', compresslevel=6)
+            self._written = 0
+
+        self._file.write(data)
+        self._written += len(data)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LogcatStreamer:
+    """
+    Streams a device's logcat in the background.
+
+    The filter spec (e.g. "ActivityManager:I *:S") is applied by logcat on the device. The reader thread
+    never blocks on consumers: lines go into a bounded queue for the file writer and are dropped (and counted)
+    when it is full, and parsed records go into a fixed size ring buffer for live queries.
+    """
+
+    def __init__(self, pool: AdbConnectionPool, serial: str, logs_filter: str = '', save_dir: str = None,
+                 ring_size: int = 10000, queue_size: int = 20000, max_file_bytes: int = 32 * 1024 * 1024,
+                 backups: int = 5, max_line_bytes: int = 64 * 1024):
+        self.pool = pool
+        self.serial = serial
+        self.logs_filter = logs_filter
+        self.save_dir = save_dir
+        self.max_file_bytes = max_file_bytes
+        self.backups = backups
+        self.max_line_bytes = max_line_bytes  # Longer lines are split, so the read buffer stays bounded
+
+        self.records: deque[LogRecord] = deque(maxlen=ring_size)
+        self._records_lock = threading.Lock()
+        self._write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self.lines: int = 0
+        self.dropped: int = 0
+        self.unparsed: int = 0
+        self.split_lines: int = 0
+
+        self._run: bool = False
+        self._conn = None
+        self.reader_thread: typing.Optional[threading.Thread] = None
+        self.writer_thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._run
+
+    def get_command(self) -> str:
+        cmd = "logcat -v threadtime"
+        if self.logs_filter:
+            cmd += ' ' + ' '.join(cmd_quote(spec) for spec in self.logs_filter.split())
+        return cmd
+
+    # ----- Main Stuff -----
+    def start(self) -> None:
+        if self._run:
+            return
+
+        self._run = True
+
+        self.reader_thread = threading.Thread(target=self._read, args=(), daemon=True)
+        self.reader_thread.name = f'Logcat-{self.serial}'
+        self.reader_thread.start()
+
+        if self.save_dir:
+            self.writer_thread = threading.Thread(target=self._write, args=(), daemon=True)
+            self.writer_thread.name = f'LogcatWriter-{self.serial}'
+            self.writer_thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._run = False
+        conn = self._conn
+        if conn is not None:
+            # close() alone doesn't wake a reader blocked in recv
+            try:
+                conn.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+        if self.reader_thread is not None:
+            self.reader_thread.join(timeout)
+        if self.writer_thread is not None and self.writer_thread.is_alive():
+            self._write_queue.put(None)
+            self.writer_thread.join(timeout)
+
+        logging.log(logging.DEBUG, f"Logcat of {self.serial} stopped: {self.stats()}")
+
+    def _read(self) -> None:
+        buffer = b''
+        try:
+            with self.pool.transport(self.serial) as conn:
+                self._conn = conn
+                conn.send(f"shell:{self.get_command()}")
+
+                while self._run:
+                    chunk = conn.read(65536)
+                    if not chunk:
+                        break
+
+                    buffer += chunk
+                    lines = buffer.split(b'\n')
+                    buffer = lines.pop()
+                    if len(buffer) > self.max_line_bytes:
+                        lines.append(buffer)
+                        buffer = b''
+                        self.split_lines += 1
+                    self._handle_lines(lines)
+        except (RuntimeError, OSError) as e:
+            if self._run:
+                logging.log(logging.WARNING, f"Logcat of {self.serial} stopped unexpectedly: {e}")
+        finally:
+            self._conn = None
+            self._run = False
+            if self.writer_thread is not None:
+                self._write_queue.put(None)
+
+    def _handle_lines(self, lines: list[bytes]) -> None:
+        records = list()
+        for raw in lines:
+            line = raw.rstrip(b'\r').decode('utf-8', errors='replace')
+            record = parse_logcat_line(line)
+            if record is None:
+                self.unparsed += 1
+            else:
+                records.append(record)
+
+            if self.save_dir:
+                try:
+                    self._write_queue.put_nowait(raw + b'\n')
+                except queue.Full:
+                    self.dropped += 1
+
+        self.lines += len(lines)
+        with self._records_lock:
+            self.records.extend(records)
+
+    def _write(self) -> None:
+        writer = RotatingGzipWriter(os.path.join(self.save_dir, f"{self.serial}_logcat"),
+                                    self.max_file_bytes, self.backups)
+        try:
+            while True:
+                data = self._write_queue.get()
+                if data is None:
+                    break
+
+                # Batch whatever is queued into one write
+                batch = [data]
+                try:
+                    while len(batch) < 4096:
+                        item = self._write_queue.get_nowait()
+                        if item is None:
+                            self._write_queue.put(None)
+                            break
+                        batch.append(item)
+                except queue.Empty:
+                    pass
+
+                writer.write(b''.join(batch))
+        finally:
+            writer.close()
+
+    # ----- Queries -----
+    def query(self, level: str = None, tag: str = None, contains: str = None, last: int = None) -> list[LogRecord]:
+        """
+        Query the in-memory ring buffer
+        :param level: Minimum level (V, D, I, W, E, F)
+        :param tag: Only this tag
+        :param contains: Only messages containing this text
+        :param last: Only the last N matching records
+        :return: List of LogRecord
+        """
+        levels = 'VDIWEFS'
+        min_level = levels.index(level) if level in levels else 0
+
+        with self._records_lock:
+            records = list(self.records)
+
+        result = [
+            r for r in records
+            if levels.index(r.level) >= min_level
+            and (tag is None or r.tag == tag)
+            and (contains is None or contains in r.message)
+        ]
+        return result[-last:] if last else result
+
+    def stats(self) -> dict:
+        return {
+            'lines': self.lines,
+            'dropped': self.dropped,
+            'unparsed': self.unparsed,
+            'split_lines': self.split_lines,
+            'buffered': len(self.records),
+            'queued': self._write_queue.qsize(),
+        }
@@ -0,0 +1,321 @@
+import os
+import typing
+import logging
+import threading
+import signal
+from subprocess import PIPE, DEVNULL, Popen, TimeoutExpired
+from time import monotonic
+from collections import deque
+
+try:
+    from subprocess import CREATE_NEW_PROCESS_GROUP
+except ImportError:
+    # Not a windows machine
+    CREATE_NEW_PROCESS_GROUP = 0
+
+SCRCPY = "scrcpy"
+HEADLESS_ARGS = ('--no-display',)
+
+
+def stop_process(process: Popen, timeout: float = 5.0) -> str:
+    """
+    Stop a process the way Ctrl+C would (scrcpy finalizes the recording on it), escalating to terminate and kill
+    :param process: Process to stop
+    :param timeout: Seconds to wait after each step
+    :return: How it ended: exited, interrupted, terminated or killed
+    """
+    if process.poll() is not None:
+        return 'exited'
+
+    steps = (
+        ('interrupted', lambda: process.send_signal(signal.CTRL_BREAK_EVENT if os.name == 'nt' else signal.SIGINT)),
+        ('terminated', process.terminate),
+        ('killed', process.kill),
+    )
+    for how, step in steps:
+        try:
+            step()
+        except OSError:
+            pass  # Exited meanwhile
+
+        try:
+            process.wait(timeout)
+            return how
+        except TimeoutExpired:
+            logging.log(logging.WARNING, f"Process {process.pid} not {how} after {timeout} s")
+
+    return 'killed'
+
+
+class Recording:
+    """
+    One headless scrcpy recording and its lifecycle: [queued ->] starting -> running -> stopping -> finished/failed,
+    queued -> cancelled when stopped before a slot got free
+    """
+
+    def __init__(self, serial: str, dest: str, args: list[str]):
+        self.serial = serial
+        self.dest = dest
+        self.args = args
+
+        self.state: str = 'starting'
+        self.process: typing.Optional[Popen] = None
+        self.started: typing.Optional[float] = None
+        self.ended: typing.Optional[float] = None
+        self.returncode: typing.Optional[int] = None
+        self.stopped_by: typing.Optional[str] = None  # How stop() ended it, None if it exited on its own
+        self.output: deque[str] = deque(maxlen=50)  # Tail of scrcpy's output
+        self.done = threading.Event()
+
+    @property
+    def duration(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.ended or monotonic()) - self.started
+
+    @property
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.dest)
+        except OSError:
+            return 0
+
+    def as_dict(self) -> dict:
+        return {
+            'serial': self.serial,
+            'dest': self.dest,
+            'state': self.state,
+            'pid': self.process.pid if self.process else None,
+            'duration': round(self.duration, 3),
+            'size': self.size,
+            'returncode': self.returncode,
+            'stopped_by': self.stopped_by,
+        }
+
+
+class ScrcpyRecorder:
+    """
+    Runs headless scrcpy screen recordings, at most max_concurrent at a time.
+
+    Every recording gets reader threads for scrcpy's output (so it never blocks on a full pipe)
+    and a supervisor thread that notices when the process exits and frees its slot.
+    Queued recordings take the slot of the next recording that ends, first come first served.
+    """
+
+    def __init__(self, binary: typing.Union[str, list[str]] = SCRCPY, max_concurrent: int = 8,
+                 stop_timeout: float = 5.0, headless_args: typing.Iterable[str] = HEADLESS_ARGS,
+                 history: int = 100):
+        """
+        :param binary: scrcpy executable, or a full command prefix (e.g. [python, stub.py])
+        :param max_concurrent: Max recordings running at once
+        :param stop_timeout: Seconds to wait after each stop step (SIGINT, terminate, kill)
+        :param headless_args: Args that disable the window (scrcpy 2.x uses --no-playback)
+        :param history: Ended recordings kept in self.recordings, older ones are dropped
+        """
+        self.binary = [binary] if isinstance(binary, str) else list(binary)
+        self.max_concurrent = max_concurrent
+        self.stop_timeout = stop_timeout
+        self.headless_args = list(headless_args)
+        self.history = history
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._queued: deque[Recording] = deque()
+        self.recordings: list[Recording] = list()
+
+    # ----- Main Stuff -----
+    def start(self, serial: str, dest: str, extra_args: typing.Iterable[str] = None,
+              wait: float = 0, queue: bool = False) -> Recording:
+        """
+        Start recording a device's screen
+        :param serial: Device serial
+        :param dest: Output video path (.mp4 or .mkv)
+        :param extra_args: More scrcpy args, e.g. ['--max-size', '1024'] or "--max-size 1024"
+        :param wait: Seconds to wait for a free slot
+        :param queue: Queue the recording when no slot got free, it starts once one does
+        :return: Recording, state 'queued' if it waits for a slot,
+                 'failed' if no slot was free (without queue) or scrcpy could not start
+        """
+        if isinstance(extra_args, str):
+            extra_args = extra_args.split()
+
+        args = [*self.binary, '--serial', serial, *self.headless_args, '--record', dest, *(extra_args or ())]
+        recording = Recording(serial, dest, args)
+        with self._lock:
+            self.recordings.append(recording)
+
+        got_slot = self._slots.acquire(timeout=wait) if wait > 0 else self._slots.acquire(blocking=False)
+        if not got_slot and queue:
+            with self._lock:
+                # Checked again under the lock, a slot released meanwhile would not be handed to the queue
+                got_slot = self._slots.acquire(blocking=False)
+                if not got_slot:
+                    recording.state = 'queued'
+                    self._queued.append(recording)
+
+            if not got_slot:
+                logging.log(logging.INFO, f"Recording of {serial} queued: "
+                                          f"{self.max_concurrent} recordings already running")
+                return recording
+
+        if not got_slot:
+            logging.log(logging.ERROR, f"Cannot record {serial}: {self.max_concurrent} recordings already running")
+            self._finish(recording, 'failed', release=False)
+            return recording
+
+        self._launch(recording)
+        return recording
+
+    def _launch(self, recording: Recording) -> None:
+        """
+        Start scrcpy for a recording holding a slot
+        """
+        serial, dest, args = recording.serial, recording.dest, recording.args
+        recording.state = 'starting'
+
+        logging.log(logging.INFO, f"Recording {serial} to {dest}")
+        logging.log(logging.DEBUG, f"Scrcpy args: {args}")
+        try:
+            dest_dir = os.path.dirname(dest)
+            if dest_dir:
+                os.makedirs(dest_dir, exist_ok=True)
+
+            recording.process = Popen(
+                args,
+                stdin=DEVNULL,
+                stdout=PIPE,
+                stderr=PIPE,
+                creationflags=CREATE_NEW_PROCESS_GROUP
+            )
+        except OSError as e:
+            logging.log(logging.ERROR, f"Could not start scrcpy: {e}")
+            self._finish(recording, 'failed')
+            return
+
+        recording.started = monotonic()
+        recording.state = 'running'
+
+        for stream in (recording.process.stdout, recording.process.stderr):
+            reader = threading.Thread(target=self._read_output, args=(recording, stream), daemon=True)
+            reader.name = f'Scrcpy-{serial}'
+            reader.start()
+
+        supervisor = threading.Thread(target=self._supervise, args=(recording,), daemon=True)
+        supervisor.name = f'ScrcpySupervisor-{serial}'
+        supervisor.start()
+
+    def stop(self, recording: Recording, timeout: float = None) -> Recording:
+        """
+        Gracefully stop a recording (scrcpy writes the file trailer on SIGINT), or cancel it if still queued
+        :return: The same recording, once ended
+        """
+        with self._lock:
+            queued = recording in self._queued
+            if queued:
+                self._queued.remove(recording)
+        if queued:
+            self._finish(recording, 'cancelled', release=False)
+            return recording
+
+        if recording.process is None or recording.done.is_set():
+            return recording
+
+        recording.state = 'stopping'
+        recording.stopped_by = stop_process(recording.process, timeout or self.stop_timeout)
+        recording.done.wait(timeout or self.stop_timeout)
+        return recording
+
+    def stop_device(self, serial: str, timeout: float = None) -> list[Recording]:
+        return self.stop_all(timeout, serial)
+
+    def stop_all(self, timeout: float = None, serial: str = None) -> list[Recording]:
+        """
+        Stop all (or one device's) running recordings in parallel
+        """
+        # Cancel the queued ones first, so the slots freed below don't start them
+        for recording in self.get_active(serial):
+            if recording.state == 'queued':
+                self.stop(recording)
+
+        active = [r for r in self.get_active() if serial is None or r.serial == serial]
+
+        threads = [threading.Thread(target=self.stop, args=(r, timeout), daemon=True) for r in active]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return active
+
+    def _read_output(self, recording: Recording, stream) -> None:
+        for line in iter(stream.readline, b''):
+            line = line.decode('utf-8', errors='replace').rstrip()
+            if line:
+                recording.output.append(line)
+                logging.log(logging.DEBUG, f"scrcpy {recording.serial}: {line}")
+        stream.close()
+
+    def _supervise(self, recording: Recording) -> None:
+        returncode = recording.process.wait()
+        recording.returncode = returncode
+
+        if recording.state == 'stopping' or returncode == 0:
+            self._finish(recording, 'finished')
+        else:
+            logging.log(logging.ERROR, f"scrcpy recording of {recording.serial} exited with {returncode}: "
+                                       f"{recording.output[-1] if recording.output else ''}")
+            self._finish(recording, 'failed')
+
+    def _finish(self, recording: Recording, state: str, release: bool = True) -> None:
+        if recording.started is not None:
+            recording.ended = monotonic()
+        recording.state = state
+        recording.done.set()
+
+        with self._lock:
+            ended = [r for r in self.recordings if r.done.is_set()]
+            for old in ended[:max(0, len(ended) - self.history)]:
+                self.recordings.remove(old)
+
+        if release:
+            self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            recording = self._queued.popleft() if self._queued else None
+            if recording is None:
+                self._slots.release()
+                return
+
+        # The slot goes straight to the oldest queued recording
+        logging.log(logging.DEBUG, f"Starting queued recording of {recording.serial}")
+        self._launch(recording)
+
+    # ----- Getters -----
+    def get_active(self, serial: str = None) -> list[Recording]:
+        with self._lock:
+            return [
+                r for r in self.recordings
+                if not r.done.is_set() and (serial is None or r.serial == serial)
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            recordings = list(self.recordings)
+
+        states = dict()
+        for recording in recordings:
+            states[recording.state] = states.get(recording.state, 0) + 1
+
+        return {
+            'total': len(recordings),
+            'active': sum(1 for r in recordings if not r.done.is_set()),
+            'queued': len(self._queued),
+            'states': states,
+            'stopped_by': {
+                how: sum(1 for r in recordings if r.stopped_by == how)
+                for how in ('exited', 'interrupted', 'terminated', 'killed')
+            },
+            'bytes': sum(r.size for r in recordings),
+            'recordings': [r.as_dict() for r in recordings],
+        }
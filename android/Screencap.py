@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import struct
+import typing
+import logging
+from time import sleep, monotonic
+
+from lazy_import import LazyModule
+from android.AdbConnectionPool import AdbConnectionPool
+
+np = LazyModule('numpy')
+
+# screencap pixel formats (android PixelFormat) -> bytes per pixel
+PIXEL_FORMATS = {
+    1: 4,  # RGBA_8888
+    2: 4,  # RGBX_8888
+    3: 3,  # RGB_888
+    4: 2,  # RGB_565
+    5: 4,  # BGRA_8888
+}
+COLORSPACE_HEADER_MIN_SDK = 28  # Android 9 added a colorspace field to the raw header
+
+
+def _recv_into(conn, view: memoryview) -> None:
+    received = 0
+    while received < len(view):
+        count = conn.socket.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionResetError('screencap stream ended early')
+        received += count
+
+
+def read_screencap(conn, sdk: int, out: np.ndarray = None) -> np.ndarray:
+    """
+    Read one raw screencap from a connection that was sent exec:screencap
+    :param conn: ppadb Connection
+    :param sdk: Device SDK level, decides the header size
+    :param out: Array to read into if it has the right shape, avoids allocating per frame
+    :return: (h, w, bpp) uint8 array, (h, w) uint16 for RGB_565
+    """
+    header_size = 16 if sdk >= COLORSPACE_HEADER_MIN_SDK else 12
+    header = bytearray(header_size)
+    _recv_into(conn, memoryview(header))
+    w, h, fmt = struct.unpack_from('<III', header)
+
+    bpp = PIXEL_FORMATS.get(fmt)
+    if bpp is None:
+        raise ValueError(f"Unsupported screencap pixel format {fmt}")
+
+    shape, dtype = ((h, w), np.uint16) if bpp == 2 else ((h, w, bpp), np.uint8)
+    if out is None or out.shape != shape or out.dtype != dtype or not out.flags.c_contiguous:
+        out = np.empty(shape, dtype=dtype)
+
+    _recv_into(conn, memoryview(out).cast('B'))
+    return out
+
+
+def capture(pool: AdbConnectionPool, serial: str, sdk: int, out: np.ndarray = None,
+            timeout: float = None) -> np.ndarray:
+    """
+    Grab the screen over exec-out, without PNG encoding on the device or decoding here
+    """
+    with pool.transport(serial, timeout) as conn:
+        conn.send("exec:screencap")
+        return read_screencap(conn, sdk, out)
+
+
+def capture_stream(pool: AdbConnectionPool, serial: str, sdk: int, interval: float = 0.0,
+                   count: int = None) -> typing.Iterator[np.ndarray]:
+    """
+    Continuous capture into one reused buffer.
+    The yielded array is overwritten by the next capture, copy it to keep it.
+    :param interval: Min seconds between captures
+    :param count: Stop after this many captures, None for endless
+    """
+    buffer = None
+    captured = 0
+
+    while count is None or captured < count:
+        started = monotonic()
+        try:
+            buffer = capture(pool, serial, sdk, buffer)
+        except (RuntimeError, OSError) as e:
+            logging.log(logging.ERROR, f"Screen capture of {serial} failed: {e}")
+            return
+
+        captured += 1
+        yield buffer
+
+        remaining = interval - (monotonic() - started)
+        if remaining > 0:
+            sleep(remaining)
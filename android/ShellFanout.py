@@ -0,0 +1,167 @@
+"""
+Run one shell command on many devices at once, streaming per device results in completion order.
+
+    fanout = ShellFanout(pool, serials, 'getprop ro.build.fingerprint')
+    for result in fanout:              # or: async for result in fanout
+        print(result.serial, result.output)
+    print(fanout.summary())
+"""
+import socket
+import typing
+import asyncio
+import logging
+import threading
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+
+import metrics
+import tracing
+from stats import RunningStats
+from android.AdbConnectionPool import AdbConnectionPool
+
+
+class ShellResult(typing.NamedTuple):
+    serial: str
+    output: typing.Optional[str]
+    success: bool
+    elapsed: float  # Seconds on this device, queueing excluded
+    error: typing.Optional[str] = None
+    timed_out: bool = False
+
+
+class FanoutSummary(typing.NamedTuple):
+    command: str
+    total: int
+    succeeded: int
+    failed: int  # Timeouts included
+    timed_out: int
+    elapsed: float  # Seconds for the whole fan-out so far
+    latency_mean: float
+    latency_max: float
+    outputs: dict[str, list[str]]  # Stripped output -> serials that answered it, e.g. to spot outliers
+
+    @property
+    def pending(self) -> int:
+        return self.total - self.succeeded - self.failed
+
+
+class ShellFanout:
+    """
+    One-shot fan-out of a shell command: iterate it (or async iterate it) to start it and get the results
+    """
+
+    def __init__(self, pool: AdbConnectionPool, serials: typing.Iterable[str], cmd: str, max_parallel: int = 128,
+                 timeout: float = 10.0):
+        """
+        :param pool: Connection pool of the client
+        :param serials: Devices to run on
+        :param cmd: Shell command
+        :param max_parallel: Max devices running the command at once
+        :param timeout: Seconds a device may stay silent before it counts as timed out, None to wait forever
+        """
+        self.pool = pool
+        self.serials = list(dict.fromkeys(serials))  # Unique, in order
+        self.cmd = cmd
+        self.max_parallel = max(1, max_parallel)
+        self.timeout = timeout
+
+        self.results: list[ShellResult] = list()
+        self._latency = RunningStats()
+        self._lock = threading.Lock()
+        self._started: typing.Optional[float] = None
+        self._finished: typing.Optional[float] = None
+
+    # ----- Main Stuff -----
+    def _run_one(self, serial: str) -> ShellResult:
+        start = monotonic()
+        try:
+            with metrics.timed('exec_shell', serial), tracing.span('exec_shell', serial, cmd=self.cmd):
+                output = self.pool.shell(serial, self.cmd, self.timeout)
+        except socket.timeout:
+            return ShellResult(serial, None, False, monotonic() - start, f"No answer in {self.timeout}s", True)
+        except (RuntimeError, OSError, UnicodeDecodeError) as e:
+            return ShellResult(serial, None, False, monotonic() - start, str(e) or type(e).__name__)
+
+        if metrics.is_enabled():
+            metrics.add_bytes('exec_shell', serial, len(output.encode('utf-8')))
+        return ShellResult(serial, output, True, monotonic() - start)
+
+    def _start(self) -> tuple[ThreadPoolExecutor, list[Future]]:
+        with self._lock:
+            if self._started is not None:
+                raise RuntimeError('A fan-out can only be run once, create a new one')
+            self._started = monotonic()
+
+        logging.log(logging.DEBUG, f"Running '{self.cmd}' on {len(self.serials)} devices")
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_parallel, max(1, len(self.serials))), thread_name_prefix='ShellFanout'
+        )
+        return executor, [executor.submit(self._run_one, serial) for serial in self.serials]
+
+    def _collect(self, result: ShellResult) -> ShellResult:
+        with self._lock:
+            self.results.append(result)
+            self._latency.update(result.elapsed)
+            if len(self.results) == len(self.serials):
+                self._finished = monotonic()
+
+        if not result.success:
+            logging.log(logging.WARNING, f"{result.serial}: '{self.cmd}' failed: {result.error}")
+        return result
+
+    def __iter__(self) -> typing.Iterator[ShellResult]:
+        executor, futures = self._start()
+        try:
+            for future in as_completed(futures):
+                yield self._collect(future.result())
+        finally:
+            # Stopping the iteration early cancels the devices that didn't start yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _aiter(self) -> typing.AsyncIterator[ShellResult]:
+        executor, futures = self._start()
+        try:
+            for next_done in asyncio.as_completed([asyncio.wrap_future(future) for future in futures]):
+                yield self._collect(await next_done)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __aiter__(self) -> typing.AsyncIterator[ShellResult]:
+        return self._aiter()
+
+    def run(self) -> FanoutSummary:
+        """
+        Run to completion without streaming
+        """
+        for _ in self:
+            pass
+        return self.summary()
+
+    # ----- Getters -----
+    def summary(self) -> FanoutSummary:
+        """
+        Aggregate of the results collected so far
+        """
+        with self._lock:
+            results = list(self.results)
+            end = self._finished or monotonic()
+            latency_mean = self._latency.mean
+            latency_max = self._latency.max if self._latency.count else 0.0
+
+        outputs: dict[str, list[str]] = dict()
+        for result in results:
+            if result.success:
+                outputs.setdefault(result.output.strip(), list()).append(result.serial)
+
+        succeeded = sum(result.success for result in results)
+        return FanoutSummary(
+            command=self.cmd,
+            total=len(self.serials),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            timed_out=sum(result.timed_out for result in results),
+            elapsed=end - self._started if self._started is not None else 0.0,
+            latency_mean=latency_mean,
+            latency_max=latency_max,
+            outputs=outputs,
+        )
@@ -0,0 +1,185 @@
+"""
+End-to-end AdbClient/ADBDevice benchmarks against the in-process adb server emulator:
+attach time, shell commands/s, fleet shell fan-out, pull throughput and watchdog detection latency.
+
+Usage: python -m benchmarks.bench_adb [device_count ...] [--latency S] [--bandwidth B/s] [--pull-mb MB] [--metrics FILE]
+       [--trace FILE]
+Defaults to 1, 16 and 128 virtual devices.
+"""
+import os
+import time
+import argparse
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import tracing
+from stats import RunningStats
+from android.AdbClient import AdbClient
+from android.AdbServerEmulator import AdbServerEmulator
+
+PULL_FILE = '/sdcard/bench.bin'
+
+
+def timed(func, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_attach(client: AdbClient, serials: list[str], parallel: int) -> RunningStats:
+    per_device = RunningStats()
+
+    def attach(serial):
+        elapsed, _ = timed(client.attach_device, serial)
+        per_device.update(elapsed)
+
+    elapsed, _ = timed(lambda: list(ThreadPoolExecutor(parallel).map(attach, serials)))
+    print(f"  attach        {len(serials):>4} devices in {elapsed:7.3f} s "
+          f"(per device avg {per_device.mean * 1000:.1f} ms, max {per_device.max * 1000:.1f} ms)")
+    return per_device
+
+
+def bench_shell(client: AdbClient, serials: list[str], parallel: int, duration: float) -> float:
+    count = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        nonlocal count
+        device = client.devices_obj[serials[index % len(serials)]]
+        done = 0
+        while time.perf_counter() < deadline:
+            device.exec_shell('echo bench')
+            done += 1
+        with lock:
+            count += done
+
+    with ThreadPoolExecutor(parallel) as executor:
+        list(executor.map(worker, range(parallel)))
+
+    rate = count / duration
+    print(f"  shell         {count:>6} commands, {rate:9.1f} commands/s ({parallel} threads)")
+    return rate
+
+
+def bench_fanout(client: AdbClient, serials: list[str]) -> float:
+    """
+    getprop sweep over the whole fleet: one fan-out vs looping over the devices
+    """
+    cmd = 'getprop ro.build.version.sdk'
+    summary = client.shell_fanout(cmd, serials).run()
+
+    elapsed, _ = timed(lambda: [client.devices_obj[serial].exec_shell(cmd) for serial in serials])
+    print(f"  fan-out       {summary.succeeded:>4}/{summary.total} devices in {summary.elapsed * 1000:7.1f} ms "
+          f"(per device avg {summary.latency_mean * 1000:.1f} ms, serial loop {elapsed * 1000:.1f} ms)")
+    return summary.elapsed
+
+
+def bench_pull(client: AdbClient, serials: list[str], parallel: int, out_dir: str, size: int) -> float:
+    def pull(serial):
+        client.devices_obj[serial].pull_file(PULL_FILE, os.path.join(out_dir, f"{serial}.bin"))
+
+    elapsed, _ = timed(lambda: list(ThreadPoolExecutor(parallel).map(pull, serials)))
+    throughput = size * len(serials) / elapsed / 1024 / 1024
+    print(f"  pull          {len(serials):>4} x {size / 1024 / 1024:.1f} MB in {elapsed:7.3f} s "
+          f"({throughput:.1f} MB/s)")
+    return throughput
+
+
+def bench_detection(client: AdbClient, emulator: AdbServerEmulator, events: dict, rounds: int) -> RunningStats:
+    latency = RunningStats()
+
+    for i in range(rounds):
+        serial = f"hotplug{i:04d}"
+        seen = events[serial] = threading.Event()
+
+        start = time.perf_counter()
+        emulator.add_device(serial)
+        if seen.wait(10):
+            latency.update(time.perf_counter() - start)
+        emulator.remove_device(serial)
+
+    print(f"  detection     {latency.count:>4}/{rounds} hotplugs, avg {latency.mean * 1000:.1f} ms, "
+          f"max {latency.max * 1000:.1f} ms")
+    return latency
+
+
+def print_metrics() -> None:
+    for operation in sorted(metrics.snapshot()):
+        hist = metrics.get_histogram(operation)
+        print(f"  {operation:<13} p50 {hist.percentile(50) * 1000:.2f} ms, p99 {hist.percentile(99) * 1000:.2f} ms, "
+              f"max {hist.max * 1000:.2f} ms ({hist.count} calls)")
+
+
+def run(device_count: int, latency: float, bandwidth: float, pull_size: int, shell_seconds: float,
+        debounce: float) -> None:
+    print(f"{device_count} virtual devices (latency {latency * 1000:.1f} ms):")
+    payload = os.urandom(pull_size)
+    events = dict()
+
+    def connected(serial=None, **kwargs):
+        if serial in events:
+            events[serial].set()
+
+    with AdbServerEmulator() as emulator, tempfile.TemporaryDirectory() as out_dir:
+        serials = [
+            device.serial for device in emulator.add_devices(
+                device_count, latency=latency, bandwidth=bandwidth, restart_time=0.05,
+                files={PULL_FILE: payload}
+            )
+        ]
+
+        client = AdbClient(
+            callbacks={'connected': connected}, adb_port=emulator.port, start_server=False,
+            debounce={state: debounce for state in ('device', 'offline', 'unauthorized', 'recovery', 'absent')}
+        )
+        logging.getLogger().setLevel(logging.WARNING)  # Client sets the root logger to DEBUG
+        try:
+            parallel = min(32, device_count)
+            bench_attach(client, serials, parallel)
+            bench_shell(client, serials, max(parallel, 4), shell_seconds)
+            bench_fanout(client, serials)
+            bench_pull(client, serials, parallel, out_dir, pull_size)
+
+            client.watchdog()
+            bench_detection(client, emulator, events, rounds=5)
+            print(f"  pool          {client.get_pool_stats()['hits']} hits, "
+                  f"{client.get_pool_stats()['misses']} misses")
+            if metrics.is_enabled():
+                print_metrics()
+        finally:
+            client.kill_watchdog()
+            client.kill_adb()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('device_counts', nargs='*', type=int, default=[1, 16, 128])
+    parser.add_argument('--latency', type=float, default=0.001, help='Seconds per service request')
+    parser.add_argument('--bandwidth', type=float, default=None, help='Bytes/s per device, unlimited by default')
+    parser.add_argument('--pull-mb', type=float, default=4, help='Size of the pulled file')
+    parser.add_argument('--shell-seconds', type=float, default=3)
+    parser.add_argument('--debounce', type=float, default=0.0, help='Watchdog debounce window for all states')
+    parser.add_argument('--metrics', help='Enable instrumentation and write the Prometheus metrics to this file')
+    parser.add_argument('--trace', help='Enable tracing and write the last run as Chrome trace JSON to this file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.WARNING)
+    args = parse_args()
+
+    metrics.enable(bool(args.metrics))
+    tracing.enable(bool(args.trace))
+
+    for count in args.device_counts:
+        metrics.reset()
+        tracing.clear()
+        run(count, args.latency, args.bandwidth, int(args.pull_mb * 1024 * 1024), args.shell_seconds, args.debounce)
+        if args.metrics:
+            metrics.write_prometheus(args.metrics)
+        if args.trace:
+            tracing.write_chrome_trace(args.trace)
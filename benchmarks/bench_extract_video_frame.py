@@ -0,0 +1,81 @@
+"""
+Compares the linear scan of utils.extract_video_frame with the seek based utils.extract_video_frames,
+then bulk extraction with inline, pipelined and multi-process encoding.
+
+Usage: python -m benchmarks.bench_extract_video_frame [video_file] [frame ...]
+Without a video file a synthetic one is generated in a temporary directory.
+"""
+import sys
+import time
+import tempfile
+import logging
+from os import path
+
+import numpy as np
+from cv2 import cv2
+
+from utils import extract_video_frame, extract_video_frames, extract_video_frames_pipelined, \
+    extract_video_frames_parallel, get_video_info
+
+
+def make_synthetic_video(file_path: str, n_frames: int = 3000, size: tuple = (640, 360), fps: int = 30) -> str:
+    writer = cv2.VideoWriter(file_path, cv2.VideoWriter_fourcc(*'MP4V'), fps, size)
+    frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+
+    for i in range(n_frames):
+        frame[:] = i % 256
+        cv2.putText(frame, str(i + 1), (20, size[1] // 2), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 5)
+        writer.write(frame)
+
+    writer.release()
+    return file_path
+
+
+def timed(func, *args, **kwargs) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run(video_file: str, frames: list, out_dir: str) -> None:
+    w, h, fps, n_frames = get_video_info(video_file)
+    print(f"{video_file}: {w}x{h} @ {fps} fps, {n_frames} frames")
+
+    linear_total = 0.0
+    for frame in frames:
+        elapsed, _ = timed(extract_video_frame, video_file, frame, number_of_frames=1, subfolder=out_dir)
+        linear_total += elapsed
+        print(f"  linear scan  frame {frame:>7}: {elapsed * 1000:9.1f} ms")
+
+    seek_total, output = timed(extract_video_frames, video_file, frames, subfolder=out_dir)
+    print(f"  seek + grab  {len(output)} frames: {seek_total * 1000:9.1f} ms")
+
+    print(f"Linear total: {linear_total:.3f} s, seek total: {seek_total:.3f} s, "
+          f"speedup: {linear_total / seek_total if seek_total else float('inf'):.1f}x")
+
+
+def run_bulk(video_file: str, frames: list, out_dir: str) -> None:
+    print(f"Bulk extraction of {len(frames)} frames:")
+
+    for func in (extract_video_frames, extract_video_frames_pipelined, extract_video_frames_parallel):
+        elapsed, output = timed(func, video_file, frames, subfolder=path.join(out_dir, func.__name__))
+        print(f"  {func.__name__:<32} {elapsed:7.3f} s ({len(output) / elapsed if elapsed else 0:.1f} frames/s)")
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if len(sys.argv) > 1:
+            video = sys.argv[1]
+            frame_list = [int(f) for f in sys.argv[2:]]
+        else:
+            video = make_synthetic_video(path.join(tmp_dir, 'synthetic.mp4'))
+            frame_list = []
+
+        if not frame_list:
+            total = get_video_info(video)[3]
+            frame_list = [1, total // 4, total // 2, total - total // 10, total]
+
+        run(video, frame_list, path.join(tmp_dir, 'frames'))
+        run_bulk(video, list(range(1, min(get_video_info(video)[3], 1000) + 1)), path.join(tmp_dir, 'bulk'))
@@ -0,0 +1,134 @@
+"""
+ScrcpyRecorder lifecycle checks and stop latency against a stub scrcpy (benchmarks/stub_scrcpy.py):
+start, graceful stop, kill escalation, a crashing recorder, queueing beyond max_concurrent and history pruning.
+Exits with an error on the first check that fails.
+
+Usage: python -m benchmarks.bench_recorder [--recordings N] [--max-concurrent N]
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+
+from android.ScrcpyRecorder import ScrcpyRecorder
+from benchmarks.stub_scrcpy import TRAILER
+
+STUB = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_scrcpy.py')]
+
+
+def check(condition: bool, message: str) -> None:
+    if not condition:
+        raise AssertionError(message)
+
+
+def has_trailer(dest: str) -> bool:
+    with open(dest, 'rb') as f:
+        f.seek(-len(TRAILER), os.SEEK_END)
+        return f.read() == TRAILER
+
+
+def wait_running(recorder: ScrcpyRecorder, timeout: float = 5.0) -> None:
+    # The stub writes its first bytes once it's up and has its signal handlers installed
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        running = [r for r in recorder.get_active() if r.state == 'running']
+        if running and all(r.size for r in running):
+            return
+        time.sleep(0.01)
+    raise AssertionError('Recordings did not start')
+
+
+def check_graceful_stop(out_dir: str) -> None:
+    recorder = ScrcpyRecorder(STUB)
+    recording = recorder.start('stub-1', os.path.join(out_dir, 'graceful.mp4'))
+    check(recording.state == 'running', f"Started as {recording.state}")
+    wait_running(recorder)
+
+    start = time.perf_counter()
+    recorder.stop(recording)
+    elapsed = time.perf_counter() - start
+
+    check(recording.state == 'finished', f"Stopped as {recording.state}")
+    check(recording.stopped_by == 'interrupted', f"Stopped by {recording.stopped_by}")
+    check(has_trailer(recording.dest), 'Recording was not finalized')
+    print(f"  graceful stop   {elapsed * 1000:7.1f} ms, {recording.size} bytes")
+
+
+def check_kill_escalation(out_dir: str) -> None:
+    recorder = ScrcpyRecorder(STUB, stop_timeout=0.3)
+    recording = recorder.start('stub-1', os.path.join(out_dir, 'stuck.mp4'), '--ignore-signals')
+    wait_running(recorder)
+
+    start = time.perf_counter()
+    recorder.stop(recording)
+    elapsed = time.perf_counter() - start
+
+    check(recording.done.is_set(), 'Stuck recording did not end')
+    check(recording.stopped_by == 'killed', f"Stopped by {recording.stopped_by}")
+    check(not has_trailer(recording.dest), 'Killed recording has a trailer')
+    print(f"  kill escalation {elapsed * 1000:7.1f} ms (SIGINT, terminate, kill at {recorder.stop_timeout} s each)")
+
+
+def check_crash(out_dir: str) -> None:
+    recorder = ScrcpyRecorder(STUB)
+    recording = recorder.start('stub-1', os.path.join(out_dir, 'crash.mp4'), '--exit-after 0.1 --exit-code 3')
+
+    check(recording.done.wait(5), 'Crashing recording did not end')
+    check(recording.state == 'failed', f"Crashed as {recording.state}")
+    check(recording.returncode == 3, f"Return code {recording.returncode}")
+    check(recorder.start('stub-1', os.path.join(out_dir, 'after.mp4')).state == 'running', 'Slot was not freed')
+    recorder.stop_all()
+
+
+def check_queue(out_dir: str, count: int, max_concurrent: int) -> None:
+    recorder = ScrcpyRecorder(STUB, max_concurrent=max_concurrent, history=count // 2)
+    check(recorder.start('full', os.path.join(out_dir, 'full.mp4')).state == 'running', 'First start failed')
+    for _ in range(max_concurrent - 1):
+        recorder.start('full', os.path.join(out_dir, 'full.mp4'))
+    check(recorder.start('full', os.path.join(out_dir, 'full.mp4')).state == 'failed', 'Started beyond the limit')
+    recorder.stop_all()
+
+    start = time.perf_counter()
+    recordings = [
+        recorder.start(f'stub-{num}', os.path.join(out_dir, f'queued_{num}.mp4'), '--exit-after 0.2', queue=True)
+        for num in range(count)
+    ]
+    check(sum(r.state == 'queued' for r in recordings) == count - max_concurrent, 'Extra starts were not queued')
+
+    for recording in recordings:
+        check(recording.done.wait(10), f"{recording.serial} did not end")
+    elapsed = time.perf_counter() - start
+
+    check(all(r.state == 'finished' for r in recordings), f"States: {[r.state for r in recordings]}")
+    check(len(recorder.recordings) == recorder.history, f"Kept {len(recorder.recordings)} ended recordings")
+    print(f"  queue           {count} recordings, {max_concurrent} at a time in {elapsed:6.2f} s")
+
+    # Stopping everything cancels the queued ones instead of starting them in the freed slots
+    recordings = [
+        recorder.start(f'stub-{num}', os.path.join(out_dir, f'cancelled_{num}.mp4'), queue=True)
+        for num in range(max_concurrent + 2)
+    ]
+    recorder.stop_all()
+    check([r.state for r in recordings[max_concurrent:]] == ['cancelled'] * 2, 'Queued recordings were started')
+    check(all(r.stopped_by == 'interrupted' for r in recordings[:max_concurrent]), 'Running ones not interrupted')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recordings', type=int, default=12, help='Recordings started at once for the queue check')
+    parser.add_argument('--max-concurrent', type=int, default=4)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.CRITICAL)
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        check_graceful_stop(tmp_dir)
+        check_kill_escalation(tmp_dir)
+        check_crash(tmp_dir)
+        check_queue(tmp_dir, args.recordings, args.max_concurrent)
+    print('  all recorder checks passed')
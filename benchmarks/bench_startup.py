@@ -0,0 +1,68 @@
+"""
+Startup cost of the package entry points: import time, RSS growth, heavy modules pulled in
+and files created in the working directory, each measured in a fresh interpreter.
+
+Usage: python -m benchmarks.bench_startup [module ...] [--repeat N]
+Defaults to android.AdbClient, the adb-only entry point, which must not load OpenCV or numpy.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('cv2', 'numpy')
+
+CHILD = '''
+import os, sys, json, time, resource
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_kb': after - before,
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+    'created': sorted(os.listdir('.')),
+}}))
+'''
+
+
+def measure(module: str) -> dict:
+    with tempfile.TemporaryDirectory() as cwd:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get('PYTHONPATH')))))
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=cwd, env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_import(module: str, repeat: int) -> dict:
+    runs = [measure(module) for _ in range(repeat)]
+    seconds = statistics.median(run['seconds'] for run in runs)
+    rss = statistics.median(run['rss_kb'] for run in runs)
+    last = runs[-1]
+
+    print(f"  {module:<24} {seconds * 1000:8.1f} ms, +{rss / 1024:6.1f} MB RSS, "
+          f"heavy: {', '.join(last['heavy']) or 'none'}, created in cwd: {', '.join(last['created']) or 'nothing'}")
+    return {'seconds': seconds, 'rss_kb': rss, 'heavy': last['heavy'], 'created': last['created']}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=['android.AdbClient'])
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module, the median is shown')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    print(f"Import cost ({args.repeat} runs, median):")
+    for name in args.modules:
+        bench_import(name, args.repeat)
@@ -0,0 +1,153 @@
+"""
+USB camera pipeline benchmarks on virtual cameras, no hardware needed:
+raw capture, display-free streaming through the shared frame ring, recording and multi-camera sync.
+
+Usage: python -m benchmarks.bench_usbcam [--video FILE] [--size 1280x720] [--fps 30] [--cameras 4] [--seconds 3]
+Without --video the cameras replay a synthetic pattern.
+"""
+import time
+import argparse
+import logging
+import tempfile
+import threading
+from os import path
+
+from cv2 import cv2
+
+from stats import RunningStats
+from usbcam.USBCamDevice import USBCamDevice
+from usbcam.SharedFrameRing import SharedFrameReader
+from usbcam.VirtualCamera import PatternSource, FileSource, VirtualCapture, register_virtual_camera, \
+    unregister_virtual_camera
+
+
+def make_source(args: argparse.Namespace, realtime: bool = True) -> VirtualCapture:
+    if args.video:
+        return FileSource(args.video, args.width, args.height, args.fps, realtime=realtime)
+    return PatternSource(args.width, args.height, args.fps, realtime=realtime)
+
+
+def bench_capture(args: argparse.Namespace, frames: int = 300) -> float:
+    cap = make_source(args, realtime=False)
+    frame = None
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        ret, frame = cap.read(frame)
+    elapsed = time.perf_counter() - start
+    cap.release()
+
+    print(f"  capture       {frames} frames in {elapsed:6.3f} s ({frames / elapsed:8.1f} fps unpaced)")
+    return frames / elapsed
+
+
+def bench_streaming(args: argparse.Namespace) -> float:
+    port = register_virtual_camera(lambda: make_source(args))
+    cam = USBCamDevice('virtual_stream', port)
+    try:
+        spec = cam.share_stream()
+        received = 0
+        seq = 0
+        latest = 0
+
+        with SharedFrameReader(spec) as reader:
+            deadline = time.perf_counter() + args.seconds
+            while time.perf_counter() < deadline:
+                latest = reader.wait_for_next(seq, timeout=1)
+                if latest is None:
+                    break
+                if reader.view(latest) is not None:
+                    received += 1
+                seq = latest
+
+        published = cam.frame_publisher.seq
+    finally:
+        cam.stop_sharing()
+        unregister_virtual_camera(port)
+
+    print(f"  streaming     {received}/{published} frames read from the ring ({received / args.seconds:8.1f} fps, "
+          f"target {args.fps:.0f})")
+    return received / args.seconds
+
+
+def bench_recording(args: argparse.Namespace, out_dir: str, frames: int = 300) -> float:
+    cap = make_source(args, realtime=False)
+    writer = cv2.VideoWriter(path.join(out_dir, 'record.avi'), cv2.VideoWriter_fourcc(*'MJPG'), args.fps,
+                             (args.width, args.height))
+    frame = None
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        ret, frame = cap.read(frame)
+        writer.write(frame)
+    elapsed = time.perf_counter() - start
+
+    writer.release()
+    cap.release()
+    print(f"  recording     {frames} frames in {elapsed:6.3f} s ({frames / elapsed:8.1f} fps, MJPG)")
+    return frames / elapsed
+
+
+def bench_multi_camera(args: argparse.Namespace) -> RunningStats:
+    """
+    Read all cameras at once, each in its own thread, and measure how far apart the same frame arrives
+    """
+    arrivals: list[dict[int, float]] = [dict() for _ in range(args.cameras)]
+    ports = [register_virtual_camera(lambda: make_source(args)) for _ in range(args.cameras)]
+    cams = [USBCamDevice(f'virtual_{i}', port) for i, port in enumerate(ports)]
+    barrier = threading.Barrier(args.cameras)
+
+    def read_camera(index: int):
+        cap = cams[index].open_stream()
+        frame = None
+        barrier.wait()
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+            arrivals[index][int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1] = time.perf_counter()
+        cap.release()
+
+    threads = [threading.Thread(target=read_camera, args=(i,), daemon=True) for i in range(args.cameras)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for port in ports:
+        unregister_virtual_camera(port)
+
+    skew = RunningStats()
+    for index in set.intersection(*(set(a) for a in arrivals)):
+        times = [a[index] for a in arrivals]
+        skew.update(max(times) - min(times))
+
+    fps = [len(a) / args.seconds for a in arrivals]
+    print(f"  multi-camera  {args.cameras} cameras, {min(fps):.1f}-{max(fps):.1f} fps each, "
+          f"skew avg {skew.mean * 1000:.2f} ms, max {skew.max * 1000 if skew.count else 0:.2f} ms")
+    return skew
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='Replay this file instead of a synthetic pattern')
+    parser.add_argument('--size', default='1280x720', help='WIDTHxHEIGHT')
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=3)
+
+    args = parser.parse_args()
+    args.width, args.height = (int(v) for v in args.size.lower().split('x'))
+    return args
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.WARNING)
+    arguments = parse_args()
+
+    print(f"Virtual cameras: {arguments.video or 'pattern'} {arguments.width}x{arguments.height} @ {arguments.fps} fps")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bench_capture(arguments)
+        bench_streaming(arguments)
+        bench_recording(arguments, tmp_dir)
+        bench_multi_camera(arguments)
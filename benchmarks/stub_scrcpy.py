@@ -0,0 +1,59 @@
+"""
+Stand-in for the scrcpy binary, for exercising ScrcpyRecorder without a device:
+writes a fake recording until interrupted, then a trailer, like scrcpy finalizing its file.
+
+Usage: ScrcpyRecorder([sys.executable, 'benchmarks/stub_scrcpy.py'], extra args...)
+  --ignore-signals  Ignore SIGINT and SIGTERM, so only a kill stops it
+  --exit-after S    Exit on its own after S seconds
+  --exit-code N     Code to exit with then (default 0)
+"""
+import sys
+import time
+import signal
+import argparse
+
+TRAILER = b'STUB-SCRCPY-TRAILER\n'
+
+stopping = False
+
+
+def on_signal(signum, frame) -> None:
+    global stopping
+    stopping = True
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serial', required=True)
+    parser.add_argument('--record', required=True)
+    parser.add_argument('--ignore-signals', action='store_true')
+    parser.add_argument('--exit-after', type=float, default=None)
+    parser.add_argument('--exit-code', type=int, default=0)
+    args, _ = parser.parse_known_args()  # --no-display, --max-size... are accepted and ignored
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    handler = signal.SIG_IGN if args.ignore_signals else on_signal
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, handler)  # CTRL_BREAK_EVENT on windows
+
+    print(f"INFO: Recording started to mp4 file: {args.record}", flush=True)
+    start = time.monotonic()
+    with open(args.record, 'wb') as f:
+        while not stopping:
+            if args.exit_after is not None and time.monotonic() - start >= args.exit_after:
+                print(f"ERROR: Stub exiting with {args.exit_code}", file=sys.stderr, flush=True)
+                sys.exit(args.exit_code)
+
+            f.write(b'\0' * 1024)
+            f.flush()
+            time.sleep(0.01)
+
+        f.write(TRAILER)
+
+    print(f"INFO: Recording complete to mp4 file: {args.record}", flush=True)
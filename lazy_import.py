@@ -0,0 +1,56 @@
+"""
+Deferred imports for heavy optional dependencies (OpenCV, numpy), so importing the adb side of the package
+doesn't pay for them until a function that needs them runs.
+
+    cv2 = LazyModule('cv2', 'cv2')  # Same as `from cv2 import cv2`, on first attribute access
+    np = LazyModule('numpy')
+"""
+import types
+import typing
+import threading
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module proxy importing the real module on first attribute access
+    """
+
+    def __init__(self, name: str, attr: str = None):
+        """
+        :param name: Module to import
+        :param attr: Name imported from the module (from name import attr), the module itself if None
+        """
+        super().__init__(f'{name}.{attr}' if attr else name)
+        self._lazy_target: tuple[str, typing.Optional[str]] = (name, attr)
+        self._lazy_module: typing.Optional[types.ModuleType] = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                name, attr = self._lazy_target
+                module = importlib.import_module(name)
+                if attr:
+                    module = getattr(module, attr, None) or importlib.import_module(f'{name}.{attr}')
+                self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, item: str):
+        # Only called for attributes missing on the proxy itself, i.e. everything of the real module
+        module = self._lazy_module if self._lazy_module is not None else self._load()
+        return getattr(module, item)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self._lazy_module is not None else 'not loaded'
+        return f"<LazyModule '{self.__name__}' ({state})>"
+
+
+def is_loaded(module) -> bool:
+    """
+    False for a LazyModule that wasn't used yet
+    """
+    return not isinstance(module, LazyModule) or module._lazy_module is not None
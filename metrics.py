@@ -0,0 +1,310 @@
+"""
+Low overhead per-device, per-operation instrumentation: latency histograms, byte counters and error counts.
+
+Disabled by default; when disabled timed() hands out a shared no-op context manager, so an instrumented call
+costs one function call and two no-op method calls. Enable with metrics.enable(), query in process with
+get_histogram()/snapshot() and export with write_prometheus().
+"""
+import os
+import typing
+import threading
+from time import perf_counter
+
+SUB_BUCKET_BITS = 4  # 16 sub-buckets per power of two, i.e. values within 6.25%
+LINEAR_LIMIT = 2 << SUB_BUCKET_BITS  # Microseconds below this are counted exactly
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                      1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled: bool = False
+
+
+def enable(enabled: bool = True) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+# ----- Histogram -----
+def _bucket_index(micros: int) -> int:
+    if micros < LINEAR_LIMIT:
+        return micros
+
+    bits = micros.bit_length()
+    top = micros >> (bits - SUB_BUCKET_BITS - 1)  # Leading SUB_BUCKET_BITS + 1 bits, 16..31
+    return LINEAR_LIMIT + (bits - SUB_BUCKET_BITS - 2) * (1 << SUB_BUCKET_BITS) + top - (1 << SUB_BUCKET_BITS)
+
+
+def _bucket_bounds(index: int) -> tuple[int, int]:
+    """
+    :return: Microseconds range [low, high) counted by the bucket
+    """
+    if index < LINEAR_LIMIT:
+        return index, index + 1
+
+    group, sub = divmod(index - LINEAR_LIMIT, 1 << SUB_BUCKET_BITS)
+    shift = group + 1
+    low = (sub + (1 << SUB_BUCKET_BITS)) << shift
+    return low, low + (1 << shift)
+
+
+class LatencyHistogram:
+    """
+    HDR style histogram: exact below LINEAR_LIMIT microseconds, log-linear buckets above,
+    so every percentile is within 6.25% whatever the range (microseconds to hours)
+    """
+
+    def __init__(self):
+        self.counts: dict[int, int] = dict()
+        self.count: int = 0
+        self.sum: float = 0.0  # Seconds
+        self.min: float = float('inf')
+        self.max: float = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        index = _bucket_index(max(0, int(seconds * 1000000)))
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.sum += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        with other._lock:
+            counts = dict(other.counts)
+            count, total, low, high = other.count, other.sum, other.min, other.max
+
+        with self._lock:
+            for index, n in counts.items():
+                self.counts[index] = self.counts.get(index, 0) + n
+            self.count += count
+            self.sum += total
+            self.min = min(self.min, low)
+            self.max = max(self.max, high)
+
+    def percentile(self, percent: float) -> float:
+        """
+        :param percent: 0-100
+        :return: Seconds, 0 if nothing was recorded
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = max(1, round(self.count * percent / 100))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= target:
+                    low, high = _bucket_bounds(index)
+                    return min(self.max, max(self.min, (low + high) / 2 / 1000000))
+        return self.max
+
+    def count_below(self, seconds: float) -> int:
+        """
+        Values <= seconds, at bucket resolution (for cumulative Prometheus buckets).
+        The bucket holding seconds is counted whole, so values up to one bucket width (6.25%) above it
+        may be included, never values below it left out.
+        """
+        limit = int(seconds * 1000000)  # Values are recorded truncated to whole microseconds
+        with self._lock:
+            return sum(n for index, n in self.counts.items() if _bucket_bounds(index)[0] <= limit)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+# ----- Registry -----
+class _Series:
+    __slots__ = ('latency', 'bytes', 'errors', 'lock')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.bytes: int = 0
+        self.errors: int = 0
+        self.lock = threading.Lock()  # Guards bytes and errors, the histogram has its own
+
+
+_series: dict[tuple[str, str], _Series] = dict()
+_series_lock = threading.Lock()
+
+
+def _get_series(operation: str, device: str) -> _Series:
+    key = (operation, device)
+    series = _series.get(key)
+    if series is None:
+        with _series_lock:
+            series = _series.setdefault(key, _Series())
+    return series
+
+
+def record(operation: str, device: str, seconds: float, error: bool = False) -> None:
+    if not _enabled:
+        return
+
+    series = _get_series(operation, device)
+    series.latency.record(seconds)
+    if error:
+        with series.lock:
+            series.errors += 1
+
+
+def add_bytes(operation: str, device: str, count: int) -> None:
+    if _enabled:
+        series = _get_series(operation, device)
+        with series.lock:
+            series.bytes += count
+
+
+def count_error(operation: str, device: str) -> None:
+    if _enabled:
+        series = _get_series(operation, device)
+        with series.lock:
+            series.errors += 1
+
+
+class _Timer:
+    __slots__ = ('operation', 'device', 'start')
+
+    def __init__(self, operation: str, device: str):
+        self.operation = operation
+        self.device = device
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        record(self.operation, self.device, perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def timed(operation: str, device: str = '') -> typing.Union[_Timer, _NoopTimer]:
+    """
+    Context manager timing the block into the operation's histogram, exceptions count as errors
+    """
+    if not _enabled:
+        return _NOOP_TIMER
+    return _Timer(operation, device)
+
+
+# ----- Queries -----
+def get_histogram(operation: str, device: str = None) -> LatencyHistogram:
+    """
+    Latency histogram of one device, or all devices merged
+    """
+    merged = LatencyHistogram()
+    with _series_lock:
+        series = [(key, s) for key, s in _series.items() if key[0] == operation]
+
+    for (_, series_device), s in series:
+        if device is None or series_device == device:
+            merged.merge(s.latency)
+    return merged
+
+
+def snapshot() -> dict:
+    """
+    :return: Dict operation -> device -> {latency summary, bytes, errors}
+    """
+    with _series_lock:
+        series = list(_series.items())
+
+    result = dict()
+    for (operation, device), s in series:
+        result.setdefault(operation, dict())[device] = {
+            **s.latency.summary(),
+            'bytes': s.bytes,
+            'errors': s.errors,
+        }
+    return result
+
+
+def reset() -> None:
+    with _series_lock:
+        _series.clear()
+
+
+# ----- Export -----
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(operation: str, device: str, **extra) -> str:
+    labels = {'operation': operation, 'device': device, **extra}
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def to_prometheus(prefix: str = 'devices') -> str:
+    """
+    Prometheus text exposition format
+    """
+    with _series_lock:
+        series = sorted(_series.items())
+
+    lines = [
+        f"# HELP {prefix}_operation_duration_seconds Operation latency",
+        f"# TYPE {prefix}_operation_duration_seconds histogram",
+    ]
+    for (operation, device), s in series:
+        for bound in PROMETHEUS_BUCKETS:
+            lines.append(f"{prefix}_operation_duration_seconds_bucket{{{_labels(operation, device, le=bound)}}} "
+                         f"{s.latency.count_below(bound)}")
+        lines.append(f"{prefix}_operation_duration_seconds_bucket{{{_labels(operation, device, le='+Inf')}}} "
+                     f"{s.latency.count}")
+        lines.append(f"{prefix}_operation_duration_seconds_sum{{{_labels(operation, device)}}} {s.latency.sum}")
+        lines.append(f"{prefix}_operation_duration_seconds_count{{{_labels(operation, device)}}} {s.latency.count}")
+
+    lines += [
+        f"# HELP {prefix}_operation_bytes_total Bytes transferred",
+        f"# TYPE {prefix}_operation_bytes_total counter",
+    ]
+    lines += [f"{prefix}_operation_bytes_total{{{_labels(op, dev)}}} {s.bytes}" for (op, dev), s in series if s.bytes]
+
+    lines += [
+        f"# HELP {prefix}_operation_errors_total Failed operations",
+        f"# TYPE {prefix}_operation_errors_total counter",
+    ]
+    lines += [f"{prefix}_operation_errors_total{{{_labels(op, dev)}}} {s.errors}" for (op, dev), s in series]
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(file_path: str, prefix: str = 'devices') -> None:
+    """
+    Write the metrics for the node_exporter textfile collector (atomically, it may read at any time)
+    """
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(to_prometheus(prefix))
+    os.replace(tmp_path, file_path)
@@ -0,0 +1,197 @@
+"""
+Vectorized statistics over per-frame metrics and similar long sequences.
+"""
+from __future__ import annotations
+
+import math
+import typing
+
+from lazy_import import LazyModule
+
+np = LazyModule('numpy')  # RunningStats.update (used by the adb side) doesn't need numpy
+
+# Element types that numpy can convert in bulk without changing which items get_list_average counts
+NUMERIC_TYPES = {int, float, bool}
+
+
+def _is_counted(item) -> bool:
+    # Same rules as the original utils.get_list_average loop
+    return isinstance(item, (float, int)) or (isinstance(item, str) and item.isdigit())
+
+
+def coerce_numeric(values) -> np.ndarray:
+    """
+    Converts a list, tuple, array or iterable into a float64 array, keeping only ints, floats and digit strings
+    :param values: Values to convert, other items (None, '1.5', '-3', objects...) are dropped
+    :return: 1D float64 array
+    """
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind in 'biuf':
+            return values.astype(np.float64, copy=False).ravel()
+        values = values.ravel().tolist()
+    elif not isinstance(values, (list, tuple)):
+        values = list(values)
+
+    if not values:
+        return np.empty(0, dtype=np.float64)
+
+    types = set(map(type, values))
+
+    if types <= NUMERIC_TYPES:
+        return np.array(values, dtype=np.float64)
+
+    if types == {str}:
+        strings = np.array(values, dtype=str)
+        return strings[np.char.isdigit(strings)].astype(np.float64)
+
+    return np.fromiter((float(item) for item in values if _is_counted(item)), dtype=np.float64)
+
+
+def _window(values, min_index: int = None, max_index: int = None):
+    if min_index is None:
+        return values
+
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        values = list(values)
+
+    if max_index is None:
+        return [values[min_index]]
+
+    return values[min_index:max_index]
+
+
+def list_average(values, min_index: int = None, max_index: int = None) -> float:
+    """
+    Average of all the counted items (see coerce_numeric) or of those between index min and max
+    :param values: List, tuple, array or iterable
+    :param min_index: Only this item if max_index is None, else start of the range
+    :param max_index: End of the range (exclusive)
+    :return: Average, 0.0 if there is nothing to average
+    """
+    data = coerce_numeric(_window(values, min_index, max_index))
+    if data.size == 0:
+        return 0.0
+
+    total = data.sum()
+    if total == 0:
+        return 0.0
+
+    return float(total / data.size)
+
+
+def rolling_average(values, window: int, min_index: int = None, max_index: int = None) -> np.ndarray:
+    """
+    Moving average over `window` consecutive counted items
+    :param values: List, tuple, array or iterable
+    :param window: Window size
+    :param min_index: Start of the range to average over (unlike list_average, a range even without max_index)
+    :param max_index: End of the range (exclusive)
+    :return: Array of len(data) - window + 1 averages (empty if there are fewer items than window)
+    """
+    if window < 1:
+        raise ValueError('Window must be at least 1')
+
+    if min_index is not None or max_index is not None:
+        if not isinstance(values, (list, tuple, np.ndarray)):
+            values = list(values)
+        values = values[min_index:max_index]
+
+    data = coerce_numeric(values)
+    if data.size < window:
+        return np.empty(0, dtype=np.float64)
+
+    cumsum = np.cumsum(np.concatenate(([0.0], data)))
+    return (cumsum[window:] - cumsum[:-window]) / window
+
+
+def windowed_averages(values, ranges: typing.Iterable[tuple[int, int]]) -> list[float]:
+    """
+    Averages of several (min_index, max_index) ranges of the same sequence, coercing it only once
+    """
+    data = coerce_numeric(values)
+    cumsum = np.cumsum(np.concatenate(([0.0], data)))
+
+    averages = list()
+    for min_index, max_index in ranges:
+        start, stop, _ = slice(min_index, max_index).indices(data.size)
+        count = stop - start
+        averages.append(float((cumsum[stop] - cumsum[start]) / count) if count > 0 else 0.0)
+
+    return averages
+
+
+class RunningStats:
+    """
+    Online mean / variance / min / max for unbounded inputs (Welford, merged per chunk with Chan's formula)
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.mean: float = 0.0
+        self._m2: float = 0.0
+        self.min: float = math.inf
+        self.max: float = -math.inf
+
+    def update(self, value) -> None:
+        if not _is_counted(value):
+            return
+
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update_many(self, values, chunk_size: int = 65536) -> None:
+        """
+        Add a batch of values (list, array or generator), vectorized per chunk
+        """
+        if isinstance(values, (list, tuple, np.ndarray)):
+            self._merge(coerce_numeric(values))
+            return
+
+        chunk = list()
+        for value in values:
+            chunk.append(value)
+            if len(chunk) >= chunk_size:
+                self._merge(coerce_numeric(chunk))
+                chunk = list()
+        self._merge(coerce_numeric(chunk))
+
+    def _merge(self, data: np.ndarray) -> None:
+        if data.size == 0:
+            return
+
+        count = data.size
+        mean = float(data.mean())
+        m2 = float(((data - mean) ** 2).sum())
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+        self.min = min(self.min, float(data.min()))
+        self.max = max(self.max, float(data.max()))
+
+    @property
+    def variance(self) -> float:
+        """
+        Population variance
+        """
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def sample_variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def __repr__(self):
+        return f"RunningStats(count={self.count}, mean={self.mean}, std={self.std}, min={self.min}, max={self.max})"
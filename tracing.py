@@ -0,0 +1,165 @@
+"""
+Nested tracing spans recorded into a ring buffer, exportable as Chrome trace-event JSON
+(open in chrome://tracing or https://ui.perfetto.dev, one row per device).
+
+Disabled by default; when disabled span() hands out a shared no-op context manager.
+
+    tracing.enable()
+    with tracing.span('attach', device_serial):
+        with tracing.span('root', device_serial):
+            ...
+    tracing.write_chrome_trace('attach.json')
+"""
+import os
+import json
+import typing
+import threading
+import collections
+from time import perf_counter
+
+DEFAULT_CAPACITY = 100000
+
+_enabled: bool = False
+_spans: collections.deque = collections.deque(maxlen=DEFAULT_CAPACITY)
+_local = threading.local()
+_epoch: float = perf_counter()
+
+
+class Span(typing.NamedTuple):
+    name: str
+    device: str
+    start: float  # Seconds since the tracing epoch
+    duration: float  # Seconds
+    thread_id: int
+    thread_name: str
+    depth: int  # Nesting level in its thread, 0 for top level spans
+    args: dict
+
+
+def enable(enabled: bool = True, capacity: int = None) -> None:
+    """
+    :param enabled:
+    :param capacity: Spans kept, the oldest are dropped first (keeps the current ones if None)
+    """
+    global _enabled, _spans
+    if capacity is not None and capacity != _spans.maxlen:
+        _spans = collections.deque(_spans, maxlen=capacity)
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+# ----- Spans -----
+class _ActiveSpan:
+    __slots__ = ('name', 'device', 'args', 'start', 'depth')
+
+    def __init__(self, name: str, device: str, args: dict):
+        self.name = name
+        self.device = device
+        self.args = args
+
+    def set(self, **args) -> None:
+        """
+        Attach results known only inside the span (sizes, counts...)
+        """
+        self.args.update(args)
+
+    def __enter__(self):
+        self.depth = getattr(_local, 'depth', 0)
+        _local.depth = self.depth + 1
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = perf_counter()
+        _local.depth = self.depth
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+
+        thread = threading.current_thread()
+        _spans.append(Span(self.name, self.device, self.start - _epoch, end - self.start, thread.ident, thread.name,
+                           self.depth, self.args))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **args) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, device: str = '', **args) -> typing.Union[_ActiveSpan, _NoopSpan]:
+    """
+    Context manager recording the block as a span, nested under the span open in the same thread
+    :param name:
+    :param device: Serial, spans are grouped per device in the trace
+    :param args: Shown in the span details
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _ActiveSpan(name, device, args)
+
+
+# ----- Queries -----
+def get_spans(device: str = None) -> list[Span]:
+    spans = list(_spans)
+    if device is not None:
+        spans = [s for s in spans if s.device == device]
+    return spans
+
+
+def clear() -> None:
+    _spans.clear()
+
+
+# ----- Export -----
+def to_chrome_trace(spans: list[Span] = None) -> dict:
+    """
+    Chrome trace-event format: a process per device, a thread per Python thread
+    """
+    spans = get_spans() if spans is None else spans
+    pids: dict[str, int] = dict()
+    threads: set[tuple[int, int]] = set()
+    events = list()
+
+    for s in sorted(spans, key=lambda s: (s.start, s.depth)):
+        pid = pids.setdefault(s.device, len(pids) + 1)
+        if (pid, s.thread_id) not in threads:
+            threads.add((pid, s.thread_id))
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': s.thread_id,
+                           'args': {'name': s.thread_name}})
+
+        events.append({
+            'name': s.name,
+            'cat': s.device or 'host',
+            'ph': 'X',
+            'ts': round(s.start * 1000000, 3),
+            'dur': round(s.duration * 1000000, 3),
+            'pid': pid,
+            'tid': s.thread_id,
+            'args': {k: v if isinstance(v, (int, float, bool)) or v is None else str(v) for k, v in s.args.items()},
+        })
+
+    for device, pid in pids.items():
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': device or 'host'}})
+
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_chrome_trace(file_path: str, spans: list[Span] = None) -> None:
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(to_chrome_trace(spans), f)
+    os.replace(tmp_path, file_path)
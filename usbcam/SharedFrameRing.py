@@ -0,0 +1,266 @@
+import os
+import sys
+import time
+import logging
+import typing
+from multiprocessing import shared_memory, resource_tracker
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+# Header layout (int64): [latest published seq, slot 0 seq, slot 1 seq, ...]
+# A slot seq of -1 means the publisher is currently writing into that slot.
+HEADER_LATEST = 0
+SLOT_WRITING = -1
+
+_published: set[str] = set()  # Segments created by this process (inherited by forked workers)
+
+
+class SharedFrameSpec(typing.NamedTuple):
+    """
+    Everything a consumer process needs to attach to a frame ring. Picklable, so pass it to workers.
+    """
+    name: str
+    shape: tuple
+    dtype: str
+    slots: int
+
+    @property
+    def frame_bytes(self) -> int:
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+    @property
+    def header_bytes(self) -> int:
+        return (self.slots + 1) * np.dtype(np.int64).itemsize
+
+
+def _map_ring(shm: shared_memory.SharedMemory, spec: SharedFrameSpec) -> tuple[np.ndarray, np.ndarray]:
+    header = np.ndarray((spec.slots + 1,), dtype=np.int64, buffer=shm.buf)
+    frames = np.ndarray((spec.slots, *spec.shape), dtype=spec.dtype, buffer=shm.buf, offset=spec.header_bytes)
+    return header, frames
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing segment without leaving it registered with this process' resource_tracker,
+    which would unlink it when the reader exits (the publisher owns it)
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    shm = shared_memory.SharedMemory(name=name)
+    # Same tracker as the publisher's when it was created here, unregistering would drop its registration
+    if shm.name not in _published:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedFramePublisher:
+    """
+    Writes frames into a shared memory ring buffer that other processes can read without pickling.
+
+    Every published frame gets a sequence number (starting at 1). A frame lives in slot `seq % slots`
+    until it is overwritten `slots` frames later, readers validate the slot seq before and after using it.
+    """
+
+    def __init__(self, shape: tuple, dtype: str = 'uint8', slots: int = 8, name: str = None):
+        if slots < 2:
+            raise ValueError('Frame ring needs at least 2 slots')
+
+        self.spec = SharedFrameSpec(name='', shape=tuple(shape), dtype=np.dtype(dtype).str, slots=slots)
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=self.spec.header_bytes + self.spec.frame_bytes * slots
+        )
+        self.spec = self.spec._replace(name=self._shm.name)
+        _published.add(self._shm.name)
+
+        self._header, self._frames = _map_ring(self._shm, self.spec)
+        self._header[:] = 0
+        self._seq: int = 0
+
+        logging.log(logging.DEBUG, f"Created frame ring {self.spec.name}: {slots} x {shape} {self.spec.dtype}")
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def publish(self, frame: np.ndarray) -> int:
+        """
+        Copy a frame into the next slot of the ring
+        :param frame: Frame matching the ring's shape
+        :return: Sequence number of the published frame
+        """
+        seq = self._seq + 1
+        slot = seq % self.spec.slots
+
+        self._header[slot + 1] = SLOT_WRITING
+        np.copyto(self._frames[slot], frame, casting='unsafe')
+        self._header[slot + 1] = seq
+        self._header[HEADER_LATEST] = seq
+
+        self._seq = seq
+        return seq
+
+    def close(self) -> None:
+        """
+        Release and unlink the shared memory. Attached readers keep their mapping until they close.
+        """
+        del self._header, self._frames
+        _published.discard(self._shm.name)
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SharedFrameReader:
+    """
+    Attaches to a SharedFramePublisher's ring from any process.
+    """
+
+    def __init__(self, spec: SharedFrameSpec):
+        self.spec = spec
+        self._shm = _attach(spec.name)
+        self._header, self._frames = _map_ring(self._shm, spec)
+
+    def latest_seq(self) -> int:
+        return int(self._header[HEADER_LATEST])
+
+    def is_valid(self, seq: int) -> bool:
+        """
+        Check that the frame `seq` is still in its slot, i.e. that a view taken of it was not overwritten
+        """
+        return seq > 0 and int(self._header[seq % self.spec.slots + 1]) == seq
+
+    def view(self, seq: int) -> typing.Optional[np.ndarray]:
+        """
+        Zero-copy, read-only view of frame `seq`.
+        The publisher may overwrite it at any time, call is_valid(seq) after using the view.
+        :return: View or None if the frame was already overwritten
+        """
+        if not self.is_valid(seq):
+            return None
+
+        frame = self._frames[seq % self.spec.slots]
+        frame.flags.writeable = False
+        return frame
+
+    def read(self, seq: int) -> typing.Optional[np.ndarray]:
+        """
+        Copy of frame `seq`, or None if it was overwritten before or during the copy
+        """
+        frame = self.view(seq)
+        if frame is None:
+            return None
+
+        frame = frame.copy()
+        return frame if self.is_valid(seq) else None
+
+    def wait_for_next(self, after_seq: int, timeout: float = None, poll_interval: float = 0.001) -> typing.Optional[int]:
+        """
+        Block until a frame newer than after_seq is published
+        :return: Latest seq or None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            latest = self.latest_seq()
+            if latest > after_seq:
+                return latest
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self) -> None:
+        del self._header, self._frames
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Per worker process reader, attached once and reused for every frame
+_worker_reader: typing.Optional[SharedFrameReader] = None
+
+
+def _init_worker(spec: SharedFrameSpec) -> None:
+    global _worker_reader
+    _worker_reader = SharedFrameReader(spec)
+
+
+def _process_frame(seq: int, func: typing.Callable) -> tuple[int, typing.Any, bool]:
+    frame = _worker_reader.view(seq)
+    if frame is None:
+        return seq, None, False
+
+    result = func(frame)
+    return seq, result, _worker_reader.is_valid(seq)
+
+
+def process_shared_frames(spec: SharedFrameSpec, func: typing.Callable, workers: int = None,
+                          max_frames: int = None, idle_timeout: float = 1.0) -> typing.Iterator[tuple[int, typing.Any]]:
+    """
+    Run func(frame) on published frames in a process pool, skipping frames the pool cannot keep up with.
+    func must be picklable (module level function).
+    :param spec: Spec of the ring to consume
+    :param func: Per-frame analysis, gets a read-only view of the frame
+    :param workers: Number of processes, defaults to the number of cores
+    :param max_frames: Stop after this many processed frames
+    :param idle_timeout: Stop when no new frame was published for this long
+    :return: Iterator of (seq, result) for frames that were not overwritten while being analysed
+    """
+    workers = workers or os.cpu_count()
+    processed = 0
+    dropped = 0
+
+    with SharedFrameReader(spec) as reader, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,)) as pool:
+        last_seq = reader.latest_seq()
+        in_flight = list()
+
+        while max_frames is None or processed < max_frames:
+            if len(in_flight) < workers:
+                # Always pick the newest frame, frames published in between are skipped
+                latest = reader.wait_for_next(last_seq, timeout=idle_timeout)
+                if latest is None:
+                    break
+
+                in_flight.append(pool.submit(_process_frame, latest, func))
+                dropped += latest - last_seq - 1
+                last_seq = latest
+            else:
+                wait(in_flight, return_when=FIRST_COMPLETED)
+
+            still_running = list()
+            for future in in_flight:
+                if not future.done():
+                    still_running.append(future)
+                    continue
+
+                seq, result, valid = future.result()
+                if valid and (max_frames is None or processed < max_frames):
+                    processed += 1
+                    yield seq, result
+                else:
+                    dropped += 1
+            in_flight = still_running
+
+        # Frames still in flight only count while under max_frames
+        for future in in_flight:
+            seq, result, valid = future.result()
+            if valid and (max_frames is None or processed < max_frames):
+                processed += 1
+                yield seq, result
+            else:
+                dropped += 1
+
+    logging.log(logging.DEBUG, f"Shared frames processed: {processed}, dropped: {dropped}")
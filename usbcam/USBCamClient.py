@@ -7,10 +7,11 @@ from cv2 import cv2
 
 from utils import compare_sets
 import usbcam.USBCamDevice
+from usbcam.VirtualCamera import get_virtual_ports, get_virtual_camera
 import Client
 
 
-def get_ports_dict() -> tuple[dict[str, dict], set[str]]:
+def get_ports_dict(include_virtual: bool = True) -> tuple[dict[str, dict], set[str]]:
     is_working: bool = True
     dev_port: int = 0
     working_ports = dict()
@@ -38,6 +39,19 @@ def get_ports_dict() -> tuple[dict[str, dict], set[str]]:
                 available_ports.add(dev_port)
         dev_port += 1
 
+    if include_virtual:
+        for port in get_virtual_ports():
+            camera = get_virtual_camera(port)()
+            working_ports[port] = {
+                'id': port,
+                'frame_size': {
+                    'height': camera.get(cv2.CAP_PROP_FRAME_HEIGHT),
+                    'width': camera.get(cv2.CAP_PROP_FRAME_WIDTH)
+                },
+                'virtual': True
+            }
+            camera.release()
+
     return working_ports, available_ports
 
 
@@ -103,29 +117,27 @@ class USBCamClient(Client.Client):
                     friendly_name = list(ports_dict.keys)[diff_device]
                     serial = friendly_name.replace(' ', '').lower()
 
-                    if "connected" in self.callbacks:
-                        self.callbacks['connected'](
-                            action='connected',
-                            serial=serial,
-                            port=diff_device,
-                            type='usb_cam',
-                            friendly_name=friendly_name,
-                            error=False
-                        )
+                    self.emit(
+                        'connected',
+                        serial=serial,
+                        port=diff_device,
+                        type='usb_cam',
+                        friendly_name=friendly_name,
+                        error=False
+                    )
             elif len(devices_set) < len(self.connected_devices):  # If a device has disconnected
                 for count, diff_device in enumerate(compare_sets(self.connected_devices, devices_set)):
                     friendly_name = list(ports_dict.keys)[diff_device]
                     serial = friendly_name.replace(' ', '').lower()
 
-                    if "disconnected" in self.callbacks:
-                        self.callbacks['disconnected'](
-                                action='disconnected',
-                                serial=serial,
-                                port=diff_device,
-                                type='usb_cam',
-                                friendly_name=friendly_name,
-                                error=False
-                        )
+                    self.emit(
+                        'disconnected',
+                        serial=serial,
+                        port=diff_device,
+                        type='usb_cam',
+                        friendly_name=friendly_name,
+                        error=False
+                    )
 
             self.connected_devices = devices_set
 
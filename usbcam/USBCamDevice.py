@@ -1,22 +1,39 @@
 from cv2 import cv2
 import logging
+import threading
+import typing
 
 from Device import Device
+from usbcam.SharedFrameRing import SharedFramePublisher, SharedFrameSpec
+from usbcam.VirtualCamera import VirtualCapture, get_virtual_camera
 
 
 class USBCamDevice(Device):
-    def __init__(self, serial: str, port_id: int):
+    def __init__(self, serial: str, port_id: int, source: typing.Callable[[], VirtualCapture] = None):
+        """
+        :param serial: Device serial
+        :param port_id: Camera index (/dev/videoN) or a registered virtual camera port
+        :param source: Factory of the capture to use instead of the camera (e.g. a PatternSource)
+        """
         super().__init__(serial)
 
         self.port_id = port_id
+        self.source = source or get_virtual_camera(port_id)
+
+        self.frame_publisher: typing.Optional[SharedFramePublisher] = None
+        self._sharing_thread: typing.Optional[threading.Thread] = None
+        self._run_sharing: bool = False
+
+    def open_stream(self) -> typing.Union[cv2.VideoCapture, VirtualCapture]:
+        if self.source is not None:
+            return self.source()
 
-    def open_stream(self) -> cv2.VideoCapture:
         cap = cv2.VideoCapture(self.port_id)
 
         return cap
 
     def open_camera_stream_windowed(self) -> None:
-        cap: cv2.VideoCapture = self.open_stream()
+        cap = self.open_stream()
 
         if cap.isOpened():
             width = cap.get(3)  # Frame Width
@@ -36,6 +53,61 @@ class USBCamDevice(Device):
             cap.release()
             cv2.destroyAllWindows()
 
+    def share_stream(self, slots: int = 8) -> typing.Optional[SharedFrameSpec]:
+        """
+        Start capturing into a shared memory ring so other processes can read frames without pickling
+        :param slots: Number of frames kept in the ring
+        :return: Spec to pass to SharedFrameReader / process_shared_frames, None if the camera can't be read
+        """
+        if self.frame_publisher is not None:
+            if self._sharing_thread is not None and self._sharing_thread.is_alive():
+                return self.frame_publisher.spec
+
+            # The camera stopped returning images, its ring gets no new frames: start over with a new one
+            logging.log(logging.INFO, f"Camera {self.port_id} sharing thread ended, restarting it.")
+            self.stop_sharing()
+
+        cap = self.open_stream()
+        ret, frame = cap.read()
+        if not ret:
+            logging.log(logging.ERROR, f"Camera {self.port_id} does not return images, not sharing it.")
+            cap.release()
+            return None
+
+        self.frame_publisher = SharedFramePublisher(frame.shape, frame.dtype, slots=slots)
+        self.frame_publisher.publish(frame)
+
+        self._run_sharing = True
+        self._sharing_thread = threading.Thread(target=self._share_stream, args=(cap,), daemon=True)
+        self._sharing_thread.name = f'USBCam-{self.port_id}-Sharing'
+        self._sharing_thread.start()
+
+        return self.frame_publisher.spec
+
+    def _share_stream(self, cap) -> None:
+        while self._run_sharing:
+            ret, frame = cap.read()
+            if not ret:
+                logging.log(logging.WARNING, f"Camera {self.port_id} stopped returning images.")
+                break
+
+            self.frame_publisher.publish(frame)
+
+        cap.release()
+
+    def stop_sharing(self) -> None:
+        """
+        Stop the capture thread started by share_stream and release the shared memory
+        """
+        self._run_sharing = False
+        if self._sharing_thread is not None:
+            self._sharing_thread.join()
+            self._sharing_thread = None
+
+        if self.frame_publisher is not None:
+            self.frame_publisher.close()
+            self.frame_publisher = None
+
     def take_photo(self):
         pass
 
@@ -0,0 +1,247 @@
+"""
+Virtual capture sources with the cv2.VideoCapture interface used by USBCamDevice (read, grab, retrieve,
+get, set, isOpened, release), so streaming, recording and multi-camera code runs without cameras.
+
+    port = register_virtual_camera(lambda: PatternSource(1280, 720, fps=30))
+    cam = USBCamDevice('virtual', port)
+"""
+import typing
+import logging
+import threading
+from time import sleep, perf_counter
+
+import numpy as np
+from cv2 import cv2
+
+VIRTUAL_PORT_BASE = 1000  # Far above real /dev/video* indexes
+
+PATTERNS = ('bars', 'gradient', 'noise', 'solid')
+COLOR_BARS = np.array([  # BGR
+    [255, 255, 255], [0, 255, 255], [255, 255, 0], [0, 255, 0],
+    [255, 0, 255], [0, 0, 255], [255, 0, 0], [0, 0, 0],
+], dtype=np.uint8)
+
+
+def stamp_frame_index(frame: np.ndarray, index: int) -> None:
+    """
+    Write the frame index into the first pixels, read back with read_frame_index (e.g. to check multi-camera sync)
+    """
+    frame.reshape(-1)[:8] = np.frombuffer(int(index).to_bytes(8, 'little'), dtype=np.uint8)
+
+
+def read_frame_index(frame: np.ndarray) -> int:
+    return int.from_bytes(frame.reshape(-1)[:8].tobytes(), 'little')
+
+
+class VirtualCapture:
+    """
+    Base of the virtual sources: frame pacing at the target fps and the VideoCapture properties.
+    With realtime=False frames are produced as fast as they are read.
+    """
+
+    def __init__(self, width: int, height: int, fps: float, realtime: bool = True, max_frames: int = None):
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+        self.realtime = realtime
+        self.max_frames = max_frames
+
+        self.frame_index: int = 0  # Index of the next frame
+        self._opened: bool = True
+        self._started: typing.Optional[float] = None
+        self._grabbed: typing.Optional[np.ndarray] = None
+
+    # ----- VideoCapture interface -----
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def grab(self) -> bool:
+        if not self._opened or (self.max_frames is not None and self.frame_index >= self.max_frames):
+            return False
+
+        if self.realtime:
+            if self._started is None:
+                self._started = perf_counter()
+            delay = self._started + self.frame_index / self.fps - perf_counter()
+            if delay > 0:
+                sleep(delay)
+
+        self._grabbed = self._next_frame()
+        if self._grabbed is None:
+            return False
+
+        self.frame_index += 1
+        return True
+
+    def retrieve(self, image: np.ndarray = None) -> tuple[bool, typing.Optional[np.ndarray]]:
+        if self._grabbed is None:
+            return False, None
+
+        if image is not None and image.shape == self._grabbed.shape and image.dtype == self._grabbed.dtype:
+            np.copyto(image, self._grabbed)
+            return True, image
+        return True, self._grabbed.copy()
+
+    def read(self, image: np.ndarray = None) -> tuple[bool, typing.Optional[np.ndarray]]:
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop_id: int) -> float:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.frame_index)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            return self.frame_index * 1000 / self.fps
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.max_frames or -1)
+        return 0.0
+
+    def set(self, prop_id: int, value: float) -> bool:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            self.width = int(value)
+        elif prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.height = int(value)
+        elif prop_id == cv2.CAP_PROP_FPS:
+            self.fps = float(value)
+        else:
+            return False
+
+        self._started = None  # Restart pacing
+        self.frame_index = 0
+        self._on_format_change()
+        return True
+
+    def release(self) -> None:
+        self._opened = False
+        self._grabbed = None
+
+    # ----- Sources -----
+    def _next_frame(self) -> typing.Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def _on_format_change(self) -> None:
+        pass
+
+
+class PatternSource(VirtualCapture):
+    """
+    Synthetic frames: a pattern with a moving bar, stamped with the frame index
+    """
+
+    def __init__(self, width: int = 1280, height: int = 720, fps: float = 30, pattern: str = 'bars',
+                 realtime: bool = True, max_frames: int = None):
+        if pattern not in PATTERNS:
+            raise ValueError(f"Unknown pattern '{pattern}', expected one of {PATTERNS}")
+
+        self.pattern = pattern
+        self._base: typing.Optional[np.ndarray] = None
+        self._frame: typing.Optional[np.ndarray] = None
+        self._rng = np.random.default_rng(0)
+        super().__init__(width, height, fps, realtime, max_frames)
+        self._on_format_change()
+
+    def _on_format_change(self) -> None:
+        if self.pattern == 'bars':
+            columns = np.arange(self.width) * len(COLOR_BARS) // self.width
+            self._base = np.ascontiguousarray(np.broadcast_to(COLOR_BARS[columns], (self.height, self.width, 3)))
+        elif self.pattern == 'gradient':
+            row = np.linspace(0, 255, self.width, dtype=np.uint8)
+            self._base = np.ascontiguousarray(np.broadcast_to(row[None, :, None], (self.height, self.width, 3)))
+        else:
+            self._base = np.full((self.height, self.width, 3), 128, dtype=np.uint8)
+
+        self._frame = np.empty_like(self._base)
+
+    def _next_frame(self) -> np.ndarray:
+        if self.pattern == 'noise':
+            self._frame[:] = self._rng.integers(0, 256, size=self._frame.shape, dtype=np.uint8)
+        else:
+            np.copyto(self._frame, self._base)
+
+        # Moving bar, so encoders and motion based code see changing content
+        bar_width = max(1, self.width // 32)
+        x = (self.frame_index * bar_width) % self.width
+        self._frame[:, x:x + bar_width] = 255 - self._frame[:, x:x + bar_width]
+
+        stamp_frame_index(self._frame, self.frame_index)
+        return self._frame
+
+
+class FileSource(VirtualCapture):
+    """
+    Replays a video file, resized to the target resolution and paced at the target fps, looping at its end
+    """
+
+    def __init__(self, video_path: str, width: int = None, height: int = None, fps: float = None,
+                 loop: bool = True, realtime: bool = True, max_frames: int = None):
+        self.video_path = video_path
+        self.loop = loop
+
+        self._cap = cv2.VideoCapture(video_path)
+        if not self._cap.isOpened():
+            raise FileNotFoundError(f"Cannot open video {video_path}")
+
+        super().__init__(
+            width or self._cap.get(cv2.CAP_PROP_FRAME_WIDTH),
+            height or self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT),
+            fps or self._cap.get(cv2.CAP_PROP_FPS) or 30,
+            realtime, max_frames
+        )
+
+    def _next_frame(self) -> typing.Optional[np.ndarray]:
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+        if not ret:
+            return None
+
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def release(self) -> None:
+        super().release()
+        self._cap.release()
+
+
+# ----- Registry -----
+_virtual_cameras: dict[int, typing.Callable[[], VirtualCapture]] = dict()
+_registry_lock = threading.Lock()
+
+
+def register_virtual_camera(factory: typing.Callable[[], VirtualCapture], port: int = None) -> int:
+    """
+    Make a virtual camera show up in get_ports_dict and open through USBCamDevice.open_stream
+    :param factory: Creates a new capture every time the camera is opened
+    :param port: Port id, the next free one from VIRTUAL_PORT_BASE by default
+    :return: Port id
+    """
+    with _registry_lock:
+        if port is None:
+            port = max(_virtual_cameras, default=VIRTUAL_PORT_BASE - 1) + 1
+        _virtual_cameras[port] = factory
+
+    logging.log(logging.DEBUG, f"Virtual camera registered at port {port}")
+    return port
+
+
+def unregister_virtual_camera(port: int) -> None:
+    with _registry_lock:
+        _virtual_cameras.pop(port, None)
+
+
+def get_virtual_camera(port: int) -> typing.Optional[typing.Callable[[], VirtualCapture]]:
+    with _registry_lock:
+        return _virtual_cameras.get(port)
+
+
+def get_virtual_ports() -> list[int]:
+    with _registry_lock:
+        return sorted(_virtual_cameras)
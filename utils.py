@@ -1,42 +1,40 @@
 from re import sub, match
-from cv2 import cv2
 from pathlib import Path
-from os import path
+from os import path, cpu_count, remove
+from queue import Queue
+from threading import Thread
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import typing
 
+from stats import list_average
+from lazy_import import LazyModule
 
-def get_list_average(list_in: list, min_index: int = None, max_index: int = None) -> float:
+cv2 = LazyModule('cv2', 'cv2')  # Only the video helpers need OpenCV
+
+IMAGE_FORMATS = {
+    "JPEG": "jpg",
+    "PNG": "png"
+}
+
+# Gaps up to this many frames are skipped with grab() instead of seeking,
+# as a seek decodes from the previous keyframe anyway
+SEEK_GRAB_THRESHOLD = 30
+
+
+def get_list_average(list_in, min_index: int = None, max_index: int = None) -> float:
     """
     Returns an average of all the items in passed list or of those between index min and max
+    Accepts lists, tuples, numpy arrays and generators, see stats.list_average
     :param list_in:
     :param min_index:
     :param max_index:
     :return:
     """
-    if not isinstance(list_in, list) and len(list_in) == 0:
+    if not isinstance(list_in, list) and hasattr(list_in, '__len__') and len(list_in) == 0:
         return
 
-    if min_index is not None:
-        if max_index is None:
-            list_in = [list_in[min_index]]
-        else:
-            list_in = list_in[min_index:max_index]
-
-    result = 0.0
-    divider = 0
-
-    for item in list_in:
-        if isinstance(item, float) or isinstance(item, int) or (isinstance(item, str) and item.isdigit()):
-            if isinstance(item, str) and item.isdigit():
-                result += float(item)
-                divider += 1
-                continue
-            result += item
-            divider += 1
-    if result == 0 or divider == 0:
-        return 0.0
-
-    return result / divider
+    return list_average(list_in, min_index, max_index)
 
 
 def compare_lists(list1, list2) -> list:
@@ -68,21 +66,18 @@ def get_file_paths(line_list, f_pattern):
 
 
 def extract_video_frame(videofile, start_frame, number_of_frames=None, end_frame=None, skip_frames=0,
-                        subfolder=False, out_format="JPEG") -> list:
-    output = list()
+                        subfolder=False, out_format="JPEG", encoders: int = 0) -> list:
+    if encoders:
+        if end_frame and start_frame > end_frame:
+            logging.log(logging.ERROR, 'Start frame must be smaller int than end frame!')
+            return
 
-    formats = {
-        "JPEG": "jpg",
-        "PNG": "png"
-    }
+        frames = get_frame_range(start_frame, number_of_frames, end_frame, skip_frames)
+        return extract_video_frames_pipelined(videofile, frames, subfolder, out_format, encoders=encoders)
 
-    file_name = path.basename(videofile)
-    file_path = path.dirname(videofile)
+    output = list()
 
-    if subfolder:
-        file_path = path.join(file_path, subfolder)
-        # Create dirs if not exist
-        Path(file_path).mkdir(parents=True, exist_ok=True)
+    file_path = get_frames_out_dir(videofile, subfolder)
 
     vidcap = cv2.VideoCapture(videofile)
     success, image = vidcap.read()
@@ -105,13 +100,13 @@ def extract_video_frame(videofile, start_frame, number_of_frames=None, end_frame
         if start_frame <= current_frame <= end_frame:
             if skip_frames:
                 if current_frame == next_frame:
-                    img_out = path.join(file_path, f"{file_name}_frame{current_frame}.{formats[out_format]}")
+                    img_out = get_frame_out_path(videofile, file_path, current_frame, out_format)
                     output.append(img_out)
                     cv2.imwrite(img_out, image)  # save frame as JPEG file
 
                     next_frame += skip_frames
             else:
-                img_out = path.join(file_path, f"{file_name}_frame{current_frame}.{formats[out_format]}")
+                img_out = get_frame_out_path(videofile, file_path, current_frame, out_format)
                 output.append(img_out)
                 cv2.imwrite(img_out, image)  # save frame as JPEG file
         elif start_frame <= current_frame:
@@ -119,7 +114,7 @@ def extract_video_frame(videofile, start_frame, number_of_frames=None, end_frame
 
         # Save some time..
         if number_of_frames is not None:
-            if len(img_out) == number_of_frames:
+            if len(output) == number_of_frames:
                 break
         elif current_frame >= end_frame:
             break
@@ -131,9 +126,203 @@ def extract_video_frame(videofile, start_frame, number_of_frames=None, end_frame
     return output
 
 
-def get_video_info(video_in) -> tuple:
+def get_frames_out_dir(videofile, subfolder=False) -> str:
+    file_path = path.dirname(videofile)
+
+    if subfolder:
+        file_path = path.join(file_path, subfolder)
+        # Create dirs if not exist
+        Path(file_path).mkdir(parents=True, exist_ok=True)
+
+    return file_path
+
+
+def get_frame_out_path(videofile, file_path, frame_num, out_format="JPEG") -> str:
+    return path.join(file_path, f"{path.basename(videofile)}_frame{frame_num}.{IMAGE_FORMATS[out_format]}")
+
+
+def read_video_frames(vidcap, frame_indices, grab_threshold: int = SEEK_GRAB_THRESHOLD):
+    """
+    Yields (frame_num, image) for the requested frames, seeking over long gaps and grabbing over short ones
+    :param vidcap: Opened cv2.VideoCapture
+    :param frame_indices: Frame numbers to read, 1 based like in extract_video_frame
+    :param grab_threshold: Gaps up to this many frames are skipped using grab() without decoding into images
+    :return: Generator of (frame_num, image)
+    """
+    next_pos = 0  # 0 based position of the frame the next read() returns
+
+    for frame_num in sorted(set(frame_indices)):
+        target_pos = frame_num - 1
+        if target_pos < 0:
+            continue
+
+        gap = target_pos - next_pos
+        if gap < 0 or gap > grab_threshold:
+            # Backend seeks to the previous keyframe and decodes up to the target
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, target_pos)
+        else:
+            for _ in range(gap):
+                if not vidcap.grab():
+                    return
+
+        success, image = vidcap.read()
+        logging.log(logging.DEBUG, f'Read frame {frame_num}: {success}')
+        if not success:
+            return
+
+        next_pos = target_pos + 1
+        yield frame_num, image
+
+
+def extract_video_frames(videofile, frame_indices, subfolder=False, out_format="JPEG",
+                         grab_threshold: int = SEEK_GRAB_THRESHOLD) -> list:
+    """
+    Extracts only the listed frames of a video without decoding the whole file up to them
+    :param videofile: Path to the video
+    :param frame_indices: Frame numbers to extract, 1 based like in extract_video_frame
+    :param subfolder: Save frames in this subfolder next to the video
+    :param out_format: JPEG or PNG
+    :param grab_threshold: Gaps up to this many frames are skipped using grab() instead of seeking
+    :return: List of saved image paths
+    """
+    output = list()
+
+    file_path = get_frames_out_dir(videofile, subfolder)
+
+    vidcap = cv2.VideoCapture(videofile)
+
+    for frame_num, image in read_video_frames(vidcap, frame_indices, grab_threshold):
+        img_out = get_frame_out_path(videofile, file_path, frame_num, out_format)
+        cv2.imwrite(img_out, image)
+        output.append(img_out)
+
+    vidcap.release()
+
+    return output
+
+
+def _encode_frames(frames_queue: Queue, output: dict) -> None:
+    while True:
+        item = frames_queue.get()
+        if item is None:
+            break
+
+        frame_num, img_out, image = item
+        try:
+            written = cv2.imwrite(img_out, image)
+        except Exception as e:
+            # Keep the encoder alive, the decoder would block on the queue once all of them died
+            logging.log(logging.ERROR, f"Could not write frame {frame_num} to {img_out}: {e}")
+            continue
+
+        if written:
+            output[frame_num] = img_out
+        else:
+            logging.log(logging.ERROR, f"Could not write frame {frame_num} to {img_out}")
+
+
+def extract_video_frames_pipelined(videofile, frame_indices, subfolder=False, out_format="JPEG",
+                                   encoders: int = None, queue_size: int = None,
+                                   grab_threshold: int = SEEK_GRAB_THRESHOLD) -> list:
+    """
+    Like extract_video_frames, but image encoding runs on a pool of encoder threads fed by the decoder
+    through a bounded queue, so decoding and encoding overlap
+    :param encoders: Number of encoder threads, defaults to the number of cores
+    :param queue_size: Max decoded frames waiting for an encoder, defaults to 2 per encoder
+    :return: List of saved image paths, ordered by frame number
+    """
+    encoders = encoders or cpu_count()
+    frames_queue = Queue(maxsize=queue_size or encoders * 2)
+    output = dict()
+
+    file_path = get_frames_out_dir(videofile, subfolder)
+
+    workers = list()
+    for i in range(encoders):
+        worker = Thread(target=_encode_frames, args=(frames_queue, output), daemon=True)
+        worker.name = f'FramesEncoder-{i}'
+        worker.start()
+        workers.append(worker)
+
+    vidcap = cv2.VideoCapture(videofile)
+    try:
+        for frame_num, image in read_video_frames(vidcap, frame_indices, grab_threshold):
+            frames_queue.put((frame_num, get_frame_out_path(videofile, file_path, frame_num, out_format), image))
+    finally:
+        vidcap.release()
+
+        for _ in workers:
+            frames_queue.put(None)
+        for worker in workers:
+            worker.join()
+
+    return [output[frame_num] for frame_num in sorted(output)]
+
+
+def extract_video_frames_parallel(videofile, frame_indices, subfolder=False, out_format="JPEG",
+                                  processes: int = None, encoders: int = 2,
+                                  grab_threshold: int = SEEK_GRAB_THRESHOLD) -> list:
+    """
+    Splits the requested frames into contiguous segments and extracts each one in its own process,
+    every process seeking to its segment and running a pipelined extraction
+    :param processes: Number of processes, defaults to the number of cores
+    :param encoders: Encoder threads per process
+    :return: List of saved image paths, ordered by frame number
+    """
+    frames = sorted(set(frame_indices))
+    if not frames:
+        return []
+
+    processes = min(processes or cpu_count(), len(frames))
+    segment_len = -(-len(frames) // processes)
+    segments = [frames[i:i + segment_len] for i in range(0, len(frames), segment_len)]
+
+    # Create the output dir once here instead of racing on it in every process
+    get_frames_out_dir(videofile, subfolder)
+
+    output = list()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        jobs = [
+            pool.submit(extract_video_frames_pipelined, videofile, segment, subfolder, out_format,
+                        encoders, None, grab_threshold)
+            for segment in segments
+        ]
+        for job in jobs:
+            output.extend(job.result())
+
+    return output
+
+
+def get_frame_range(start_frame, number_of_frames=None, end_frame=None, skip_frames=0) -> range:
+    """
+    Frame numbers that extract_video_frame would select for the same arguments
+    """
+    step = skip_frames if skip_frames else 1
+
+    if end_frame is None or end_frame == 0:
+        return range(start_frame, start_frame + number_of_frames * step, step)
+
+    return range(start_frame, end_frame + 1, step)
+
+
+def get_video_info(video_in, cache=None) -> tuple:
+    """
+    Returns width, height, fps and number of frames of a video
+    :param video_in: Path to the video
+    :param cache: Optional video_index.VideoInfoCache, to not open files that were already probed
+    :return: Tuple (w, h, fps, n_frames)
+    """
+    if cache is not None:
+        return cache.get(video_in).as_tuple()
+
     cap = cv2.VideoCapture(video_in)
+    info = get_capture_info(cap)
+    cap.release()
+
+    return info
 
+
+def get_capture_info(cap) -> tuple:
     w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = int(cap.get(cv2.CAP_PROP_FPS))
@@ -143,95 +332,185 @@ def get_video_info(video_in) -> tuple:
     return w, h, fps, n_frames
 
 
-# Splits video in half
-def split_video(video_in):
-    w, h, fps, n_frames = get_video_info(video_in)
+def get_grid_rois(w: int, h: int, rows: int = 2, cols: int = 1) -> list:
+    """
+    Splits a w x h frame into a grid of rows x cols ROIs
+    :return: List of (x, y, w, h) ROIs, row by row
+    """
+    tile_w = int(w / cols)
+    tile_h = int(h / rows)
+
+    return [(col * tile_w, row * tile_h, tile_w, tile_h) for row in range(rows) for col in range(cols)]
 
-    x, y = 0, 0
-    height = int(h / 2)
-    width = w
 
-    logging.log(logging.DEBUG, f"split video got file: {video_in}")
-    logging.log(logging.DEBUG, f"height: {height}, width: {width}, fps: {fps}, n_frames: {n_frames}")
+def get_split_suffixes(rows: int = 2, cols: int = 1, rois: list = None) -> list:
+    if rois:
+        return [f"roi{i}" for i in range(len(rois))]
+
+    if (rows, cols) == (2, 1):
+        return ["top", "bottom"]
 
-    # (x, y, w, h) = cv2.boundingRect(c)
-    # cv2.rectangle(frame, (x,y), (x+w, y+h), (0, 255, 0), 20)
-    # roi = frame[y:y+h, x:x+w]
+    return [f"r{row}c{col}" for row in range(rows) for col in range(cols)]
+
+
+def get_split_base_path(video_in) -> str:
+    """
+    Output path of split_video without the suffix and extension, e.g. rec/a.mp4 -> rec/a_cropped
+    """
+    vid_name_no_ext = path.splitext(path.basename(video_in))[0]
+    base_path = path.join(path.dirname(video_in), f'{vid_name_no_ext}_cropped')
+
+    suff = 1
+    check_path = f'{base_path}.mp4'
+
+    while path.isfile(check_path):
+        logging.log(logging.DEBUG, f"Checking {check_path}")
+
+        check_path = f"{base_path}_{suff}.mp4"
+        suff += 1
+
+    return path.splitext(check_path)[0]
+
+
+def _write_frames(writer, frames_queue: Queue, out_path: str, errors: dict) -> None:
+    try:
+        while True:
+            frame = frames_queue.get()
+            if frame is None:
+                break
+            if out_path in errors:
+                continue  # Keep draining, so the decoder never blocks on a full queue
+
+            try:
+                writer.write(frame)
+            except Exception as e:
+                logging.log(logging.ERROR, f"Could not write a frame to {out_path}: {e}")
+                errors[out_path] = e
+    finally:
+        writer.release()
+
+
+# Splits video in half (or in any grid / list of ROIs)
+def split_video(video_in, headless: bool = False, rows: int = 2, cols: int = 1, rois: list = None,
+                progress_callback: typing.Callable = None, queue_size: int = 16) -> list:
+    """
+    Splits a video into several videos, by default into a top and a bottom half
+    :param video_in: Path to the video
+    :param headless: Don't show the preview window (needed on machines without a display)
+    :param rows: Number of rows of the split grid
+    :param cols: Number of columns of the split grid
+    :param rois: List of (x, y, w, h) regions to export instead of a grid
+    :param progress_callback: Called with (frame, n_frames) after every decoded frame
+    :param queue_size: Max frames waiting for each output writer
+    :return: Tuple (list of output video paths, number of frames written to each of them)
+    """
     cap = cv2.VideoCapture(video_in)
+    if not cap.isOpened():
+        cap.release()
+        raise OSError(f"Cannot open video {video_in}")
+
+    w, h, fps, n_frames = get_capture_info(cap)
+
+    suffixes = get_split_suffixes(rows, cols, rois)
+    if not rois:
+        rois = get_grid_rois(w, h, rows, cols)
+
+    for x, y, roi_w, roi_h in rois:
+        if x < 0 or y < 0 or roi_w <= 0 or roi_h <= 0 or x + roi_w > w or y + roi_h > h:
+            cap.release()
+            raise ValueError(f"ROI {(x, y, roi_w, roi_h)} does not fit in the {w}x{h} frames of {video_in}")
+
+    logging.log(logging.DEBUG, f"split video got file: {video_in}")
+    logging.log(logging.DEBUG, f"rois: {rois}, fps: {fps}, n_frames: {n_frames}")
+
     # get fps info from file CV_CAP_PROP_FPS, if possible
-    fps = int(round(cap.get(5)))
+    fps = int(round(cap.get(cv2.CAP_PROP_FPS)))
     # check if we got a value, otherwise use any number - you might need to change this
     if fps == 0:
         fps = 30  # so change this number if cropped video has stange steed, higher number gives slower speed
 
-    vid_name = path.basename(video_in)
-    vid_name_no_ext = vid_name.split(".")[0]
+    base_path = get_split_base_path(video_in)
+    logging.log(logging.INFO, f"cropping {path.basename(video_in)} to {base_path}")
+
+    out_paths = [f"{base_path}_{suffix}.mp4" for suffix in suffixes]
+
+    # Every output gets its own encoder thread, the decoder only slices frames and hands them over
+    queues = list()
+    writers = list()
+    write_errors = dict()
+    for num, (out_path, (x, y, roi_w, roi_h)) in enumerate(zip(out_paths, rois)):
+        logging.log(logging.DEBUG, f'Saving to {out_path}')
+
+        frames_queue = Queue(maxsize=queue_size)
+        writer = Thread(
+            target=_write_frames,
+            args=(cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'MP4V'), fps, (roi_w, roi_h)), frames_queue,
+                  out_path, write_errors),
+            daemon=True
+        )
+        writer.name = f'SplitVideoWriter-{num}'
+        writer.start()
+
+        queues.append(frames_queue)
+        writers.append(writer)
+
+    if not headless:
+        x, y, roi_w, roi_h = rois[0]
+        # Display the resulting frame - trying to move window, but does not always work
+        cv2.namedWindow('producing video', cv2.WINDOW_NORMAL)
+        cv2.resizeWindow('producing video', roi_w, roi_h)
+        cv2.moveWindow("producing video", round(w / 2) - round(roi_w / 2), round(h / 2) - round(roi_h / 2))
+
+    curr_frame = 0
+    try:
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if frame is None:
+                break
 
-    out_cropped = f"{vid_name_no_ext}_cropped"
-    logging.log(logging.INFO, f"cropping {vid_name} to {out_cropped}")
+            curr_frame += 1
 
-    out_path = f'{path.dirname(video_in)}/{out_cropped}.mp4'
-    logging.log(logging.DEBUG, f"Is file: {path.isfile(out_path)}")
+            # Crop frame, each output gets a view of the decoded frame
+            for frames_queue, (x, y, roi_w, roi_h) in zip(queues, rois):
+                frames_queue.put(frame[y:y + roi_h, x:x + roi_w])
 
-    suff = 1
+            if progress_callback is not None:
+                progress_callback(curr_frame, n_frames)
 
-    check_path = out_path
+            if not headless:
+                x, y, roi_w, roi_h = rois[0]
+                cv2.imshow('producing video', frame[y:y + roi_h, x:x + roi_w])
 
-    while path.isfile(check_path):
-        logging.log(logging.DEBUG, f"Checking {check_path}")
+                # Press Q on keyboard to stop recording early
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    finally:
+        # Close video capture
+        cap.release()
 
-        check_path = f"{out_path.split('.')[0]}_{suff}.mp4"
-        suff += 1
+        # Let the writers drain their queues and close the video writers
+        for frames_queue in queues:
+            frames_queue.put(None)
+        for writer in writers:
+            writer.join()
 
-    out_path0 = f"{check_path.split('.')[0]}_top.mp4"
-    out_path1 = f"{check_path.split('.')[0]}_bottom.mp4"
-    logging.log(logging.DEBUG, f'Saving to {out_path0}')
-    logging.log(logging.DEBUG, f'Saving to {out_path1}')
-
-    # output_movie = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc('M','J','P','G'), fps, (width,height))
-    output_movie0 = cv2.VideoWriter(out_path0, cv2.VideoWriter_fourcc(*'MP4V'), fps, (width, height))
-    output_movie1 = cv2.VideoWriter(out_path1, cv2.VideoWriter_fourcc(*'MP4V'), fps, (width, height))
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        # (height, width) = frame.shape[:2]
-        if frame is not None:
-            curr_frame = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
-
-            # Crop frame
-            cropped0 = frame[x:x + height, y:y + width]
-            cropped1 = frame[x + height:x + height * 2, y:y + width]
-
-            # Save to file
-            output_movie0.write(cropped0)
-            output_movie1.write(cropped1)
-
-            # Display the resulting frame - trying to move window, but does not always work
-            cv2.namedWindow('producing video', cv2.WINDOW_NORMAL)
-            cv2.resizeWindow('producing video', cropped0.shape[1], cropped0.shape[0])
-            x_pos = round(width / 2) - round(cropped0.shape[1] / 2)
-            y_pos = round(height / 2) - round(cropped0.shape[0] / 2)
-            cv2.moveWindow("producing video", x_pos, y_pos)
-            cv2.imshow('producing video', cropped0)
-
-            logging.log(logging.INFO, f"Exporting videos... [frame {curr_frame}/{n_frames}]")
-
-            # Press Q on keyboard to stop recording early
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        else:
-            break
+        if not headless:
+            # Make sure all windows are closed
+            cv2.destroyAllWindows()
 
-    # Close video capture
-    cap.release()
-    # Closes the video writer.
-    output_movie0.release()
-    output_movie1.release()
+    if write_errors:
+        out_path, error = next(iter(write_errors.items()))
+        raise OSError(f"Writing {out_path} failed: {error}")
+
+    if not curr_frame:
+        for out_path in out_paths:
+            if path.isfile(out_path):
+                remove(out_path)
+        raise OSError(f"Cannot read any frame of {video_in}")
 
-    # Make sure all windows are closed
-    cv2.destroyAllWindows()
+    logging.log(logging.INFO, f'Video split! ({curr_frame} frames)')
 
-    logging.log(logging.INFO, 'Video split!')
+    return out_paths, curr_frame
 
 
 def only_digits(val) -> int:
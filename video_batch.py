@@ -0,0 +1,210 @@
+"""
+Batch processing of video recordings (e.g. the ones made by ADBDevice.record_device_ctrl).
+
+Usage:
+    python video_batch.py split "recordings/*.mp4" --report report.json
+    python video_batch.py extract recordings/ --frames 1 100 200 --subfolder frames
+    python video_batch.py info recordings/ --recursive
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from glob import glob
+from os import path, cpu_count, walk
+
+from utils import split_video, extract_video_frames, get_video_info, get_split_suffixes, get_split_base_path, \
+    get_frame_out_path
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.webm')
+DEFAULT_EXCLUDE = '*_cropped*'
+
+
+def find_videos(inputs: list, recursive: bool = False, exclude: str = DEFAULT_EXCLUDE) -> list:
+    """
+    Expand directories and glob patterns into a sorted list of video files
+    :param inputs: Directories, files or glob patterns
+    :param recursive: Descend into subdirectories of directories
+    :param exclude: fnmatch pattern of file names to skip (by default our own split outputs)
+    :return: List of paths
+    """
+    videos = set()
+
+    for item in inputs:
+        if path.isdir(item):
+            for root, dirs, files in walk(item):
+                videos.update(path.join(root, f) for f in files if f.lower().endswith(VIDEO_EXTENSIONS))
+                if not recursive:
+                    break
+        else:
+            videos.update(f for f in glob(item, recursive=recursive) if path.isfile(f))
+
+    if exclude:
+        videos = {f for f in videos if not fnmatch.fnmatch(path.basename(f), exclude)}
+
+    return sorted(videos)
+
+
+def is_up_to_date(video_in: str, outputs: list) -> bool:
+    """
+    True if all outputs exist and none of them is older than the input
+    """
+    if not outputs:
+        return False
+
+    src_mtime = path.getmtime(video_in)
+    for out in outputs:
+        if not path.isfile(out) or path.getmtime(out) < src_mtime:
+            return False
+
+    return True
+
+
+def expected_outputs(job: dict) -> list:
+    video_in = job['file']
+
+    if job['action'] == 'split':
+        # Same base path split_video will write to
+        base_path = get_split_base_path(video_in)
+        return [f"{base_path}_{suffix}.mp4" for suffix in get_split_suffixes(job['rows'], job['cols'])]
+
+    if job['action'] == 'extract':
+        file_path = path.join(path.dirname(video_in), job['subfolder']) if job['subfolder'] else path.dirname(video_in)
+        return [get_frame_out_path(video_in, file_path, frame, job['out_format']) for frame in job['frames']]
+
+    return []
+
+
+def run_job(job: dict) -> dict:
+    """
+    Process a single file. Runs in a worker process, so it never raises, errors go into the result.
+    """
+    result = {
+        'file': job['file'],
+        'action': job['action'],
+        'status': 'ok',
+        'elapsed': 0.0,
+        'frames': 0,
+        'fps': 0.0,
+        'outputs': [],
+        'error': None
+    }
+
+    outputs = expected_outputs(job)
+    if not job['force'] and is_up_to_date(job['file'], outputs):
+        result['status'] = 'skipped'
+        result['outputs'] = outputs
+        return result
+
+    start = time.perf_counter()
+    try:
+        if job['action'] == 'split':
+            result['outputs'], result['frames'] = split_video(
+                job['file'], headless=True, rows=job['rows'], cols=job['cols']
+            )
+        elif job['action'] == 'extract':
+            result['outputs'] = extract_video_frames(job['file'], job['frames'], job['subfolder'], job['out_format'])
+            result['frames'] = len(result['outputs'])
+        elif job['action'] == 'info':
+            w, h, fps, n_frames = get_video_info(job['file'])
+            result['info'] = {'width': w, 'height': h, 'fps': fps, 'n_frames': n_frames}
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = repr(e)
+
+    result['elapsed'] = time.perf_counter() - start
+    if result['elapsed'] and result['frames']:
+        result['fps'] = result['frames'] / result['elapsed']
+
+    return result
+
+
+def run_batch(jobs: list, workers: int = None, report: str = None) -> dict:
+    """
+    Fan jobs out over a process pool and collect a report
+    :param jobs: Job dicts as built by build_jobs
+    :param workers: Number of processes, defaults to the number of cores
+    :param report: Write the report as JSON to this path
+    :return: Report dict
+    """
+    workers = workers or cpu_count()
+    started = datetime.now()
+    start = time.perf_counter()
+    results = list()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            logging.log(logging.INFO, f"[{len(results)}/{len(jobs)}] {result['status']}: {result['file']} "
+                                      f"({result['elapsed']:.2f} s, {result['fps']:.1f} frames/s)")
+
+    elapsed = time.perf_counter() - start
+    total_frames = sum(r['frames'] for r in results)
+
+    summary = {
+        'started': started.isoformat(),
+        'elapsed': elapsed,
+        'workers': workers,
+        'files': len(results),
+        'processed': sum(1 for r in results if r['status'] == 'ok'),
+        'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+        'errors': sum(1 for r in results if r['status'] == 'error'),
+        'frames': total_frames,
+        'fps': total_frames / elapsed if elapsed else 0.0,
+        'jobs': sorted(results, key=lambda r: r['file'])
+    }
+
+    if report:
+        with open(report, 'w') as f:
+            json.dump(summary, f, indent=2)
+        logging.log(logging.INFO, f"Report written to {report}")
+
+    return summary
+
+
+def build_jobs(args: argparse.Namespace) -> list:
+    jobs = list()
+    for video in find_videos(args.inputs, args.recursive, args.exclude):
+        job = {'file': video, 'action': args.action, 'force': args.force}
+
+        if args.action == 'split':
+            job.update(rows=args.rows, cols=args.cols)
+        elif args.action == 'extract':
+            job.update(frames=args.frames, subfolder=args.subfolder, out_format=args.format)
+
+        jobs.append(job)
+
+    return jobs
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Process directories of video recordings in parallel.')
+    parser.add_argument('action', choices=('split', 'extract', 'info'))
+    parser.add_argument('inputs', nargs='+', help='Directories, files or glob patterns')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Descend into subdirectories')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Processes (default: number of cores)')
+    parser.add_argument('--exclude', default=DEFAULT_EXCLUDE, help='Skip files matching this pattern')
+    parser.add_argument('--force', action='store_true', help="Process files even if outputs are up to date")
+    parser.add_argument('--report', default=None, help='Write a JSON report to this file')
+    parser.add_argument('--rows', type=int, default=2, help='split: grid rows')
+    parser.add_argument('--cols', type=int, default=1, help='split: grid columns')
+    parser.add_argument('--frames', type=int, nargs='+', default=[1], help='extract: frame numbers')
+    parser.add_argument('--subfolder', default=False, help='extract: save frames in this subfolder')
+    parser.add_argument('--format', choices=('JPEG', 'PNG'), default='JPEG', help='extract: image format')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+
+    cli_args = parse_args()
+    summary_report = run_batch(build_jobs(cli_args), cli_args.workers, cli_args.report)
+
+    print(f"{summary_report['files']} files: {summary_report['processed']} processed, "
+          f"{summary_report['skipped']} skipped, {summary_report['errors']} errors "
+          f"in {summary_report['elapsed']:.1f} s ({summary_report['fps']:.1f} frames/s)")
@@ -0,0 +1,271 @@
+"""
+Persistent cache of video metadata, so archives of recordings are probed only once per file version.
+"""
+import json
+import logging
+import shutil
+import threading
+import typing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from os import path, stat, cpu_count
+from subprocess import run, PIPE, DEVNULL
+
+from cv2 import cv2
+
+from video_batch import find_videos
+
+FFPROBE = "ffprobe"
+
+
+class VideoInfo(typing.NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    width: int
+    height: int
+    fps: float
+    n_frames: int
+    codec: str
+    duration: float
+    keyframes: typing.Optional[list] = None  # Frame indices (0 based), None if not probed
+    keyframes_failed: bool = False  # ffprobe failed on this file version, not retried until it changes
+
+    def as_tuple(self) -> tuple:
+        """
+        Same shape as utils.get_video_info
+        """
+        return self.width, self.height, int(self.fps), self.n_frames
+
+
+def get_file_key(video_in: str) -> tuple[str, int, int]:
+    st = stat(video_in)
+    return path.realpath(video_in), st.st_size, st.st_mtime_ns
+
+
+def can_probe_keyframes(ffprobe: str = FFPROBE) -> bool:
+    return shutil.which(ffprobe) is not None
+
+
+def probe_keyframes(video_in: str, fps: float, ffprobe: str = FFPROBE) -> typing.Optional[list]:
+    """
+    Keyframe positions from the container packets (no decoding), needs ffprobe on the PATH
+    :return: List of frame indices or None if ffprobe is not available or failed
+    """
+    if not fps or not can_probe_keyframes(ffprobe):
+        return None
+
+    proc = run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+         '-of', 'csv=p=0', video_in],
+        stdout=PIPE, stderr=DEVNULL
+    )
+    if proc.returncode != 0:
+        logging.log(logging.WARNING, f"ffprobe failed for {video_in}")
+        return None
+
+    keyframes = list()
+    for line in proc.stdout.decode(errors='replace').splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                keyframes.append(int(round(float(pts_time) * fps)))
+            except ValueError:
+                continue
+
+    return sorted(keyframes)
+
+
+def probe_video(video_in: str, keyframes: bool = False) -> VideoInfo:
+    """
+    Open a video once and read all of its metadata
+    :param video_in: Path to the video
+    :param keyframes: Also find keyframe positions (slower, needs ffprobe)
+    :return: VideoInfo
+    """
+    real_path, size, mtime_ns = get_file_key(video_in)
+
+    cap = cv2.VideoCapture(video_in)
+    try:
+        if not cap.isOpened():
+            raise OSError(f"Cannot open video {video_in}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+
+        info = VideoInfo(
+            path=real_path,
+            size=size,
+            mtime_ns=mtime_ns,
+            width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            fps=fps,
+            n_frames=n_frames,
+            codec=''.join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip('\x00'),
+            duration=n_frames / fps if fps else 0.0,
+        )
+    finally:
+        cap.release()
+
+    if info.n_frames <= 0:
+        raise OSError(f"No frames in video {video_in}")
+
+    if keyframes and fps and can_probe_keyframes():
+        # ffprobe is there, so no keyframes means it failed on this file
+        frames = probe_keyframes(video_in, fps)
+        info = info._replace(keyframes=frames, keyframes_failed=frames is None)
+
+    logging.log(logging.DEBUG, f"Probed {video_in}: {info}")
+    return info
+
+
+def _probe_or_error(video_in: str, keyframes: bool) -> tuple[typing.Optional[VideoInfo], typing.Optional[str]]:
+    # Pool worker: an error ends up in the result, so one bad file doesn't fail the whole batch
+    try:
+        return probe_video(video_in, keyframes), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+
+class VideoInfoCache:
+    """
+    LRU cache of VideoInfo keyed by path + size + mtime, optionally persisted as JSON.
+    Usable as utils.get_video_info(video_in, cache=...).
+    """
+
+    def __init__(self, cache_file: str = None, max_entries: int = 4096, keyframes: bool = False):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.keyframes = keyframes
+        self._can_probe_keyframes: bool = keyframes and can_probe_keyframes()
+
+        self._entries: OrderedDict[str, VideoInfo] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.failures: dict[str, str] = dict()  # Path -> error of the files the last probe_many couldn't probe
+
+        if cache_file:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: tuple[str, int, int]) -> typing.Optional[VideoInfo]:
+        real_path, size, mtime_ns = key
+        with self._lock:
+            info = self._entries.get(real_path)
+            if info is None or info.size != size or info.mtime_ns != mtime_ns:
+                self.misses += 1
+                return None
+            if self._can_probe_keyframes and info.keyframes is None and not info.keyframes_failed:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(real_path)
+            self.hits += 1
+            return info
+
+    def put(self, info: VideoInfo) -> None:
+        with self._lock:
+            self._entries[info.path] = info
+            self._entries.move_to_end(info.path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, video_in: str) -> VideoInfo:
+        """
+        Cached VideoInfo of the file, probing it if it's new or changed since it was cached
+        """
+        info = self._lookup(get_file_key(video_in))
+        if info is None:
+            info = probe_video(video_in, self.keyframes)
+            self.put(info)
+
+        return info
+
+    def invalidate(self, video_in: str = None) -> None:
+        with self._lock:
+            if video_in is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path.realpath(video_in), None)
+
+    def probe_many(self, videos: list, workers: int = None) -> dict[str, VideoInfo]:
+        """
+        Bulk probe files on a process pool, only files that are not cached (or changed) get probed
+        :param videos: Video paths, e.g. from video_batch.find_videos
+        :param workers: Number of processes, defaults to the number of cores
+        :return: Dict of path as passed -> VideoInfo, without the files that failed (see self.failures)
+        """
+        result = dict()
+        failures = dict()
+        to_probe = list()
+
+        for video in videos:
+            try:
+                info = self._lookup(get_file_key(video))
+            except OSError as e:
+                failures[video] = str(e)
+                continue
+
+            if info is None:
+                to_probe.append(video)
+            else:
+                result[video] = info
+
+        if to_probe:
+            with ProcessPoolExecutor(max_workers=workers or cpu_count()) as pool:
+                probed = pool.map(_probe_or_error, to_probe, [self.keyframes] * len(to_probe), chunksize=8)
+                for video, (info, error) in zip(to_probe, probed):
+                    if info is None:
+                        failures[video] = error
+                        continue
+
+                    self.put(info)
+                    result[video] = info
+
+        for video, error in failures.items():
+            logging.log(logging.WARNING, f"Could not probe {video}: {error}")
+
+        self.failures = failures
+        logging.log(logging.DEBUG, f"Probed {len(to_probe)} of {len(result) + len(failures)} videos, "
+                                   f"{len(failures)} failed")
+        return result
+
+    def probe_dir(self, inputs: list, recursive: bool = False, workers: int = None) -> dict[str, VideoInfo]:
+        """
+        Bulk probe all videos in directories / glob patterns
+        """
+        return self.probe_many(find_videos(inputs, recursive, exclude=None), workers)
+
+    # ----- Persistence -----
+    def load(self) -> None:
+        try:
+            with open(self.cache_file) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            logging.log(logging.WARNING, f"Could not load video info cache {self.cache_file}: {e}")
+            return
+
+        with self._lock:
+            for entry in entries[-self.max_entries:]:
+                try:
+                    info = VideoInfo(**entry)
+                except TypeError:
+                    continue
+                self._entries[info.path] = info
+
+    def save(self) -> None:
+        if not self.cache_file:
+            return
+
+        with self._lock:
+            entries = [info._asdict() for info in self._entries.values()]
+
+        with open(self.cache_file, 'w') as f:
+            json.dump(entries, f)